@@ -0,0 +1,44 @@
+import logging
+import time
+
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.batch_env import BatchEnv
+from src.game import Env
+
+
+def benchmark_env(number_games: int = 50) -> float:
+    """
+    steps per second of Env.run_multiple_games with a RandomAgent
+    """
+    env = Env()
+    agent = RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="RandomAgent")
+    env.assign_agent(agent)
+    start = time.perf_counter()
+    env.run_multiple_games(number_games)
+    return agent.number_decisions / (time.perf_counter() - start)
+
+
+def benchmark_batch_env(number_boards: int, number_steps: int = 200) -> float:
+    """
+    steps per second of BatchEnv.step with random actions, every board counts as one step
+    """
+    env = BatchEnv(number_boards, seed=0)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(0, 4, size=(number_steps, number_boards))
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return number_boards * number_steps / (time.perf_counter() - start)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    print(f"Env.run_multiple_games: {benchmark_env():>12,.0f} steps/sec")
+    for number_boards in (1, 16, 256, 4096):
+        print(f"BatchEnv({number_boards:>4}):        {benchmark_batch_env(number_boards):>12,.0f} steps/sec")
+
+
+if __name__ == "__main__":
+    main()
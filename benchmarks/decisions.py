@@ -0,0 +1,71 @@
+import logging
+import time
+
+import numpy as np
+
+from src.agents.naive_agent import UpLeftAgent
+from src.agents.random import RandomAgent
+from src.batch_env import BatchEnv
+from src.helpers import legal_actions
+
+BATCH_SIZES = (1, 4, 16, 64, 256, 1024, 4096)
+
+
+def _states(number_boards: int, seed: int = 0) -> (np.ndarray, np.ndarray):
+    rng = np.random.default_rng(seed)
+    exponents = rng.integers(0, 10, size=(number_boards, 4, 4))
+    boards = np.where(exponents > 0, 2 ** exponents, 0)
+    return boards, legal_actions(boards)
+
+
+def benchmark_play_turn(agent_class, number_decisions: int = 20000) -> float:
+    """
+    decisions per second of Agent.play_turn, one board per call
+    """
+    agent = agent_class(state_shape=(4, 4), action_shape=(4, ), name=agent_class.__name__, rng=0)
+    boards, legal = _states(number_decisions)
+    start = time.perf_counter()
+    for board, board_legal in zip(boards, legal):
+        agent.play_turn(board, legal_actions=board_legal)
+    return number_decisions / (time.perf_counter() - start)
+
+
+def benchmark_decide_batch(agent_class, batch_size: int, number_decisions: int = 200000) -> float:
+    """
+    decisions per second of Agent.decide_batch with batch_size boards per call
+    """
+    agent = agent_class(state_shape=(4, 4), action_shape=(4, ), name=agent_class.__name__, rng=0)
+    boards, legal = _states(batch_size)
+    number_batches = max(1, number_decisions // batch_size)
+    start = time.perf_counter()
+    for _ in range(number_batches):
+        agent.decide_batch(boards, legal_actions=legal)
+    return number_batches * batch_size / (time.perf_counter() - start)
+
+
+def benchmark_batch_env_run(agent_class, number_boards: int, number_steps: int = 200) -> float:
+    """
+    steps per second of BatchEnv.run including the decisions and the feedback, every board counts as one step
+    """
+    env = BatchEnv(number_boards, seed=0)
+    env.assign_agent(agent_class(state_shape=(4, 4), action_shape=(4, ), name=agent_class.__name__, rng=0))
+    start = time.perf_counter()
+    env.run(number_steps)
+    return number_boards * number_steps / (time.perf_counter() - start)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    for agent_class in (RandomAgent, UpLeftAgent):
+        name = agent_class.__name__
+        print(f"{name}.play_turn:                {benchmark_play_turn(agent_class):>14,.0f} decisions/sec")
+        for batch_size in BATCH_SIZES:
+            print(f"{name}.decide_batch({batch_size:>4}):       "
+                  f"{benchmark_decide_batch(agent_class, batch_size):>14,.0f} decisions/sec")
+        for number_boards in (16, 256, 4096):
+            print(f"BatchEnv({number_boards:>4}).run with {name}: "
+                  f"{benchmark_batch_env_run(agent_class, number_boards):>14,.0f} steps/sec")
+
+
+if __name__ == "__main__":
+    main()
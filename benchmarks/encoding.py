@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from src.encoding import StateEncoder
+from src.game import Env
+
+
+def _legacy_encode(env: Env, state: np.ndarray) -> np.ndarray:
+    # the state encoding of Env.run before the StateEncoder: 14 comparisons into a new float64 matrix
+    state = state.reshape((env.number_tiles * env.number_tiles, ))
+    data = np.zeros((env.number_tiles * env.number_tiles, env.number_powers))
+    for i, val in enumerate(env.possible_numbers):
+        data[:, i] = state == val
+    return data.reshape(env.number_tiles * env.number_tiles * env.number_powers)
+
+
+def _boards(number_boards: int) -> np.ndarray:
+    exponents = np.random.default_rng(0).integers(0, 12, size=(number_boards, 4, 4))
+    return np.where(exponents > 0, 2 ** exponents, 0)
+
+
+def benchmark_encoding(number_boards: int = 20000) -> dict:
+    """
+    microseconds per encoded board for the legacy encoding, the StateEncoder and its batch variant
+    """
+    env = Env()
+    boards = _boards(number_boards)
+    result = {}
+    start = time.perf_counter()
+    for board in boards:
+        _legacy_encode(env, board)
+    result["legacy_us"] = (time.perf_counter() - start) / number_boards * 1e6
+    for name, encoder in (("encoder_us", StateEncoder()), ("encoder_reused_buffer_us", StateEncoder(reuse_buffer=True)),
+                          ("encoder_bool_us", StateEncoder(dtype=bool))):
+        start = time.perf_counter()
+        for board in boards:
+            encoder.encode(board)
+        result[name] = (time.perf_counter() - start) / number_boards * 1e6
+    encoder = StateEncoder()
+    out = np.empty(encoder.get_shape(number_boards), dtype=np.float32)
+    start = time.perf_counter()
+    encoder.encode_batch(boards, out=out)
+    result["encoder_batch_us"] = (time.perf_counter() - start) / number_boards * 1e6
+    return result
+
+
+def main():
+    for name, value in benchmark_encoding().items():
+        print(f"{name:>26}: {value:8.3f} us/board")
+
+
+if __name__ == "__main__":
+    main()
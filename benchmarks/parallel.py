@@ -0,0 +1,29 @@
+import multiprocessing
+import time
+from functools import partial
+
+from src.agents.random import RandomAgent
+from src.game import Env
+
+
+def benchmark_parallel(processes: int, number_games: int = 1000) -> float:
+    """
+    games per second of Env.run_multiple_games_parallel with RandomAgents
+    """
+    env = Env()
+    agent_factory = partial(RandomAgent, state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                            name="RandomAgent")
+    start = time.perf_counter()
+    env.run_multiple_games_parallel(number_games, agent_factory, processes=processes)
+    return number_games / (time.perf_counter() - start)
+
+
+def main():
+    processes = 1
+    while processes <= multiprocessing.cpu_count():
+        print(f"{processes:>3} processes: {benchmark_parallel(processes):>10,.1f} games/sec")
+        processes *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import functools
+import logging
+import time
+
+from src.agents.random import RandomAgent
+from src.agents.sarsa import SARSA
+from src.game import Env
+from src.pipeline import Pipeline
+
+
+def benchmark_online(number_games: int = 5) -> float:
+    """
+    steps per second of SARSA learning online in Env.run, playing and learning alternate in one process
+    """
+    env = Env()
+    agent = SARSA(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="SARSA")
+    env.assign_agent(agent)
+    start = time.perf_counter()
+    env.run_multiple_games(number_games)
+    return agent.number_decisions / (time.perf_counter() - start)
+
+
+def benchmark_pipeline(agent_class, number_actors: int, seconds: float = 10, learn: bool = True) -> dict:
+    """
+    stats of a Pipeline after running for seconds
+    """
+    agent_factory = functools.partial(agent_class, state_shape=(4, 4), action_shape=(4, ), name=agent_class.__name__)
+    with Pipeline(agent_factory, learner=agent_factory() if learn else None, number_actors=number_actors) as pipeline:
+        return pipeline.run(seconds=seconds)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    print(f"SARSA online in Env.run: {benchmark_online():>10,.0f} steps/sec")
+    for agent_class, learn in ((RandomAgent, False), (SARSA, True)):
+        for number_actors in (1, 2, 4):
+            stats = benchmark_pipeline(agent_class, number_actors, learn=learn)
+            print(f"{agent_class.__name__:<12} {number_actors} actors: {stats['actor_steps_per_sec']:>10,.0f} "
+                  f"actor steps/sec {stats['actor_blocked_share']:>6.1%} blocked "
+                  f"mean queue depth {stats['mean_queue_depth']:>5.2f}/{stats['queue_slots']} "
+                  f"{stats['learner_samples_per_sec']:>12,.0f} learner samples/sec "
+                  f"{stats['learner_updates']:>6} updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.replay_buffer import ReplayBuffer, ArrayReplayBuffer, PrioritizedArrayReplayBuffer
+
+
+def _boards(number_boards: int) -> np.ndarray:
+    exponents = np.random.default_rng(0).integers(0, 12, size=(number_boards, 4, 4))
+    return np.where(exponents > 0, 2 ** exponents, 0)
+
+
+def _fill(buffer_class, capacity: int):
+    boards = _boards(1024)
+    buffer = buffer_class(capacity)
+    for i in range(capacity):
+        buffer.add(boards[i % 1024].copy(), i % 4, 1.0, boards[(i + 1) % 1024].copy(), False)
+    return buffer
+
+
+def benchmark_buffer(buffer_class, capacity: int, batch_size: int = 256, number_samples: int = 200) -> dict:
+    """
+    fills a buffer of the given class to capacity and measures add and sample throughput and the traced memory
+    """
+    tracemalloc.start()
+    buffer = _fill(buffer_class, capacity)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del buffer
+
+    start = time.perf_counter()
+    buffer = _fill(buffer_class, capacity)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(number_samples):
+        buffer.sample(batch_size)
+    sample_time = time.perf_counter() - start
+    return {"adds_per_sec": capacity / add_time,
+            "transitions_sampled_per_sec": number_samples * batch_size / sample_time,
+            "memory_mb": memory / 2 ** 20}
+
+
+def benchmark_prioritized_buffer(capacity: int = 10 ** 6, batch_size: int = 256, number_samples: int = 200) -> dict:
+    """
+    add, sample and update_priorities throughput of a full PrioritizedArrayReplayBuffer
+    """
+    start = time.perf_counter()
+    buffer = _fill(PrioritizedArrayReplayBuffer, capacity)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batches = [buffer.sample(batch_size, beta=0.4) for _ in range(number_samples)]
+    sample_time = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for batch in batches:
+        buffer.update_priorities(batch[-1], rng.random(batch_size) + 1e-6)
+    update_time = time.perf_counter() - start
+    return {"adds_per_sec": capacity / add_time,
+            "transitions_sampled_per_sec": number_samples * batch_size / sample_time,
+            "priorities_updated_per_sec": number_samples * batch_size / update_time}
+
+
+def main():
+    for capacity in (10 ** 4, 10 ** 5, 10 ** 6):
+        for buffer_class in (ReplayBuffer, ArrayReplayBuffer):
+            result = benchmark_buffer(buffer_class, capacity)
+            print(f"{buffer_class.__name__:>18} capacity {capacity:>9,}: {result['adds_per_sec']:>10,.0f} adds/sec "
+                  f"{result['transitions_sampled_per_sec']:>12,.0f} sampled/sec {result['memory_mb']:>8.1f} MB")
+
+    result = benchmark_prioritized_buffer()
+    print(f"PrioritizedArrayReplayBuffer capacity {10 ** 6:>9,}: {result['adds_per_sec']:>10,.0f} adds/sec "
+          f"{result['transitions_sampled_per_sec']:>12,.0f} sampled/sec "
+          f"{result['priorities_updated_per_sec']:>12,.0f} updates/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import json
+import os
+import subprocess
+import sys
+
+# runs in a fresh interpreter, so nothing is imported yet
+_MEASURE = """
+import json, resource, sys, time
+start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "rss_kb": rss, "rss_increase_kb": rss - start_rss,
+                  "modules": sorted(sys.modules)}}))
+"""
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# visualization and data frame libraries which must not be loaded by the engine
+HEAVY_MODULES = ("pandas", "plotly", "matplotlib")
+
+
+def measure_import(module: str = "src.game") -> dict:
+    """
+    import time and peak resident memory of importing module in a fresh interpreter
+    :return: dict with seconds, rss_kb (peak RSS of the process), rss_increase_kb (caused by the import) and the list
+        of loaded modules
+    """
+    output = subprocess.run([sys.executable, "-c", _MEASURE.format(module=module)], capture_output=True, text=True,
+                            cwd=_ROOT, check=True).stdout
+    return json.loads(output)
+
+
+def benchmark_import(module: str = "src.game", repeats: int = 5) -> dict:
+    """
+    fastest import time and smallest peak RSS over repeats fresh interpreters
+    """
+    results = [measure_import(module) for _ in range(repeats)]
+    return {"seconds": min(result["seconds"] for result in results),
+            "rss_mb": min(result["rss_kb"] for result in results) / 1024,
+            "heavy_modules": sorted({name.split(".")[0] for name in results[0]["modules"]} & set(HEAVY_MODULES))}
+
+
+def main():
+    for module in ("numpy", "src.game", "src.reporting"):
+        result = benchmark_import(module)
+        print(f"import {module:<14} {result['seconds'] * 1000:8.1f} ms {result['rss_mb']:8.1f} MB peak RSS "
+              f"heavy modules: {', '.join(result['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.decisions import benchmark_decide_batch
+from benchmarks.startup import benchmark_import
+from src.agents.naive_agent import UpLeftAgent
+from src.agents.random import RandomAgent
+from src.bitboard import BitboardGame
+from src.game import Env, Game
+from src.helpers import Direction, legal_actions
+from src.replay_buffer import ArrayReplayBuffer, EpisodeBuffer, ReplayBuffer
+
+# a metric is worse than the baseline if it lost more than this share of its baseline value
+DEFAULT_THRESHOLD = 0.15
+
+
+def _metric(value: float, unit: str, higher_is_better: bool = True) -> dict:
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _best_of(function, repeats: int) -> float:
+    """
+    smallest run time of function over repeats runs, the least disturbed run is the most reproducible one
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _boards(number_boards: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    exponents = rng.integers(1, 10, size=(number_boards, 4, 4))
+    exponents[rng.random((number_boards, 4, 4)) < 0.4] = 0
+    return np.where(exponents > 0, 2 ** exponents, 0)
+
+
+def machine_metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "commit": commit}
+
+
+def benchmark_moves(game_class, number_moves: int, repeats: int) -> dict:
+    """
+    make_move calls per second and direction on random boards on which the direction is legal, without spawns
+    """
+    result = {}
+    boards = _boards(4 * number_moves)
+    legal = legal_actions(boards)
+    game = game_class(4)
+    for direction in Direction:
+        direction_boards = boards[legal[:, direction.value]][:number_moves]
+
+        def run():
+            for board in direction_boards:
+                game.board = board.copy()
+                game.make_move(direction, spawn_new=False)
+
+        elapsed = _best_of(run, repeats)
+        result[direction.name] = _metric(len(direction_boards) / elapsed, "moves/sec")
+    return result
+
+
+def benchmark_games(agent_class, number_games: int, repeats: int) -> dict:
+    """
+    games and steps per second of Env.run_multiple_games
+    """
+    env = Env()
+    agent = agent_class(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                        name=agent_class.__name__)
+    env.assign_agent(agent)
+    np.random.seed(0)
+    elapsed = _best_of(lambda: env.run_multiple_games(number_games), repeats)
+    steps_per_game = np.mean(env.steps_history)
+    return {"games_per_sec": _metric(number_games / elapsed, "games/sec"),
+            "steps_per_sec": _metric(number_games * steps_per_game / elapsed, "steps/sec")}
+
+
+def benchmark_dummies(number_boards: int, repeats: int) -> dict:
+    """
+    cost of Env._get_dummies per board
+    """
+    env = Env()
+    boards = _boards(number_boards)
+
+    def run():
+        for board in boards:
+            env._get_dummies(board.ravel())
+
+    return {"us_per_board": _metric(_best_of(run, repeats) / number_boards * 1e6, "us", higher_is_better=False)}
+
+
+def benchmark_replay_buffer(buffer_class, capacity: int, batch_size: int, number_samples: int,
+                            repeats: int) -> dict:
+    """
+    add throughput while filling a buffer to capacity and sample throughput of the full buffer
+    """
+    boards = _boards(1024)
+    buffer = None
+
+    def fill():
+        nonlocal buffer
+        buffer = buffer_class(capacity)
+        for i in range(capacity):
+            buffer.add(boards[i % 1024], i % 4, 1.0, boards[(i + 1) % 1024], False)
+
+    add_time = _best_of(fill, repeats)
+    sample_time = _best_of(lambda: [buffer.sample(batch_size) for _ in range(number_samples)], repeats)
+    return {"adds_per_sec": _metric(capacity / add_time, "adds/sec"),
+            "samples_per_sec": _metric(number_samples * batch_size / sample_time, "transitions/sec")}
+
+
+def benchmark_episode_buffer(max_transitions: int, episode_length: int, batch_size: int, number_samples: int,
+                             repeats: int) -> dict:
+    """
+    add throughput of episodes with episode_length transitions and sample throughput of the full buffer
+    """
+    boards = _boards(1024)
+    buffer = None
+
+    def fill():
+        nonlocal buffer
+        buffer = EpisodeBuffer(size=max(1, max_transitions // episode_length), max_transitions=max_transitions)
+        for i in range(max_transitions):
+            buffer.add(boards[i % 1024], i % 4, 1.0, boards[(i + 1) % 1024], (i + 1) % episode_length == 0)
+
+    add_time = _best_of(fill, repeats)
+    sample_time = _best_of(lambda: [buffer.sample(batch_size) for _ in range(number_samples)], repeats)
+    return {"adds_per_sec": _metric(max_transitions / add_time, "adds/sec"),
+            "samples_per_sec": _metric(number_samples * batch_size / sample_time, "transitions/sec")}
+
+
+def benchmark_startup(repeats: int) -> dict:
+    """
+    import time and peak RSS of a fresh interpreter importing src.game
+    """
+    result = benchmark_import("src.game", max(repeats, 3))
+    return {"import_ms": _metric(result["seconds"] * 1000, "ms", higher_is_better=False),
+            "peak_rss_mb": _metric(result["rss_mb"], "MB", higher_is_better=False)}
+
+
+def run_suite(quick: bool = False, repeats: int = 3) -> dict:
+    """
+    runs all benchmarks
+    :param quick: smaller workloads for a fast check, the numbers are noisier and not comparable to a full run
+    :param repeats: every measurement is repeated and the fastest run is reported
+    :return: dict with the machine metadata and a flat dict of metrics keyed by benchmark name
+    """
+    scale = 10 if quick else 1
+    capacities = (10 ** 3, 10 ** 4) if quick else (10 ** 4, 10 ** 5, 10 ** 6)
+    metrics = {}
+
+    def add(prefix: str, results: dict):
+        for name, metric in results.items():
+            metrics[f"{prefix}.{name}"] = metric
+        logging.info(f"finished {prefix}")
+
+    add("startup.src.game", benchmark_startup(repeats))
+    for game_class in (Game, BitboardGame):
+        add(f"{game_class.__name__}.make_move", benchmark_moves(game_class, 20000 // scale, repeats))
+    for agent_class in (RandomAgent, UpLeftAgent):
+        add(f"Env.run_multiple_games.{agent_class.__name__}", benchmark_games(agent_class, 50 // scale, repeats))
+    for agent_class in (RandomAgent, UpLeftAgent):
+        add(f"{agent_class.__name__}.decide_batch", {
+            str(batch_size): _metric(max(benchmark_decide_batch(agent_class, batch_size, 200000 // scale)
+                                         for _ in range(repeats)), "decisions/sec")
+            for batch_size in (1, 64, 4096)})
+    add("Env._get_dummies", benchmark_dummies(20000 // scale, repeats))
+    for capacity in capacities:
+        for buffer_class in (ReplayBuffer, ArrayReplayBuffer):
+            # filling the list based buffer to 10 ** 6 takes minutes and shows nothing new
+            if buffer_class is ReplayBuffer and capacity > 10 ** 5:
+                continue
+            add(f"{buffer_class.__name__}.{capacity}",
+                benchmark_replay_buffer(buffer_class, capacity, 256, 200 // scale, repeats))
+        add(f"EpisodeBuffer.{capacity}", benchmark_episode_buffer(capacity, 100, 256, 200 // scale, repeats))
+    return {"metadata": {**machine_metadata(), "quick": quick, "repeats": repeats}, "metrics": metrics}
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """
+    compares the metrics of two suite runs
+    :param results: output of run_suite
+    :param baseline: output of an earlier run_suite
+    :param threshold: share of the baseline value a metric may lose before it counts as a regression
+    :return: list of (name, baseline value, value, relative change, is regression) for all metrics in both runs,
+        the relative change is positive for improvements
+    """
+    rows = []
+    for name, metric in results["metrics"].items():
+        if name not in baseline["metrics"]:
+            continue
+        value = metric["value"]
+        baseline_value = baseline["metrics"][name]["value"]
+        change = (value - baseline_value) / baseline_value if baseline_value else 0.0
+        if not metric["higher_is_better"]:
+            change = -change
+        rows.append((name, baseline_value, value, change, change < -threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks of the engines, environments and replay buffers")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with, exits with 1 on regressions")
+    parser.add_argument("--results", help="compare this JSON file instead of running the suite")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--quick", action="store_true", help="smaller workloads")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.results:
+        with open(args.results) as file:
+            results = json.load(file)
+    else:
+        results = run_suite(quick=args.quick, repeats=args.repeats)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if not args.compare:
+        for name, metric in results["metrics"].items():
+            print(f"{name:<55} {metric['value']:>14,.2f} {metric['unit']}")
+        return
+    with open(args.compare) as file:
+        baseline = json.load(file)
+    if baseline["metadata"].get("quick") != results["metadata"].get("quick"):
+        logging.warning("comparing a quick run with a full run, the workloads differ")
+    rows = compare(results, baseline, args.threshold)
+    for name, baseline_value, value, change, regression in rows:
+        print(f"{name:<55} {baseline_value:>14,.2f} -> {value:>14,.2f} {change:>+8.1%}"
+              f"{'  REGRESSION' if regression else ''}")
+    number_regressions = sum(row[-1] for row in rows)
+    print(f"{number_regressions} regressions of more than {args.threshold:.0%}")
+    sys.exit(1 if number_regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
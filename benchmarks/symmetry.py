@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.bitboard import pack_board
+from src.game import Env
+from src.symmetry import augment_batch, canonical_bitboard, canonical_hash, canonical_hash_batch
+
+
+def _boards(number_boards: int) -> np.ndarray:
+    exponents = np.random.default_rng(0).integers(0, 12, size=(number_boards, 4, 4))
+    return np.where(exponents > 0, 2 ** exponents, 0)
+
+
+def benchmark_symmetry(number_boards: int = 20000, batch_size: int = 256) -> dict:
+    """
+    microseconds per board for the canonical hashes and the batch augmentation, next to the time of an Env.run step
+    """
+    boards = _boards(number_boards)
+    result = {}
+    start = time.perf_counter()
+    for board in boards:
+        canonical_hash(board)
+    result["canonical_hash_us"] = (time.perf_counter() - start) / number_boards * 1e6
+    packed = [pack_board(board) for board in boards]
+    start = time.perf_counter()
+    for bits in packed:
+        canonical_bitboard(bits)
+    result["canonical_bitboard_us"] = (time.perf_counter() - start) / number_boards * 1e6
+    start = time.perf_counter()
+    canonical_hash_batch(boards)
+    result["canonical_hash_batch_us"] = (time.perf_counter() - start) / number_boards * 1e6
+    actions = np.zeros(batch_size, dtype=np.int64)
+    rewards = np.zeros(batch_size)
+    dones = np.zeros(batch_size, dtype=bool)
+    start = time.perf_counter()
+    for i in range(0, number_boards - batch_size, batch_size):
+        augment_batch(boards[i:i + batch_size], actions, rewards, boards[i:i + batch_size], dones)
+    result["augment_batch_us"] = (time.perf_counter() - start) / number_boards * 1e6
+
+    env = Env()
+    agent = RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="RandomAgent")
+    start = time.perf_counter()
+    env.assign_agent(agent)
+    env.run_multiple_games(20)
+    result["env_step_us"] = (time.perf_counter() - start) / sum(env.steps_history) * 1e6
+    return result
+
+
+def main():
+    for name, value in benchmark_symmetry().items():
+        print(f"{name:>24}: {value:8.3f} us/board")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from src.batch_env import BatchEnv
+from src.tablebase import Tablebase, build_tablebase
+
+# (number_tiles, max_tile) of the solved games, 3x3 boards are limited to keep the solve in the range of a minute
+GAMES = ((2, None), (3, 32), (3, 64))
+
+
+def benchmark_lookups(tablebase: Tablebase, number_boards: int = 4096, number_batches: int = 20) -> (float, float):
+    """
+    lookups per second of Tablebase.lookup_batch and Tablebase.lookup on boards of random games
+    """
+    env = BatchEnv(number_boards, number_tiles=tablebase.number_tiles, seed=0)
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        env.step(rng.integers(0, 4, size=number_boards))
+    boards = env.boards
+    start = time.perf_counter()
+    for _ in range(number_batches):
+        tablebase.lookup_batch(boards)
+    batch_rate = number_boards * number_batches / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for board in boards[:1000]:
+        try:
+            tablebase.lookup(board)
+        except KeyError:
+            pass
+    return batch_rate, min(1000, number_boards) / (time.perf_counter() - start)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        for number_tiles, max_tile in GAMES:
+            path = os.path.join(directory, f"{number_tiles}x{number_tiles}.tb")
+            stats = build_tablebase(path, number_tiles, max_tile=max_tile)
+            batch_rate, single_rate = benchmark_lookups(Tablebase(path))
+            print(f"{number_tiles}x{number_tiles} max_tile={max_tile}: {stats['states']:>10,} states "
+                  f"{stats['states_per_sec']:>10,.0f} states/sec {stats['bytes'] / 2 ** 20:>8.1f} MiB "
+                  f"lookup_batch {batch_rate:>12,.0f}/sec lookup {single_rate:>10,.0f}/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import time
+
+import numpy as np
+
+from src.vector_env import AsyncVectorEnv, SyncVectorEnv
+
+
+def _learner_step(observations: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # stands in for the forward pass of a learner which picks the next actions
+    return (observations @ weights).argmax(axis=1)
+
+
+def benchmark_vector_env(number_envs: int = 256, number_steps: int = 200, number_workers: int = None,
+                         learner_size: int = 0) -> dict:
+    """
+    env steps per second of the sync and the async vector env. With learner_size > 0 a matrix product with that many
+    hidden units is computed between the steps, the async env overlaps it with stepping the workers.
+    """
+    rng = np.random.default_rng(0)
+    result = {}
+
+    sync_env = SyncVectorEnv(number_envs, seed=0, copy=False)
+    observations, info = sync_env.reset()
+    weights = rng.random((observations.shape[1], max(learner_size, 4)), dtype=np.float32)
+    actions = rng.integers(0, 4, size=number_envs)
+    start = time.perf_counter()
+    for _ in range(number_steps):
+        observations = sync_env.step(actions)[0]
+        if learner_size:
+            actions = _learner_step(observations, weights) % 4
+    result["sync_steps_per_second"] = number_envs * number_steps / (time.perf_counter() - start)
+
+    with AsyncVectorEnv(number_envs, number_workers=number_workers, seed=0, copy=False) as async_env:
+        observations, info = async_env.reset()
+        actions = rng.integers(0, 4, size=number_envs)
+        start = time.perf_counter()
+        for _ in range(number_steps):
+            async_env.step_async(actions)
+            if learner_size:
+                # the learner works on the previous observations while the workers step
+                actions = _learner_step(observations, weights) % 4
+            observations = async_env.step_wait()[0].copy() if learner_size else async_env.step_wait()[0]
+        result["async_steps_per_second"] = number_envs * number_steps / (time.perf_counter() - start)
+    return result
+
+
+def main():
+    for learner_size in (0, 1024):
+        for name, value in benchmark_vector_env(learner_size=learner_size).items():
+            print(f"learner size {learner_size:>5} {name:>24}: {value:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
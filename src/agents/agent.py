@@ -2,42 +2,95 @@ import abc
 import numpy as np
 import logging
 
+from src.helpers import accepts_keyword, make_rng
+
 
 class Agent(abc.ABC):
 
-    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, caching: bool = False):
+    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, caching: bool = False, rng=None):
         """
         abstract class for agent which define the general interface for Agents
         :param name:
         :param side:
+        :param rng: np.random.Generator or seed for the random decisions of the agent, None seeds it from the global
+            np.random state
         """
         self.name = name
+        self.rng = make_rng(rng)[0]
         self.state_shape = state_shape
         self.action_shape = action_shape
         self.number_decisions = 0
+        self.number_batches = 0
         self.td_loss_history = []
         self.moving_average_loss = []
         self.reward_history = []
         self.moving_average_rewards = []
         self._episode_reward = 0
+        self._batch_episode_rewards = None
         self.experience_buffer = None
 
         if caching:
             logging.debug("Caching is considered! When you don´t deliver cache and stream by yourself, the agent will "
                           "get a redis stream and cache by default")
 
-    def play_turn(self, state_space: np.ndarray):
+    def play_turn(self, state_space: np.ndarray, legal_actions: np.ndarray = None):
         """
         get all possible actions and decide which action to take
         :param state_space: np array describing the board
-        :param action_space: dictionary containing all possible moves
+        :param legal_actions: optional np bool array with shape (4, ) of the directions which move any tile. A decision
+            for an illegal direction is replaced by the first legal one.
         :return:
         """
-        decision = self.decision(state_space)
+        decision = self._decide(state_space, legal_actions)
         assert isinstance(decision, int), "decision return must be an integer"
+        if legal_actions is not None and not legal_actions[decision] and legal_actions.any():
+            decision = int(np.flatnonzero(legal_actions)[0])
         self.number_decisions += 1
         return decision
 
+    def decide_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        """
+        play_turn for many boards at once, for example the boards of a BatchEnv. Every board counts as one decision.
+        :param states: np array with shape (number_boards, ...) holding one state per board
+        :param legal_actions: optional np bool array with shape (number_boards, 4). Decisions for illegal directions
+            are replaced by the first legal one of their board.
+        :return: np int array with shape (number_boards, ) holding one Direction value per board
+        """
+        if legal_actions is None:
+            decisions = self.decision_batch(states)
+        else:
+            decisions = self.decision_batch(states, legal_actions=legal_actions)
+        decisions = np.asarray(decisions)
+        assert decisions.shape == (len(states), ) and np.issubdtype(decisions.dtype, np.integer), \
+            "decision_batch return must be an integer array with one decision per state"
+        if legal_actions is not None:
+            illegal = ~legal_actions[np.arange(len(decisions)), decisions] & legal_actions.any(axis=1)
+            if illegal.any():
+                decisions = decisions.copy()
+                decisions[illegal] = legal_actions[illegal].argmax(axis=1)
+        self.number_decisions += len(decisions)
+        self.number_batches += 1
+        return decisions
+
+    def decision_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        """
+        decisions for many boards at once. This default calls decision for every board, agents override it with a
+        vectorized version.
+        :param states: np array with shape (number_boards, ...)
+        :param legal_actions: np bool array with shape (number_boards, 4), None if unknown
+        :return: np int array with shape (number_boards, )
+        """
+        if legal_actions is None:
+            legal_actions = [None] * len(states)
+        return np.array([self._decide(state, legal) for state, legal in zip(states, legal_actions)],
+                        dtype=np.int64).reshape(len(states))
+
+    def _decide(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        # agents written before legal_actions was passed implement decision(self, state_space), they get no mask
+        if legal_actions is None or not accepts_keyword(type(self).decision, "legal_actions"):
+            return self.decision(state_space)
+        return self.decision(state_space, legal_actions=legal_actions)
+
     def get_feedback(self, state: np.ndarray, action: int, reward: float, finished: bool):
         """
         through this function the agent gets information about the last turn
@@ -57,6 +110,46 @@ class Agent(abc.ABC):
             self._episode_reward += reward
         self._get_feedback_inner(state, action, reward, finished)
 
+    def get_feedback_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, finished: np.ndarray):
+        """
+        get_feedback for the boards of the last decide_batch. The rewards of every board are summed up until its game
+        is finished, so the boards have to be passed in the same order every time.
+        :param states: np array with shape (number_boards, ...)
+        :param actions: np int array with shape (number_boards, )
+        :param rewards: np array with shape (number_boards, )
+        :param finished: np bool array with shape (number_boards, )
+        :return: No return
+        """
+        rewards = np.asarray(rewards)
+        finished = np.asarray(finished, dtype=bool)
+        if self._batch_episode_rewards is None or len(self._batch_episode_rewards) != len(rewards):
+            self._batch_episode_rewards = np.zeros(len(rewards))
+        totals = self._batch_episode_rewards + rewards
+        for total in totals[finished]:
+            self.reward_history.append(float(total))
+            self.moving_average_rewards.append(
+                np.mean([self.reward_history[max([0, len(self.reward_history) - 100]):]]))
+        self._batch_episode_rewards = np.where(finished, 0, totals)
+        self._get_feedback_inner_batch(states, actions, rewards, finished)
+
+    def _get_feedback_inner_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                                  finished: np.ndarray):
+        """
+        implement this function if you want to gather informations about many games at once. The default passes
+        every board to _get_feedback_inner, which only works for agents which do not keep the state of a single game
+        between the calls.
+        :param states:
+        :param actions:
+        :param rewards:
+        :param finished:
+        :return:
+        """
+        # nothing to pass on for agents which do not implement _get_feedback_inner
+        if type(self)._get_feedback_inner is Agent._get_feedback_inner:
+            return
+        for state, action, reward, is_finished in zip(states, actions, rewards, finished):
+            self._get_feedback_inner(state, int(action), reward, bool(is_finished))
+
     def _get_feedback_inner(self, state: np.ndarray, action: int, reward: float, finished: bool):
         """
         implement this function if you want to gather informations about your game
@@ -68,13 +161,27 @@ class Agent(abc.ABC):
         """
         pass
 
+    def get_parameters(self) -> np.ndarray:
+        """
+        flat np array of the learned parameters which other copies of the agent need to play the same policy, for
+        example the actors of a src.pipeline.Pipeline. None for agents which do not learn.
+        """
+        return None
+
+    def set_parameters(self, parameters: np.ndarray):
+        """
+        takes over parameters returned by get_parameters of another copy of the agent
+        """
+        pass
+
     @abc.abstractmethod
-    def decision(self, state_space: np.ndarray) -> int:
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
         """
         this function must implement a decision based in the action_space and other delivered arguments
         return must be a dictionary with the following keys: "stone_id" and "move_index" which indicates
         the stone and move that should be executed
         :param state_space:
+        :param legal_actions: np bool array with shape (4, ) of the directions which move any tile, None if unknown
         :return: int: Action
         """
         pass
@@ -0,0 +1,184 @@
+import logging
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.agents.agent import Agent
+from src.bitboard import ROW_MASK, count_empty, move, pack_board, transpose
+from src.helpers import Direction
+
+# weights of the row heuristic, taken from the well known expectimax solver by nneonneo
+SCORE_LOST_PENALTY = 200000.0
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+
+
+def _build_heuristic_table() -> list:
+    rows = np.arange(ROW_MASK + 1, dtype=np.int64)
+    ranks = np.stack([(rows >> (4 * j)) & 0xF for j in range(4)], axis=1).astype(np.float64)
+    empty = (ranks == 0).sum(axis=1)
+    tile_sum = (ranks ** SUM_POWER).sum(axis=1)
+    # tiles which could be merged, zeros in between do not block a merge
+    compressed = np.take_along_axis(ranks, np.argsort(ranks == 0, axis=1, kind="stable"), axis=1)
+    equal = (compressed[:, :-1] == compressed[:, 1:]) & (compressed[:, :-1] != 0)
+    merges = np.zeros(len(rows))
+    for j in range(4):
+        in_pair = np.zeros(len(rows), dtype=bool)
+        if j > 0:
+            in_pair |= equal[:, j - 1]
+        if j < 3:
+            in_pair |= equal[:, j]
+        merges += in_pair
+    powered = ranks ** MONOTONICITY_POWER
+    difference = powered[:, 1:] - powered[:, :-1]
+    monotonicity_left = np.where(ranks[:, :-1] > ranks[:, 1:], -difference, 0).sum(axis=1)
+    monotonicity_right = np.where(ranks[:, :-1] > ranks[:, 1:], 0, difference).sum(axis=1)
+    heuristic = SCORE_LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges - \
+        MONOTONICITY_WEIGHT * np.minimum(monotonicity_left, monotonicity_right) - SUM_WEIGHT * tile_sum
+    return heuristic.tolist()
+
+
+_HEURISTIC = _build_heuristic_table()
+
+
+def evaluate_board(bits: int) -> float:
+    """
+    heuristic value of a packed board, sum of the row heuristic over all rows and columns
+    :param bits:
+    :return: float
+    """
+    columns = transpose(bits)
+    return _HEURISTIC[bits & ROW_MASK] + _HEURISTIC[(bits >> 16) & ROW_MASK] + \
+        _HEURISTIC[(bits >> 32) & ROW_MASK] + _HEURISTIC[(bits >> 48) & ROW_MASK] + \
+        _HEURISTIC[columns & ROW_MASK] + _HEURISTIC[(columns >> 16) & ROW_MASK] + \
+        _HEURISTIC[(columns >> 32) & ROW_MASK] + _HEURISTIC[(columns >> 48) & ROW_MASK]
+
+
+class LRUCache:
+
+    def __init__(self, max_size: int):
+        """
+        dictionary with bounded size which evicts the least recently used entry and counts hits and misses
+        :param max_size:
+        """
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, min_depth: int = None):
+        """
+        :param key:
+        :param min_depth: if given, the entries are (depth, value) tuples and entries searched with a lower depth are
+            treated as missing, so only entries the caller can use count as hits
+        :return: the entry or None
+        """
+        value = self._data.get(key)
+        if value is None or (min_depth is not None and value[0] < min_depth):
+            self.misses += 1
+            return None
+        else:
+            self.hits += 1
+            self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ExpectimaxAgent(Agent):
+
+    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, depth: int = 2,
+                 min_probability: float = 1e-4, cache_size: int = 1000000):
+        """
+        depth limited expectimax search over the player moves and the tile spawns (2 with p=0.9, 4 with p=0.1) on a
+        packed 4x4 board
+        :param depth: number of player moves that are searched ahead including the current one
+        :param min_probability: chance nodes which are reached with a lower probability are evaluated with the
+            heuristic instead of being expanded
+        :param cache_size: max number of entries of the transposition table and of the move cache
+        """
+        super().__init__(state_shape=state_shape, action_shape=action_shape, name=name)
+        self.depth = depth
+        self.min_probability = min_probability
+        # chance node values keyed on the packed board, with the remaining depth they were searched with
+        self.transposition_table = LRUCache(cache_size)
+        # legal successor boards of a packed board, so moves are only computed once per board
+        self.move_cache = LRUCache(cache_size)
+        self.number_nodes = 0
+        self.search_time = 0.0
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.number_nodes / self.search_time if self.search_time else 0.0
+
+    @property
+    def cache_hit_rate(self) -> float:
+        return self.transposition_table.hit_rate
+
+    def _get_moves(self, bits: int) -> list:
+        moves = self.move_cache.get(bits)
+        if moves is None:
+            moves = []
+            for direction in Direction:
+                new_bits, points = move(bits, direction)
+                if new_bits != bits:
+                    moves.append((direction.value, new_bits))
+            self.move_cache.put(bits, moves)
+        return moves
+
+    def _score_move_node(self, bits: int, depth: int, probability: float) -> float:
+        self.number_nodes += 1
+        best = 0.0
+        for direction, new_bits in self._get_moves(bits):
+            best = max(best, self._score_chance_node(new_bits, depth, probability))
+        return best
+
+    def _score_chance_node(self, bits: int, depth: int, probability: float) -> float:
+        if depth <= 0 or probability < self.min_probability:
+            self.number_nodes += 1
+            return evaluate_board(bits)
+        entry = self.transposition_table.get(bits, min_depth=depth)
+        if entry is not None:
+            return entry[1]
+        self.number_nodes += 1
+
+        number_empty = count_empty(bits)
+        probability /= number_empty
+        score = 0.0
+        for position in range(16):
+            if (bits >> (4 * position)) & 0xF:
+                continue
+            score += 0.9 * self._score_move_node(bits | (1 << (4 * position)), depth - 1, probability * 0.9)
+            score += 0.1 * self._score_move_node(bits | (2 << (4 * position)), depth - 1, probability * 0.1)
+        score /= number_empty
+        self.transposition_table.put(bits, (depth, score))
+        return score
+
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        start = time.perf_counter()
+        bits = pack_board(state_space)
+        best_direction, best_score = 0, -1.0
+        for direction, new_bits in self._get_moves(bits):
+            score = self._score_chance_node(new_bits, self.depth - 1, 1.0)
+            if score > best_score:
+                best_direction, best_score = direction, score
+        self.search_time += time.perf_counter() - start
+        logging.debug(f"{self.name}: {self.nodes_per_second:.0f} nodes/sec, cache hit rate {self.cache_hit_rate:.2f}")
+        return best_direction
@@ -0,0 +1,82 @@
+import logging
+import time
+
+import numpy as np
+
+from src.agents.agent import Agent
+from src.batch_env import move_boards, spawn_tiles
+from src.helpers import legal_actions, to_exponents
+
+
+class MonteCarloAgent(Agent):
+
+    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, number_rollouts: int = 100,
+                 time_budget: float = None, max_depth: int = None, rng=None):
+        """
+        scores every direction by the mean points of random playouts which start with that move and picks the best.
+        The playouts of all directions run together as one batch of boards.
+        :param number_rollouts: number of playouts per direction and round
+        :param time_budget: seconds per decision, rounds of number_rollouts playouts are played until it is used up.
+            If None a single round is played.
+        :param max_depth: max number of random moves per playout, None plays until the game is over
+        :param rng: np.random.Generator or seed of the random moves and tile spawns of the playouts
+        """
+        super().__init__(state_shape=state_shape, action_shape=action_shape, name=name, rng=rng)
+        self.number_rollouts = number_rollouts
+        self.time_budget = time_budget
+        self.max_depth = max_depth
+        self.total_rollouts = 0
+        self.rollout_time = 0.0
+
+    @property
+    def rollouts_per_second(self) -> float:
+        return self.total_rollouts / self.rollout_time if self.rollout_time else 0.0
+
+    def _rollouts(self, exponents: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        plays number_rollouts playouts for every direction. The first move follows Game.make_move with spawn_new=True,
+        after it every playout picks uniformly among the moves which change its board until none is left.
+        :param exponents: board as tile exponents
+        :return: tuple of the summed points per direction and whether the direction moves any tile
+        """
+        number_rollouts = self.number_rollouts
+        start_boards = np.repeat(exponents[None], 4 * number_rollouts, axis=0)
+        boards, points = move_boards(start_boards, np.repeat(np.arange(4), number_rollouts))
+        active = (boards != start_boards).any(axis=(1, 2))
+        legal = active.reshape(4, number_rollouts)[:, 0]
+        spawn_tiles(boards, active, self.rng)
+
+        depth = 0
+        while active.any() and (self.max_depth is None or depth < self.max_depth):
+            idxes = np.flatnonzero(active)
+            moves = legal_actions(boards[idxes])
+            alive = moves.any(axis=1)
+            active[idxes[~alive]] = False
+            idxes, moves = idxes[alive], moves[alive]
+            if idxes.size == 0:
+                break
+            directions = np.argmax(moves * self.rng.random(moves.shape), axis=1)
+            moved, move_points = move_boards(boards[idxes], directions)
+            spawn_tiles(moved, np.ones(idxes.size, dtype=bool), self.rng)
+            boards[idxes] = moved
+            points[idxes] += move_points
+            depth += 1
+        return points.reshape(4, number_rollouts).sum(axis=1), legal
+
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        start = time.perf_counter()
+        exponents = to_exponents(state_space)
+        points = np.zeros(4)
+        number_rounds = 0
+        while True:
+            round_points, legal = self._rollouts(exponents)
+            points += round_points
+            number_rounds += 1
+            if self.time_budget is None or time.perf_counter() - start >= self.time_budget:
+                break
+        self.total_rollouts += 4 * self.number_rollouts * number_rounds
+        self.rollout_time += time.perf_counter() - start
+        logging.debug(f"{self.name}: {self.rollouts_per_second:.0f} rollouts/sec")
+        if not legal.any():
+            return 0
+        return int(np.argmax(np.where(legal, points, -np.inf)))
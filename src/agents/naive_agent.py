@@ -1,13 +1,34 @@
 import numpy as np
 
 from src.agents.agent import Agent
+from src.helpers import Direction
+
+# directions the agent falls back to, in this order, when its move does not change the board
+FALLBACK_ORDER = [Direction.UP.value, Direction.LEFT.value, Direction.RIGHT.value, Direction.DOWN.value]
+_FALLBACK_ORDER = np.array(FALLBACK_ORDER)
 
 
 class UpLeftAgent(Agent):
 
-    def decision(self, state_space: np.ndarray) -> int:
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
         if self.number_decisions % 2 == 0:
-            return 0
+            action = 0
         else:
-            return 2
+            action = 2
+        if legal_actions is not None and not legal_actions[action]:
+            for fallback in FALLBACK_ORDER:
+                if legal_actions[fallback]:
+                    return fallback
+        return action
 
+    def decision_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        """
+        all boards of a batch play the same direction, which alternates with every batch
+        """
+        action = Direction.UP.value if self.number_batches % 2 == 0 else Direction.LEFT.value
+        actions = np.full(len(states), action, dtype=np.int64)
+        if legal_actions is None:
+            return actions
+        illegal = ~legal_actions[:, action] & legal_actions.any(axis=1)
+        actions[illegal] = _FALLBACK_ORDER[legal_actions[illegal][:, _FALLBACK_ORDER].argmax(axis=1)]
+        return actions
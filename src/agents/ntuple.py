@@ -0,0 +1,80 @@
+import numpy as np
+
+from src.symmetry import SYMMETRY_PERMUTATIONS
+
+# straight lines and squares of 4 tiles, together with their symmetries they cover every row, column and square
+DEFAULT_TUPLES = [[0, 1, 2, 3], [4, 5, 6, 7], [0, 1, 4, 5], [1, 2, 5, 6], [5, 6, 9, 10]]
+# the 6-tuples of Yeh et al., much stronger but every table holds 16 ** 6 weights
+SIX_TUPLES = [[0, 1, 2, 3, 4, 5], [4, 5, 6, 7, 8, 9], [0, 1, 2, 4, 5, 6], [4, 5, 6, 8, 9, 10]]
+NUMBER_VALUES = 16
+
+
+class NTupleNetwork:
+
+    def __init__(self, tuples: list = None):
+        """
+        value function of a 4x4 board as the sum of lookup tables indexed by the tile exponents of a few tuples of
+        cells. Every tuple is sampled in all 8 symmetries of the board and shares one table between them.
+        :param tuples: list of lists of cell indices (0 - 15, row by row), every tuple takes 16 ** len(tuple) weights
+        """
+        self.tuples = [list(cells) for cells in (tuples or DEFAULT_TUPLES)]
+        # the index of a tuple is sum(16 ** k * exponent of its k-th cell), which is linear in the exponents of the
+        # board, so the indices of all symmetric samples of all tuples are a single product with this matrix
+        permutations = SYMMETRY_PERMUTATIONS
+        self._index_matrix = np.zeros((16, len(permutations), len(self.tuples)), dtype=np.int64)
+        for symmetry, permutation in enumerate(permutations):
+            for number_tuple, cells in enumerate(self.tuples):
+                for k, cell in enumerate(cells):
+                    self._index_matrix[permutation[cell], symmetry, number_tuple] = NUMBER_VALUES ** k
+        table_sizes = [NUMBER_VALUES ** len(cells) for cells in self.tuples]
+        offsets = np.cumsum([0] + table_sizes[:-1]).astype(np.int64)
+        self._index_matrix = self._index_matrix.reshape((16, -1))
+        self._offsets = np.tile(offsets, len(permutations))
+        self.weights = np.zeros(sum(table_sizes), dtype=np.float32)
+
+    def _indices(self, exponents: np.ndarray) -> np.ndarray:
+        """
+        :param exponents: np array with shape (number_boards, 16) of tile exponents
+        :return: np array with shape (number_boards, 8 * number_tuples) of indices into weights
+        """
+        return exponents.astype(np.int64) @ self._index_matrix + self._offsets
+
+    def value(self, exponents: np.ndarray) -> np.ndarray:
+        """
+        :param exponents: np array with shape (number_boards, 16) of tile exponents
+        :return: np array with shape (number_boards, ) of values
+        """
+        return self.weights[self._indices(exponents)].sum(axis=1)
+
+    def update(self, exponents: np.ndarray, deltas: np.ndarray):
+        """
+        adds every delta to all weights used by the value of its board
+        :param exponents: np array with shape (number_boards, 16) of tile exponents
+        :param deltas: np array with shape (number_boards, )
+        """
+        indices = self._indices(exponents)
+        np.add.at(self.weights, indices.ravel(), np.repeat(np.asarray(deltas, dtype=np.float32), indices.shape[1]))
+
+    @staticmethod
+    def _npz_path(path: str) -> str:
+        # np.savez appends .npz to paths without it, np.load does not, so both use the full file name
+        return path if path.endswith(".npz") else path + ".npz"
+
+    def save(self, path: str):
+        """
+        :param path: file name, .npz is appended if it is missing
+        """
+        path = self._npz_path(path)
+        tuple_length = max(len(cells) for cells in self.tuples)
+        np.savez(path, weights=self.weights,
+                 tuples=np.array([cells + [-1] * (tuple_length - len(cells)) for cells in self.tuples]))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        :param path: file name, .npz is appended if it is missing
+        """
+        data = np.load(cls._npz_path(path))
+        network = cls([[cell for cell in cells if cell >= 0] for cells in data["tuples"].tolist()])
+        network.weights[:] = data["weights"]
+        return network
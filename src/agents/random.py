@@ -5,5 +5,17 @@ from src.agents.agent import Agent
 
 class RandomAgent(Agent):
 
-    def decision(self, state_space: np.ndarray) -> int:
-        return int(np.random.choice([0, 1, 2, 3]))
\ No newline at end of file
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        if legal_actions is not None and legal_actions.any():
+            legal = np.flatnonzero(legal_actions)
+            return int(legal[int(self.rng.random() * len(legal))])
+        return int(self.rng.random() * 4)
+
+    def decision_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        uniforms = self.rng.random(len(states))
+        if legal_actions is None:
+            return (uniforms * 4).astype(np.int64)
+        # boards without a legal move choose among all directions
+        choices = np.where(legal_actions.any(axis=1)[:, None], legal_actions, True)
+        targets = (uniforms * choices.sum(axis=1)).astype(np.int64)
+        return np.argmax(np.cumsum(choices, axis=1) > targets[:, None], axis=1)
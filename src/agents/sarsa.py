@@ -1,5 +1,170 @@
+import time
+
+import numpy as np
+
 from src.agents.agent import Agent
+from src.agents.ntuple import NTupleNetwork
+from src.batch_env import move_boards
+from src.bitboard import move, pack_board
+from src.helpers import Direction, to_exponents
+
+_NIBBLE_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
 
 
 class SARSA(Agent):
-    pass
+
+    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, learning_rate: float = 0.0025,
+                 tuples: list = None):
+        """
+        TD(0) learner of afterstate values with an n-tuple network. The agent picks the move with the highest
+        reward plus value of the board after the move (before the spawn) and moves the value of its last afterstate
+        towards the reward plus value of the best afterstate of the next board. Expects the raw 4x4 board as state,
+        so the Env must not use flattened_state.
+        :param learning_rate: step size of every single weight
+        :param tuples: cell tuples of the n-tuple network, see NTupleNetwork
+        """
+        super().__init__(state_shape=state_shape, action_shape=action_shape, name=name)
+        self.learning_rate = learning_rate
+        self.network = NTupleNetwork(tuples)
+        self.number_updates = 0
+        self.update_time = 0.0
+        self._afterstate = None
+        self._next_choice = None
+        # the same for the boards of decision_batch and get_feedback_batch
+        self._batch_afterstates = None
+        self._batch_next_choice = None
+
+    @property
+    def updates_per_second(self) -> float:
+        return self.number_updates / self.update_time if self.update_time else 0.0
+
+    def _evaluate_moves(self, state: np.ndarray) -> (int, np.ndarray, float):
+        """
+        :return: tuple of the best action, its afterstate as flat exponents and reward plus afterstate value. If no
+            move changes the board the action is 0 and the value is 0.
+        """
+        bits = pack_board(state)
+        moves = [move(bits, direction) for direction in Direction]
+        legal = np.array([new_bits != bits for new_bits, points in moves])
+        rewards = np.array([points for new_bits, points in moves])
+        packed = np.array([new_bits for new_bits, points in moves], dtype=np.uint64)
+        afterstates = ((packed[:, None] >> _NIBBLE_SHIFTS) & np.uint64(0xF)).astype(np.uint8)
+        if not legal.any():
+            return 0, afterstates[0], 0.0
+        values = np.where(legal, rewards + self.network.value(afterstates), -np.inf)
+        action = int(np.argmax(values))
+        return action, afterstates[action], float(values[action])
+
+    def _evaluate_moves_batch(self, exponents: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+        """
+        _evaluate_moves for many boards of tile exponents with shape (number_boards, 4, 4)
+        :return: tuple of the best actions, their reward plus afterstate value and their afterstates as flat exponents
+            with shape (number_boards, 16). Boards without a move get action 0, value 0 and themselves as afterstate.
+        """
+        values = np.full((len(exponents), 4), -np.inf)
+        afterstates = np.empty((4, len(exponents), 16), dtype=np.uint8)
+        for direction in range(4):
+            moved, points = move_boards(exponents, np.full(len(exponents), direction))
+            afterstates[direction] = moved.reshape((-1, 16))
+            legal = (moved != exponents).any(axis=(1, 2))
+            values[legal, direction] = points[legal] + self.network.value(afterstates[direction, legal])
+        actions = values.argmax(axis=1)
+        indices = np.arange(len(exponents))
+        best = values[indices, actions]
+        return actions, np.where(np.isfinite(best), best, 0.0), afterstates[actions, indices]
+
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        if self._next_choice is not None and np.array_equal(self._next_choice[0], state_space):
+            action, afterstate, value = self._next_choice[1]
+        else:
+            action, afterstate, value = self._evaluate_moves(state_space)
+        self._afterstate = afterstate
+        return action
+
+    def decision_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        """
+        greedy decisions for many boards, the afterstate of every board is kept for get_feedback_batch
+        """
+        exponents = to_exponents(states)
+        if self._batch_next_choice is not None and np.array_equal(self._batch_next_choice[0], exponents):
+            actions, values, afterstates = self._batch_next_choice[1]
+        else:
+            actions, values, afterstates = self._evaluate_moves_batch(exponents)
+        self._batch_afterstates = afterstates
+        return actions
+
+    def learn_batch(self, obses_t: np.ndarray, actions: np.ndarray, rewards: np.ndarray, obses_tp1: np.ndarray,
+                    dones: np.ndarray):
+        """
+        the TD(0) update of _get_feedback_inner for a batch of transitions, for example sampled from a replay
+        buffer. The value of the afterstate of every transition moves towards the reward plus value of the best
+        afterstate of its next board, which is 0 if the game is over. The reward of the transition itself is part
+        of the value of the previous afterstate and is not used.
+        :param obses_t: np array with shape (batch_size, 4, 4) of tile values
+        :param actions:
+        :param rewards:
+        :param obses_tp1: np array with shape (batch_size, 4, 4) of tile values
+        :param dones:
+        """
+        start = time.perf_counter()
+        afterstates = move_boards(to_exponents(obses_t), np.asarray(actions, dtype=np.int64))[0].reshape((-1, 16))
+        targets = np.where(np.asarray(dones, dtype=bool), 0.0, self._evaluate_moves_batch(to_exponents(obses_tp1))[1])
+        deltas = targets - self.network.value(afterstates)
+        self.network.update(afterstates, self.learning_rate * deltas)
+        self.number_updates += len(afterstates)
+        self.update_time += time.perf_counter() - start
+
+    def get_parameters(self) -> np.ndarray:
+        return self.network.weights
+
+    def set_parameters(self, parameters: np.ndarray):
+        self.network.weights[:] = parameters
+        # evaluations of the old weights must not be reused
+        self._next_choice = None
+        self._batch_next_choice = None
+
+    def _get_feedback_inner(self, state: np.ndarray, action: int, reward: float, finished: bool):
+        if self._afterstate is None:
+            return
+        start = time.perf_counter()
+        if finished:
+            target = 0.0
+            self._next_choice = None
+        else:
+            choice = self._evaluate_moves(state)
+            target = choice[2]
+            # the next decision is taken on the same board, so its evaluation is kept
+            self._next_choice = (np.array(state), choice)
+        afterstate = self._afterstate[None]
+        delta = target - self.network.value(afterstate)[0]
+        self.network.update(afterstate, [self.learning_rate * delta])
+        if finished:
+            self._afterstate = None
+        self.number_updates += 1
+        self.update_time += time.perf_counter() - start
+
+    def _get_feedback_inner_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray,
+                                  finished: np.ndarray):
+        """
+        _get_feedback_inner for all boards of the last decision_batch at once. The boards of finished games are
+        already reset, their target is 0.
+        """
+        if self._batch_afterstates is None or len(self._batch_afterstates) != len(states):
+            return
+        start = time.perf_counter()
+        exponents = to_exponents(states)
+        choice = self._evaluate_moves_batch(exponents)
+        targets = np.where(np.asarray(finished, dtype=bool), 0.0, choice[1])
+        # the next decisions are taken on the same boards, so their evaluation is kept
+        self._batch_next_choice = (exponents, choice)
+        deltas = targets - self.network.value(self._batch_afterstates)
+        self.network.update(self._batch_afterstates, self.learning_rate * deltas)
+        self.number_updates += len(deltas)
+        self._batch_afterstates = None
+        self.update_time += time.perf_counter() - start
+
+    def save(self, path: str):
+        self.network.save(path)
+
+    def load(self, path: str):
+        self.network = NTupleNetwork.load(path)
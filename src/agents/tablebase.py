@@ -0,0 +1,29 @@
+import numpy as np
+
+from src.agents.agent import Agent
+from src.tablebase import NO_ACTION, Tablebase
+
+
+class TablebaseAgent(Agent):
+
+    def __init__(self, state_shape: tuple, action_shape: tuple, name: str, path: str, caching: bool = False,
+                 rng=None):
+        """
+        plays the optimal moves of a tablebase written by src.tablebase.build_tablebase. Boards which are not in the
+        tablebase, for example after the final tile of a tablebase with max_tile, get the first legal direction.
+        :param path: tablebase file, it is memory mapped
+        """
+        super().__init__(state_shape, action_shape, name, caching=caching, rng=rng)
+        self.tablebase = Tablebase(path)
+
+    def decision(self, state_space: np.ndarray, legal_actions: np.ndarray = None) -> int:
+        return int(self.decision_batch(np.asarray(state_space)[None],
+                                       None if legal_actions is None else np.asarray(legal_actions)[None])[0])
+
+    def decision_batch(self, states: np.ndarray, legal_actions: np.ndarray = None) -> np.ndarray:
+        _, actions = self.tablebase.lookup_batch(states)
+        actions = actions.astype(np.int64)
+        unknown = actions == NO_ACTION
+        if unknown.any():
+            actions[unknown] = 0 if legal_actions is None else legal_actions[unknown].argmax(axis=1)
+        return actions
@@ -0,0 +1,157 @@
+import numpy as np
+
+from src.helpers import Direction, legal_actions, slide_rows, to_values
+
+
+def _orient(exponents: np.ndarray, direction: int) -> np.ndarray:
+    """
+    returns a view of the boards in which the move in the given direction is a move to the left
+    """
+    if direction == Direction.LEFT.value:
+        return exponents
+    elif direction == Direction.RIGHT.value:
+        return exponents[:, :, ::-1]
+    elif direction == Direction.UP.value:
+        return exponents.transpose(0, 2, 1)
+    elif direction == Direction.DOWN.value:
+        return exponents.transpose(0, 2, 1)[:, :, ::-1]
+    raise ValueError("Invalid direction")
+
+
+def _restore(exponents: np.ndarray, direction: int) -> np.ndarray:
+    """
+    inverse of _orient
+    """
+    if direction == Direction.DOWN.value:
+        return exponents[:, :, ::-1].transpose(0, 2, 1)
+    return _orient(exponents, direction)
+
+
+def move_boards(exponents: np.ndarray, directions: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    applies one move per board without spawning new tiles
+    :param exponents: np array with shape (number_boards, number_tiles, number_tiles) holding tile exponents
+    :param directions: np array with shape (number_boards, ) holding the Direction values
+    :return: tuple of the moved boards and the points gained per board
+    """
+    directions = np.asarray(directions)
+    if not np.isin(directions, np.arange(4)).all():
+        raise ValueError("Invalid direction")
+    result = np.empty_like(exponents)
+    points = np.zeros(len(exponents), dtype=np.int64)
+    for direction in range(4):
+        mask = directions == direction
+        if not mask.any():
+            continue
+        moved, row_points = slide_rows(_orient(exponents[mask], direction))
+        result[mask] = _restore(moved, direction)
+        points[mask] = row_points.sum(axis=1)
+    return result, points
+
+
+def spawn_tiles(exponents: np.ndarray, mask: np.ndarray, rng: np.random.Generator):
+    """
+    spawns a 2 (p=0.9) or a 4 (p=0.1) on a uniformly chosen empty tile of every masked board, in place.
+    Boards without empty tiles are left untouched. Like Game, every spawning board takes a pair of uniforms, the first
+    one for the value and the second one for the position among its empty tiles in ascending order, so a single board
+    spawns the same tiles as a Game with the same seed.
+    :param exponents: C-contiguous np array with shape (number_boards, number_tiles, number_tiles)
+    :param mask: np bool array with shape (number_boards, )
+    :param rng:
+    :return:
+    """
+    flat = exponents.reshape(len(exponents), -1)
+    empty = flat == 0
+    number_empty = empty.sum(axis=1)
+    indices = np.flatnonzero(mask & (number_empty > 0))
+    if indices.size == 0:
+        return
+    uniforms = rng.random((indices.size, 2))
+    target = (uniforms[:, 1] * number_empty[indices]).astype(np.int64)
+    positions = np.argmax(np.cumsum(empty[indices], axis=1) > target[:, None], axis=1)
+    flat[indices, positions] = np.where(uniforms[:, 0] < 0.9, 1, 2)
+
+
+class BatchEnv:
+    """
+    Plays number_boards games at once. All boards live in one (number_boards, number_tiles, number_tiles) array of
+    tile exponents and every step moves, merges and spawns on all of them with array operations. Moves which do not
+    change a board leave it as it is. Boards without a legal move are finished, they are reset automatically and
+    their final points are appended to point_history. With an assigned agent, run lets it decide for all boards at
+    once through Agent.decide_batch and Agent.get_feedback_batch.
+    """
+
+    def __init__(self, number_boards: int, number_tiles: int = 4, seed: int = None):
+        self.number_boards = number_boards
+        self.number_tiles = number_tiles
+        self.rng = np.random.default_rng(seed)
+        self.point_history = []
+        self.agent = None
+        self.reset()
+
+    def reset(self) -> np.ndarray:
+        """
+        starts a new game on every board
+        :return: the boards as tile values
+        """
+        self._exponents = np.zeros((self.number_boards, self.number_tiles, self.number_tiles), dtype=np.uint8)
+        self.points = np.zeros(self.number_boards, dtype=np.int64)
+        self.final_exponents = np.zeros((0, self.number_tiles, self.number_tiles), dtype=np.uint8)
+        self._reset_boards(np.ones(self.number_boards, dtype=bool))
+        return self.boards
+
+    def _reset_boards(self, mask: np.ndarray):
+        self._exponents[mask] = 0
+        self.points[mask] = 0
+        spawn_tiles(self._exponents, mask, self.rng)
+        spawn_tiles(self._exponents, mask, self.rng)
+
+    @property
+    def boards(self) -> np.ndarray:
+        return to_values(self._exponents)
+
+    @property
+    def exponents(self) -> np.ndarray:
+        return self._exponents
+
+    def legal_actions(self) -> np.ndarray:
+        """
+        :return: np bool array with shape (number_boards, 4) which is True for the directions which move any tile
+        """
+        return legal_actions(self._exponents)
+
+    def step(self, actions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+        """
+
+        :param actions: np array with shape (number_boards, ) holding one Direction value per board
+        :return: Rewards, Actions, States, finished mask. States of finished boards are already reset, their last
+            boards are kept as tile exponents in final_exponents.
+        """
+        moved, rewards = move_boards(self._exponents, actions)
+        spawn_tiles(moved, (moved != self._exponents).any(axis=(1, 2)), self.rng)
+        self._exponents = moved
+        dones = ~legal_actions(self._exponents).any(axis=1)
+        self.points += rewards
+        self.final_exponents = self._exponents[dones]
+        if dones.any():
+            self.point_history.extend(self.points[dones].tolist())
+            self._reset_boards(dones)
+        return rewards, actions, self.boards, dones
+
+    def assign_agent(self, agent):
+        self.agent = agent
+
+    def run(self, number_steps: int) -> int:
+        """
+        plays number_steps steps on every board with the assigned agent
+        :param number_steps:
+        :return: number of games finished during the steps
+        """
+        if self.agent is None:
+            raise ValueError("Agent must be assigned first")
+        number_games = len(self.point_history)
+        for _ in range(number_steps):
+            actions = self.agent.decide_batch(self.boards, legal_actions=self.legal_actions())
+            rewards, actions, states, dones = self.step(actions)
+            self.agent.get_feedback_batch(states, actions, rewards, dones)
+        return len(self.point_history) - number_games
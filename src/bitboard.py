@@ -0,0 +1,209 @@
+import numpy as np
+
+from src.helpers import Direction, UniformBlocks, make_rng, slide_rows
+
+# the board is stored as a single 64 bit integer, every tile takes 4 bits holding its exponent
+# (0 = empty, 1 = 2, 2 = 4, ..., 15 = 32768). Tile (i, j) sits in nibble 4 * i + j, so every row is one 16 bit word
+# and moves can be applied row by row through lookup tables with 65536 entries.
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15
+
+
+def _build_row_tables():
+    rows = np.arange(ROW_MASK + 1, dtype=np.int64)
+    nibbles = np.stack([(rows >> (4 * j)) & 0xF for j in range(4)], axis=1).astype(np.uint8)
+    left, left_score = slide_rows(nibbles)
+    right, right_score = slide_rows(nibbles[:, ::-1])
+    right = right[:, ::-1]
+    shifts = np.array([0, 4, 8, 12], dtype=np.int64)
+    left = (np.minimum(left, MAX_EXPONENT).astype(np.int64) << shifts).sum(axis=1)
+    right = (np.minimum(right, MAX_EXPONENT).astype(np.int64) << shifts).sum(axis=1)
+    return left.astype(np.uint16), right.astype(np.uint16), left_score, right_score
+
+
+ROW_LEFT, ROW_RIGHT, ROW_LEFT_SCORE, ROW_RIGHT_SCORE = _build_row_tables()
+# plain lists are much faster than numpy arrays for single element lookups with python integers
+_ROW_LEFT = ROW_LEFT.tolist()
+_ROW_RIGHT = ROW_RIGHT.tolist()
+_ROW_LEFT_SCORE = ROW_LEFT_SCORE.tolist()
+_ROW_RIGHT_SCORE = ROW_RIGHT_SCORE.tolist()
+# whether a move changes the row, so legal moves are found without applying them
+_ROW_CAN_LEFT = (ROW_LEFT != np.arange(ROW_MASK + 1)).tolist()
+_ROW_CAN_RIGHT = (ROW_RIGHT != np.arange(ROW_MASK + 1)).tolist()
+
+
+def pack_board(board: np.ndarray) -> int:
+    """
+    packs a 4x4 board of tile values into a 64 bit integer of tile exponents
+    :param board: np array with the tile values (0, 2, 4, ...)
+    :return: int
+    """
+    bits = 0
+    for position, value in enumerate(np.asarray(board).ravel().tolist()):
+        if value:
+            bits |= min(int(value).bit_length() - 1, MAX_EXPONENT) << (4 * position)
+    return bits
+
+
+def unpack_board(bits: int) -> np.ndarray:
+    """
+    unpacks a 64 bit integer of tile exponents into a 4x4 board of tile values
+    :param bits:
+    :return: np array with the tile values (0, 2, 4, ...)
+    """
+    exponents = [(bits >> (4 * position)) & 0xF for position in range(16)]
+    return np.array([1 << e if e else 0 for e in exponents], dtype=int).reshape((4, 4))
+
+
+def transpose(bits: int) -> int:
+    """
+    transposes the board so that columns can be moved with the row tables
+    :param bits:
+    :return: int
+    """
+    a1 = bits & 0xF0F00F0FF0F00F0F
+    a2 = bits & 0x0000F0F00000F0F0
+    a3 = bits & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def count_empty(bits: int) -> int:
+    """
+    counts the empty tiles of the board
+    :param bits:
+    :return: int
+    """
+    bits |= (bits >> 2) & 0x3333333333333333
+    bits |= bits >> 1
+    bits = ~bits & 0x1111111111111111
+    return bin(bits).count("1")
+
+
+def _apply_row_table(bits: int, table: list, score_table: list) -> (int, int):
+    points = 0
+    result = 0
+    for shift in (0, 16, 32, 48):
+        row = (bits >> shift) & ROW_MASK
+        result |= table[row] << shift
+        points += score_table[row]
+    return result, points
+
+
+def move(bits: int, direction: Direction) -> (int, int):
+    """
+    applies a move to the packed board without spawning a new tile
+    :param bits: packed board
+    :param direction:
+    :return: tuple of the packed board after the move and the points gained
+    """
+    if direction == Direction.LEFT:
+        return _apply_row_table(bits, _ROW_LEFT, _ROW_LEFT_SCORE)
+    elif direction == Direction.RIGHT:
+        return _apply_row_table(bits, _ROW_RIGHT, _ROW_RIGHT_SCORE)
+    elif direction == Direction.UP:
+        result, points = _apply_row_table(transpose(bits), _ROW_LEFT, _ROW_LEFT_SCORE)
+    elif direction == Direction.DOWN:
+        result, points = _apply_row_table(transpose(bits), _ROW_RIGHT, _ROW_RIGHT_SCORE)
+    else:
+        raise ValueError("Invalid direction")
+    return transpose(result), points
+
+
+def legal_moves(bits: int) -> list:
+    """
+    which directions change the packed board, looked up per row and column
+    :param bits:
+    :return: list of 4 bools indexed by the Direction values
+    """
+    columns = transpose(bits)
+    up = down = left = right = False
+    for shift in (0, 16, 32, 48):
+        row = (bits >> shift) & ROW_MASK
+        column = (columns >> shift) & ROW_MASK
+        up = up or _ROW_CAN_LEFT[column]
+        down = down or _ROW_CAN_RIGHT[column]
+        left = left or _ROW_CAN_LEFT[row]
+        right = right or _ROW_CAN_RIGHT[row]
+    return [up, down, left, right]
+
+
+class BitboardGame:
+    """
+    Drop-in replacement for Game which keeps the 4x4 board in a single 64 bit integer and applies moves through
+    precomputed row tables instead of rotating and looping over a numpy array. Tiles are capped at 32768.
+    """
+
+    def __init__(self, number_tiles: int = 4, rng=None):
+        """
+
+        :param number_tiles:
+        :param rng: np.random.Generator or seed of the tile spawns, a seed gives the same game as Game with that seed
+        """
+        if number_tiles != 4:
+            raise ValueError("BitboardGame only supports a 4x4 board")
+        self.points = 0
+        self.number_tiles = number_tiles
+        self.bits = 0
+        self._rng, self.seed = make_rng(rng)
+        self._uniforms = UniformBlocks(self._rng)
+        # (flat position, value) of the tile spawned by the last move, None if no tile spawned
+        self.last_spawn = None
+        self._generate_tile_and_assign_to_board()
+        self._generate_tile_and_assign_to_board()
+
+    @property
+    def board(self) -> np.ndarray:
+        return unpack_board(self.bits)
+
+    @board.setter
+    def board(self, board: np.ndarray):
+        self.bits = pack_board(board)
+
+    @property
+    def _empty_tiles(self) -> set:
+        return {(position // 4, position % 4) for position in range(16) if not (self.bits >> (4 * position)) & 0xF}
+
+    def _generate_tile_and_assign_to_board(self):
+        """
+        Generates a new tile on the board by randomly choosing from the
+        possible values of 2 or 4.
+        :return bool: True if the board is not full, False otherwise.
+        """
+        empty_positions = [position for position in range(16) if not (self.bits >> (4 * position)) & 0xF]
+        if len(empty_positions) == 0:
+            return False
+        value_uniform, position_uniform = self._uniforms.pair()
+        tile_exponent = 1 if value_uniform < 0.9 else 2
+        tile_position = empty_positions[int(position_uniform * len(empty_positions))]
+        self.bits |= tile_exponent << (4 * tile_position)
+        self.last_spawn = (tile_position, 2 ** tile_exponent)
+        return True
+
+    def legal_actions(self) -> np.ndarray:
+        """
+        :return: np bool array with shape (4, ) indexed by the Direction values
+        """
+        return np.array(legal_moves(self.bits))
+
+    def make_move(self, direction: Direction, spawn_new: bool = True):
+        """
+        moves are only applied if they change the board, otherwise nothing happens and no tile spawns
+        :param direction:
+        :param spawn_new: whether a new tile should be spawned after the move
+        :return: "Success", "Invalid Move" or "Game Over" if no legal move is left
+        """
+        self.last_spawn = None
+        new_bits, points = move(self.bits, direction)
+        if new_bits == self.bits:
+            return "Game Over" if not any(legal_moves(self.bits)) else "Invalid Move"
+        self.bits = new_bits
+        self.points += points
+        if spawn_new:
+            self._generate_tile_and_assign_to_board()
+        if not any(legal_moves(self.bits)):
+            return "Game Over"
+        return "Success"
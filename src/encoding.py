@@ -0,0 +1,109 @@
+import functools
+
+import numpy as np
+
+# largest exponent which can appear on a 4x4 board (131072), larger values are clipped to it
+_MAX_EXPONENT = 17
+
+
+@functools.lru_cache(maxsize=None)
+def _exponent_table() -> np.ndarray:
+    """
+    read only table of the exponent of every value up to 2 ** _MAX_EXPONENT, 0 for values which are no power of two.
+    It is built on first use and shared by all encoders.
+    """
+    values = np.arange(2 ** _MAX_EXPONENT + 1)
+    powers_of_two = (values > 0) & (values & (values - 1) == 0)
+    exponents = np.where(powers_of_two, np.log2(np.maximum(values, 1)), 0).astype(np.uint8)
+    exponents.setflags(write=False)
+    return exponents
+
+
+@functools.lru_cache(maxsize=None)
+def _onehot_index_table(number_powers: int) -> np.ndarray:
+    """
+    read only table of the one hot row of every value, shared by all encoders with number_powers columns. Values
+    without a column get the extra last row of the one hot table, which is all zero.
+    """
+    exponents = _exponent_table()
+    indices = np.where(exponents < number_powers, exponents, number_powers).astype(np.intp)
+    indices.setflags(write=False)
+    return indices
+
+
+class StateEncoder:
+
+    def __init__(self, number_tiles: int = 4, number_powers: int = 14, encoding: str = "onehot", dtype=np.float32,
+                 flatten: bool = True, reuse_buffer: bool = False):
+        """
+        encodes boards of tile values for agents. Values are mapped to exponents with a lookup table, one hot
+        encodings are gathered from the rows of an identity matrix, so no comparisons per possible value are needed.
+        :param number_tiles:
+        :param number_powers: number of one hot columns, column i stands for the value 2 ** i and column 0 for an empty
+            tile. Values which do not fit get an all zero row.
+        :param encoding: "onehot" or "exponent"
+        :param dtype: dtype of the one hot encoding, e.g. np.float32 or bool. Exponents are always uint8.
+        :param flatten: return (number_tiles ** 2 * number_powers, ) instead of (number_tiles, number_tiles,
+            number_powers), or (number_tiles ** 2, ) instead of (number_tiles, number_tiles) for exponents
+        :param reuse_buffer: write every encoding of a single board into the same array instead of allocating a new
+            one. Only use it if the caller does not keep the returned states.
+        """
+        if encoding not in ("onehot", "exponent"):
+            raise ValueError("encoding must be onehot or exponent")
+        self.number_tiles = number_tiles
+        self.number_powers = number_powers
+        self.encoding = encoding
+        self.dtype = np.dtype(dtype) if encoding == "onehot" else np.dtype(np.uint8)
+        self.flatten = flatten
+        self.reuse_buffer = reuse_buffer
+
+        self._exponent_table = _exponent_table()
+        self._onehot_index_table = _onehot_index_table(number_powers)
+        # the extra last row of the one hot table is all zero for values without a column
+        self._onehot_table = np.eye(number_powers + 1, number_powers, dtype=self.dtype)
+        self._shape = self.get_shape()
+        self._buffer = None
+
+    def get_shape(self, number_boards: int = None) -> tuple:
+        shape = (self.number_tiles * self.number_tiles, )
+        if not self.flatten:
+            shape = (self.number_tiles, self.number_tiles)
+        if self.encoding == "onehot":
+            shape = (shape[0] * self.number_powers, ) if self.flatten else shape + (self.number_powers, )
+        return shape if number_boards is None else (number_boards, ) + shape
+
+    def encode(self, board: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        :param board: np array of tile values with number_tiles ** 2 entries
+        :param out: optional C-contiguous array of shape get_shape() to write the encoding to
+        :return: np array of shape get_shape()
+        """
+        if out is None and self.reuse_buffer:
+            if self._buffer is None:
+                self._buffer = np.empty(self._shape, dtype=self.dtype)
+            out = self._buffer
+        return self._encode(board, self._shape, out)
+
+    def encode_batch(self, boards: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        :param boards: np array of tile values with shape (number_boards, number_tiles, number_tiles)
+        :param out: optional C-contiguous array of shape get_shape(number_boards) to write the encodings to
+        :return: np array of shape get_shape(number_boards)
+        """
+        return self._encode(boards, self.get_shape(len(boards)), out)
+
+    def _encode(self, boards: np.ndarray, shape: tuple, out: np.ndarray) -> np.ndarray:
+        boards = np.asarray(boards).ravel()
+        # reshape returns a copy of non contiguous arrays, the encoding would silently not end up in out
+        if out is not None and not out.flags.c_contiguous:
+            raise ValueError("out must be C-contiguous")
+        if self.encoding == "exponent":
+            if out is None:
+                return np.take(self._exponent_table, boards, mode="clip").reshape(shape)
+            np.take(self._exponent_table, boards, mode="clip", out=out.reshape(-1))
+            return out
+        indices = np.take(self._onehot_index_table, boards, mode="clip")
+        if out is None:
+            return np.take(self._onehot_table, indices, axis=0).reshape(shape)
+        np.take(self._onehot_table, indices, axis=0, out=out.reshape((-1, self.number_powers)))
+        return out
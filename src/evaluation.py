@@ -0,0 +1,302 @@
+import collections
+import json
+import logging
+import math
+import multiprocessing
+import statistics
+import time
+
+import numpy as np
+
+from src.parallel import run_games
+
+TESTS = ("sprt", "ci")
+
+
+class StreamingStats:
+
+    def __init__(self):
+        """
+        count, mean, variance, min and max of a stream of numbers in constant memory (Welford, batches are merged
+        with the update of Chan et al.)
+        """
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if values.size == 0:
+            return
+        count = self.count + values.size
+        batch_mean = float(values.mean())
+        delta = batch_mean - self.mean
+        self._m2 += float(((values - batch_mean) ** 2).sum()) + delta ** 2 * self.count * values.size / count
+        self.mean += delta * values.size / count
+        self.count = count
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def variance(self) -> float:
+        """
+        sample variance, 0 for less than two values
+        """
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def standard_error(self) -> float:
+        return math.sqrt(self.variance / self.count) if self.count else math.inf
+
+    def confidence_interval(self, confidence: float = 0.95) -> (float, float):
+        """
+        normal approximation of the confidence interval of the mean
+        """
+        half_width = statistics.NormalDist().inv_cdf(0.5 + confidence / 2) * self.standard_error
+        return self.mean - half_width, self.mean + half_width
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "std": math.sqrt(self.variance),
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+
+class AgentStats:
+
+    def __init__(self, win_tile: int = 2048, points_bin_width: int = 256):
+        """
+        streaming statistics of the games of one agent
+        :param win_tile: a game is won once a tile of at least this value appears
+        :param points_bin_width: width of the bins of the points histogram. The number of bins is bounded by the
+            highest points divided by it, not by the number of games.
+        """
+        self.win_tile = win_tile
+        self.points_bin_width = points_bin_width
+        self.points = StreamingStats()
+        self.steps = StreamingStats()
+        self.wins = StreamingStats()
+        self.max_tiles = collections.Counter()
+        # number of games per lower edge of a points bin
+        self.points_bins = collections.Counter()
+
+    def add(self, points: np.ndarray, steps: np.ndarray, max_tiles: np.ndarray):
+        self.points.add(points)
+        self.steps.add(steps)
+        self.wins.add(np.asarray(max_tiles) >= self.win_tile)
+        self.max_tiles.update(int(tile) for tile in max_tiles)
+        edges, counts = np.unique(np.asarray(points) // self.points_bin_width * self.points_bin_width,
+                                  return_counts=True)
+        self.points_bins.update(dict(zip(edges.tolist(), counts.tolist())))
+
+    def to_dict(self, confidence: float = 0.95) -> dict:
+        games = self.points.count
+        return {"games": games,
+                "points": {**self.points.to_dict(), "ci": self.points.confidence_interval(confidence)},
+                "steps": self.steps.to_dict(),
+                "win_rate": self.wins.mean,
+                "win_rate_ci": self.wins.confidence_interval(confidence),
+                "max_tile_distribution": {str(tile): count / games for tile, count in sorted(self.max_tiles.items())},
+                "points_histogram": {"bin_width": self.points_bin_width,
+                                     "counts": {str(edge): count for edge, count in sorted(self.points_bins.items())}}}
+
+
+def sprt_bounds(alpha: float, beta: float) -> (float, float):
+    """
+    log likelihood ratio bounds of Wald's sequential probability ratio test
+    :param alpha: probability to decide for H1 although H0 holds
+    :param beta: probability to decide for H0 although H1 holds
+    :return: tuple of the lower bound (decide H0) and the upper bound (decide H1)
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_llr(differences: StreamingStats, delta: float) -> float:
+    """
+    log likelihood ratio of H1: the mean difference is delta against H0: it is 0, with normally distributed
+    differences whose variance is estimated from the sample. A negative delta tests for a negative difference.
+    0 for less than two differences or differences without variance, see Evaluation for the latter.
+    """
+    if differences.count < 2 or differences.variance == 0:
+        return 0.0
+    return delta * (differences.mean - delta / 2) * differences.count / differences.variance
+
+
+def _play_batch(task: tuple) -> list:
+    return run_games(*task)
+
+
+class Evaluation:
+
+    def __init__(self, agent_factories: dict, env_kwargs: dict = None, test: str = "sprt", batch_size: int = 20,
+                 min_games: int = 100, max_games: int = 10000, processes: int = 1, seed: int = 0,
+                 win_tile: int = 2048, delta: float = 100.0, alpha: float = 0.05, beta: float = 0.05,
+                 confidence: float = 0.95, precision: float = None, points_bin_width: int = 256):
+        """
+        plays batches of games until a sequential test decides. With two agents both play every batch on the same
+        seeds, so game i of one agent sees the same spawn random numbers as game i of the other one and the paired
+        point differences vary much less than the points. Only streaming statistics are kept, the memory does not
+        grow with the number of games.
+        Tests of two agents:
+        - sprt: Sobel and Wald's three decision test, two of Wald's sequential tests of H0: both agents score the same
+          against H1: the first agent scores delta points per game more, and against H1: the second one does. It
+          decides for the agent whose H1 is accepted or for a tie once both H0 are accepted, each test with error
+          probabilities alpha and beta. Paired differences without any variance, e.g. of two deterministic agents
+          playing the same games, decide by the sign of their mean.
+        - ci: stops once the confidence interval of the mean difference excludes 0 or is narrower than
+          2 * precision, which counts as a tie.
+        One agent is played until the confidence interval of its mean points is narrower than 2 * precision.
+        :param agent_factories: dict of name to picklable callable without arguments returning an Agent, one or two
+        :param env_kwargs: keyword arguments of the Env of every batch
+        :param test: sprt or ci
+        :param batch_size: games per agent and batch, one batch is the smallest unit of work of a process
+        :param min_games: games per agent before the test may stop
+        :param max_games: games per agent after which the evaluation stops undecided
+        :param processes: number of worker processes, every round plays one batch per process and agent
+        :param seed: the seeds of the batches are derived from it
+        :param win_tile:
+        :param delta: points per game, see sprt
+        :param alpha: see sprt
+        :param beta: see sprt
+        :param confidence: of the confidence intervals
+        :param precision: half width of the confidence interval in points which is precise enough, required for ci
+            and for one agent
+        :param points_bin_width: width of the bins of the points histograms in the report
+        """
+        if not 1 <= len(agent_factories) <= 2:
+            raise ValueError("one or two agents can be evaluated")
+        if test not in TESTS:
+            raise ValueError(f"test must be one of {', '.join(TESTS)}")
+        if precision is None and (test == "ci" or len(agent_factories) == 1):
+            raise ValueError("precision is required for the ci test and the evaluation of one agent")
+        self.agent_factories = dict(agent_factories)
+        self.env_kwargs = env_kwargs or {}
+        self.test = test
+        self.batch_size = batch_size
+        self.min_games = min_games
+        self.max_games = max_games
+        self.processes = processes
+        self.seed = seed
+        self.delta = delta
+        self.alpha = alpha
+        self.beta = beta
+        self.confidence = confidence
+        self.precision = precision
+        self.stats = {name: AgentStats(win_tile, points_bin_width) for name in self.agent_factories}
+        self.differences = StreamingStats()
+        self.pair_results = collections.Counter()
+        self.decision = None
+        self.seconds = 0.0
+
+    @property
+    def number_games(self) -> int:
+        return next(iter(self.stats.values())).points.count
+
+    def _add_round(self, results: dict):
+        for name, games in results.items():
+            points, steps, max_tiles = (np.array(values) for values in zip(*games))
+            self.stats[name].add(points, steps, max_tiles)
+        if len(results) == 2:
+            (first, first_games), (second, second_games) = results.items()
+            differences = np.array([game[0] for game in first_games]) - np.array([game[0] for game in second_games])
+            self.differences.add(differences)
+            self.pair_results.update({first: int((differences > 0).sum()), second: int((differences < 0).sum()),
+                                      "draws": int((differences == 0).sum())})
+
+    def _decide(self):
+        """
+        :return: name of the better agent, "tie", "precise" for a precise enough single agent or None to go on
+        """
+        if self.number_games < self.min_games:
+            return None
+        names = list(self.stats)
+        if len(names) == 1:
+            low, high = self.stats[names[0]].points.confidence_interval(self.confidence)
+            return "precise" if (high - low) / 2 <= self.precision else None
+        if self.test == "sprt":
+            if self.differences.variance == 0:
+                # the likelihood ratio is not defined, every further pair would give the same difference again
+                mean = self.differences.mean
+                return names[0] if mean > 0 else names[1] if mean < 0 else "tie"
+            lower, upper = sprt_bounds(self.alpha, self.beta)
+            first, second = (sprt_llr(self.differences, delta) for delta in (self.delta, -self.delta))
+            if first >= upper:
+                return names[0]
+            if second >= upper:
+                return names[1]
+            if first <= lower and second <= lower:
+                return "tie"
+            return None
+        low, high = self.differences.confidence_interval(self.confidence)
+        if low > 0:
+            return names[0]
+        if high < 0:
+            return names[1]
+        if (high - low) / 2 <= self.precision:
+            return "tie"
+        return None
+
+    def run(self) -> dict:
+        """
+        plays rounds of batches until the test decides or max_games are played
+        :return: report
+        """
+        start = time.perf_counter()
+        seed_sequence = np.random.SeedSequence(self.seed)
+        pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+        map_function = pool.map if pool is not None else lambda function, tasks: list(map(function, tasks))
+        try:
+            while self.decision is None and self.number_games < self.max_games:
+                number_batches = min(self.processes, math.ceil((self.max_games - self.number_games) / self.batch_size))
+                seeds = [int(s.generate_state(1)[0]) for s in seed_sequence.spawn(number_batches)]
+                # every agent plays the same batches, so the games are paired by their seeds
+                tasks = [(self.env_kwargs, factory, self.batch_size, batch_seed)
+                         for factory in self.agent_factories.values() for batch_seed in seeds]
+                batches = map_function(_play_batch, tasks)
+                results = {name: [game for batch in batches[i * number_batches:(i + 1) * number_batches]
+                                  for game in batch]
+                           for i, name in enumerate(self.agent_factories)}
+                self._add_round(results)
+                self.decision = self._decide()
+                logging.info(f"evaluated {self.number_games} games per agent")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self.seconds += time.perf_counter() - start
+        return self.report()
+
+    def report(self) -> dict:
+        report = {"test": self.test if len(self.stats) == 2 else "ci",
+                  "decision": self.decision,
+                  "stopped_early": self.decision is not None and self.number_games < self.max_games,
+                  "games_per_agent": self.number_games,
+                  "seconds": self.seconds,
+                  "parameters": {"batch_size": self.batch_size, "min_games": self.min_games,
+                                 "max_games": self.max_games, "seed": self.seed, "delta": self.delta,
+                                 "alpha": self.alpha, "beta": self.beta, "confidence": self.confidence,
+                                 "precision": self.precision, "env_kwargs": self.env_kwargs},
+                  "agents": {name: stats.to_dict(self.confidence) for name, stats in self.stats.items()}}
+        if len(self.stats) == 2:
+            report["comparison"] = {"difference": self.differences.to_dict(),
+                                    "difference_ci": self.differences.confidence_interval(self.confidence),
+                                    "pair_results": dict(self.pair_results)}
+            if self.test == "sprt":
+                # llr of the test whether the agent scores delta points per game more than the other one
+                report["comparison"]["llr"] = {name: sprt_llr(self.differences, delta)
+                                               for name, delta in zip(self.stats, (self.delta, -self.delta))}
+                report["comparison"]["llr_bounds"] = sprt_bounds(self.alpha, self.beta)
+        return report
+
+
+def compare_agents(agent_factories: dict, **kwargs) -> dict:
+    """
+    runs an Evaluation, see Evaluation for the arguments
+    :return: report
+    """
+    return Evaluation(agent_factories, **kwargs).run()
+
+
+def write_report(report: dict, path: str):
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
@@ -1,61 +1,129 @@
 from math import log
-import pandas as pd
 import numpy as np
 import logging
-import plotly.express as px
+import time
+from typing import Callable
 
 from src.agents.agent import Agent
-from src.agents.naive_agent import UpLeftAgent
-from src.agents.random import RandomAgent
-from src.helpers import Direction
+from src.encoding import StateEncoder
+from src.helpers import Direction, UniformBlocks, accepts_keyword, make_rng
+from src.instrumentation import Instrumentation
+from src.parallel import run_games_parallel
+from src.recorder import EpisodeRecorder
+from src.reporting import histogram_of_points
+
+
+def _no_clock() -> int:
+    return 0
+
+
+def _can_move_towards_start(lines) -> bool:
+    """
+    whether a move towards index 0 changes any of the lines, i.e. a tile has an empty or an equal tile before it
+    """
+    for line in lines:
+        for first, second in zip(line, line[1:]):
+            if second and (first == second or not first):
+                return True
+    return False
 
 
 class Game:
 
-    def __init__(self, number_tiles: int = 4):
+    def __init__(self, number_tiles: int = 4, rng=None):
+        """
+
+        :param number_tiles:
+        :param rng: np.random.Generator or seed of the tile spawns. The same seed and moves always give the same game.
+            None seeds the game from the global np.random state.
+        """
         self.points = 0
         self.number_tiles = number_tiles
         self.board = np.zeros((number_tiles, number_tiles), dtype=int)
-        self._empty_tiles = {(i, j) for i in range(number_tiles)
-                             for j in range(number_tiles)}
+        # flat indices of the empty tiles, only the first _number_empty entries are valid
+        self._empty_positions = np.arange(number_tiles * number_tiles)
+        self._number_empty = number_tiles * number_tiles
+        self._rng, self.seed = make_rng(rng)
+        self._uniforms = UniformBlocks(self._rng)
+        # legal actions of the board with the bytes in _legal_actions_key
+        self._legal_actions_key = None
+        self._legal_actions = None
+        # (flat position, value) of the tile spawned by the last move, None if no tile spawned
+        self.last_spawn = None
         self._generate_tile_and_assign_to_board()
+        # the empty positions are always in board order when a tile spawns, like in BitboardGame
+        self._get_empty_tiles()
         self._generate_tile_and_assign_to_board()
 
+    @property
+    def _empty_tiles(self) -> set:
+        return {(i, j) for i, j in zip(*np.nonzero(self.board == 0))}
+
     def _generate_tile_and_assign_to_board(self):
         """
         Generates a new tile on the board by randomly choosing from the
         possible values of 2 or 4.
         :return bool: True if the board is not full, False otherwise.
         """
-        if len(self._empty_tiles) == 0:
+        if self._number_empty == 0:
             return False
-        tile_value = np.random.choice([2, 4], p=[0.9, 0.1])
-        tile_position_id = np.random.choice(len(self._empty_tiles))
-        tile_position = list(self._empty_tiles)[tile_position_id]
-        self.board[tile_position] = tile_value
-        self._empty_tiles.discard(tile_position)
+        value_uniform, position_uniform = self._uniforms.pair()
+        tile_value = 2 if value_uniform < 0.9 else 4
+        tile_position_id = int(position_uniform * self._number_empty)
+        tile_position = self._empty_positions[tile_position_id]
+        self.board[tile_position // self.number_tiles, tile_position % self.number_tiles] = tile_value
+        self.last_spawn = (int(tile_position), tile_value)
+        # the last empty position takes the place of the filled one
+        self._number_empty -= 1
+        self._empty_positions[tile_position_id] = self._empty_positions[self._number_empty]
         return True
 
-    def make_move(self, direction: Direction, spawn_new: bool = True):
+    def legal_actions(self) -> np.ndarray:
+        """
+        which directions move any tile, found by comparing neighbouring tiles instead of applying the moves. The
+        result is cached until the board changes. Same rule as helpers.legal_actions, but on Python lists, which is
+        about four times faster for a single board than the array version.
+        :return: np bool array with shape (4, ) indexed by the Direction values
         """
+        key = self.board.tobytes()
+        if key != self._legal_actions_key:
+            rows = self.board.tolist()
+            columns = [list(column) for column in zip(*rows)]
+            self._legal_actions = np.array([
+                _can_move_towards_start(columns), _can_move_towards_start([column[::-1] for column in columns]),
+                _can_move_towards_start(rows), _can_move_towards_start([row[::-1] for row in rows])])
+            self._legal_actions_key = key
+        return self._legal_actions.copy()
 
+    def make_move(self, direction: Direction, spawn_new: bool = True):
+        """
+        moves are only applied if they change the board, otherwise nothing happens and no tile spawns
         :param direction:
-        :return:
+        :return: "Success", "Invalid Move" or "Game Over" if no legal move is left
         """
         number_rotations = self._get_number_rotations(direction)
+        self.last_spawn = None
+        legal_actions = self.legal_actions()
+        if not legal_actions.any():
+            return "Game Over"
+        if not legal_actions[direction.value]:
+            return "Invalid Move"
         self._rotate_board(number_rotations=number_rotations)
         self._merge_tiles()
         self._rotate_board(number_rotations=4-number_rotations)
         self._get_empty_tiles()
-        if len(self._empty_tiles) == 0:
-            return "Game Over"
         if spawn_new:
             self._generate_tile_and_assign_to_board()
+        if not self.legal_actions().any():
+            return "Game Over"
         return "Success"
 
     def _get_empty_tiles(self):
-        self._empty_tiles = {(i, j) for i in range(self.number_tiles)
-                             for j in range(self.number_tiles) if self.board[i, j] == 0}
+        # a move shifts whole lines, so nearly every empty position changes and updating the index tile by tile in
+        # the Python merge loops costs more than one vectorized scan. The scan also keeps the positions in board
+        # order, which the spawns of BitboardGame and BatchEnv rely on to match Game for the same seed.
+        self._empty_positions = np.flatnonzero(self.board == 0)
+        self._number_empty = len(self._empty_positions)
 
     def _get_number_rotations(self, direction: Direction):
         if direction == Direction.UP:
@@ -106,7 +174,13 @@ class Game:
 class Env:
 
     def __init__(self, number_tiles: int = 4, max_steps_per_game: int = 500, max_value: int = 8192,
-                 flattened_state: bool = False):
+                 flattened_state: bool = False, bitboard: bool = False, rng=None):
+        """
+
+        :param bitboard: use the BitboardGame engine instead of Game, only available for 4x4 boards
+        :param rng: np.random.Generator or seed from which every game draws the seed of its own tile spawns. None
+            seeds the games from the global np.random state.
+        """
         self.max_steps_per_game = max_steps_per_game
         self.number_tiles = number_tiles
         self.max_value = max_value
@@ -114,14 +188,45 @@ class Env:
         self.possible_numbers = [0] + [2 ** i for i in range(1, self.number_powers)]
         self.agent = None
         self.point_history = []
+        self.steps_history = []
+        self.max_tile_history = []
         self.flattened_state = flattened_state
+        self.encoder = StateEncoder(number_tiles=number_tiles, number_powers=self.number_powers)
+        self.bitboard = bitboard
+        self.rng = None if rng is None else np.random.default_rng(rng)
+        self.instrumentation = None
+        self.recorder = None
         self._init_game()
 
     def assign_agent(self, agent: Agent):
         self.agent = agent
 
+    def assign_instrumentation(self, instrumentation: Instrumentation = None):
+        """
+        times the phases of every step of run, None switches the instrumentation off again. Without instrumentation
+        run takes no timings at all.
+        :param instrumentation:
+        :return:
+        """
+        self.instrumentation = instrumentation
+
+    def assign_recorder(self, recorder: EpisodeRecorder = None):
+        """
+        streams every game of run with all moves and spawns to the recorder, None stops the recording
+        :param recorder:
+        :return:
+        """
+        self.recorder = recorder
+
     def _init_game(self):
-        self.game = Game(number_tiles=self.number_tiles)
+        # an own seed per game, so a single game can be replayed from its seed
+        seed = None if self.rng is None else int(self.rng.integers(2 ** 63))
+        if self.bitboard:
+            # imported here to keep building the row tables out of the import of this module
+            from src.bitboard import BitboardGame
+            self.game = BitboardGame(number_tiles=self.number_tiles, rng=seed)
+        else:
+            self.game = Game(number_tiles=self.number_tiles, rng=seed)
 
     def get_action_space(self):
         return (4, )
@@ -129,9 +234,15 @@ class Env:
     def get_state_space(self):
         return (self.number_tiles ** 2 * self.number_powers, )
 
-    def do_action(self, action: int) -> (int,  int, np.ndarray, bool):
+    def legal_actions(self) -> np.ndarray:
         """
+        :return: np bool array with shape (4, ) which is True for the directions which move any tile
+        """
+        return self.game.legal_actions()
 
+    def do_action(self, action: int) -> (int,  int, np.ndarray, bool):
+        """
+        moves which do not change the board give no reward and do not spawn a tile
         :param action:
         :return: Reward, Action, State, finished
         """
@@ -147,26 +258,58 @@ class Env:
     def run(self):
         if self.agent is None:
             raise ValueError("Agent must be assigned first")
-        finished = False
-        while not finished:
+        instrumentation = self.instrumentation
+        # without instrumentation the timestamps between the phases are all 0 and nothing is recorded
+        clock = _no_clock if instrumentation is None else time.perf_counter_ns
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.start_game(self.game)
+        if instrumentation is not None:
+            instrumentation.start_game()
+        number_steps = 0
+        while True:
+            number_steps += 1
+            start = clock()
             s = self.game.board
-            action = self.agent.play_turn(s)
+            action = self._play_turn(s)
+            played = clock()
             reward, action, state, is_finished = self.do_action(action)
+            if recorder is not None:
+                recorder.record_step(action, reward, self.game.last_spawn)
+            moved = clock()
             if self.flattened_state:
-                state = state.reshape((self.number_tiles * self.number_tiles, ))
-                state = self._get_dummies(state)
-                state = state.reshape(self.number_tiles*self.number_tiles*self.number_powers)
+                state = self.encoder.encode(state)
+            encoded = clock()
+            self.agent.get_feedback(state=state, action=action, reward=reward, finished=is_finished)
+            if instrumentation is not None:
+                instrumentation.record_step(played - start, moved - played, encoded - moved, clock() - encoded)
             if is_finished:
-                self.point_history.append(self.game.points)
+                self._record_game(number_steps)
                 break
+        if instrumentation is not None:
+            instrumentation.end_game(number_steps)
 
-            self.agent.get_feedback(state=state, action=action, reward=reward, finished=is_finished)
+    def _play_turn(self, state: np.ndarray) -> int:
+        legal_actions = self.game.legal_actions()
+        # agents which override play_turn with the signature from before legal_actions are called without the mask
+        if accepts_keyword(type(self.agent).play_turn, "legal_actions"):
+            action = self.agent.play_turn(state, legal_actions=legal_actions)
+        else:
+            action = self.agent.play_turn(state)
+        # moves which change nothing do not spawn a tile, an override repeating one would never finish the game
+        if not legal_actions[action] and legal_actions.any():
+            action = int(np.flatnonzero(legal_actions)[0])
+        return action
+
+    def _record_game(self, number_steps: int):
+        self.point_history.append(self.game.points)
+        self.steps_history.append(number_steps)
+        self.max_tile_history.append(int(self.game.board.max()))
+        if self.recorder is not None:
+            self.recorder.end_game(self.game)
 
     def _get_dummies(self, state):
-        data = np.zeros((self.number_tiles * self.number_tiles, self.number_powers))
-        for i, val in enumerate(self.possible_numbers):
-            data[:, i] = state == val
-        return data
+        return self.encoder.encode(state).reshape((self.number_tiles * self.number_tiles, self.number_powers))
 
     def run_multiple_games(self, number_games: int):
         for game in range(number_games):
@@ -174,7 +317,31 @@ class Env:
             self._init_game()
             self.run()
 
+    def _get_init_kwargs(self) -> dict:
+        return {"number_tiles": self.number_tiles, "max_steps_per_game": self.max_steps_per_game,
+                "max_value": self.max_value, "flattened_state": self.flattened_state, "bitboard": self.bitboard}
+
+    def run_multiple_games_parallel(self, number_games: int, agent_factory: Callable[[], Agent],
+                                    processes: int = None, seed: int = 0, games_per_task: int = None):
+        """
+        plays the games in a process pool. Every worker builds its own Env with the settings of this one and its own
+        agent through agent_factory. The results are appended to point_history, steps_history and max_tile_history
+        in a deterministic order while the tasks finish.
+        :param number_games:
+        :param agent_factory: picklable callable without arguments returning an Agent,
+            e.g. functools.partial(RandomAgent, state_shape=..., action_shape=..., name=...)
+        :param processes: number of worker processes, defaults to the number of cpus
+        :param seed: seed from which the independent seeds of all tasks are derived
+        :param games_per_task: number of games each task plays, small values give finer progress reports
+        :return:
+        """
+        for points, number_steps, max_tile in run_games_parallel(self._get_init_kwargs(), agent_factory, number_games,
+                                                                 processes, seed, games_per_task):
+            self.point_history.append(points)
+            self.steps_history.append(number_steps)
+            self.max_tile_history.append(max_tile)
+
     def create_histogram_of_point_history(self):
-        fig = px.histogram(self.point_history)
-        fig.show()
+        # needs plotly, which is only imported here
+        return histogram_of_points(self.point_history)
     
\ No newline at end of file
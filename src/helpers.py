@@ -1,8 +1,130 @@
+import functools
+import inspect
 from enum import Enum
 
+import numpy as np
+
 
 class Direction(Enum):
     UP = 0
     DOWN = 1
     LEFT = 2
-    RIGHT = 3
\ No newline at end of file
+    RIGHT = 3
+
+
+def make_rng(rng=None) -> (np.random.Generator, int):
+    """
+    :param rng: np.random.Generator, seed, np.random.SeedSequence or None. None draws a seed from the global np.random
+        state, so np.random.seed still reproduces the results.
+    :return: tuple of the generator and its integer seed, the seed is None if it is not known
+    """
+    if rng is None:
+        rng = int(np.random.randint(2 ** 32))
+    if isinstance(rng, np.random.Generator):
+        return rng, None
+    seed = int(rng) if isinstance(rng, (int, np.integer)) else None
+    return np.random.default_rng(rng), seed
+
+
+@functools.lru_cache(maxsize=None)
+def accepts_keyword(function, name: str) -> bool:
+    """
+    whether function can be called with the keyword argument name, so overrides with an older signature can still be
+    called. The result is cached per function.
+    :param function: function or unbound method, e.g. type(agent).decision
+    :param name: name of the keyword argument
+    :return:
+    """
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.kind == parameter.VAR_KEYWORD:
+            return True
+        if parameter.name == name and parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+            return True
+    return False
+
+
+class UniformBlocks:
+
+    def __init__(self, rng: np.random.Generator, block_size: int = 512):
+        """
+        hands out uniform random numbers in pairs which are drawn from rng in blocks, one call of rng per block is
+        much cheaper than one per number. The numbers are the same as drawing them one by one.
+        :param rng:
+        :param block_size: even number of values per block
+        """
+        self.rng = rng
+        self.block_size = block_size
+        self._values = []
+        self._index = 0
+
+    def pair(self) -> (float, float):
+        index = self._index
+        if index >= len(self._values):
+            self._values = self.rng.random(self.block_size).tolist()
+            index = 0
+        self._index = index + 2
+        return self._values[index], self._values[index + 1]
+
+
+def slide_rows(rows: np.ndarray):
+    """
+    slides and merges every row of tile exponents towards index 0, which is a move to the left in 2048 terms.
+    Works on any number of rows at once, the loop only runs over the columns.
+    :param rows: array of tile exponents (0 = empty, 1 = 2, 2 = 4, ...) with shape (..., number_tiles)
+    :return: tuple of the moved rows (same shape and dtype) and the points gained per row
+    """
+    shape = rows.shape
+    rows = rows.reshape(-1, shape[-1])
+    order = np.argsort(rows == 0, axis=1, kind="stable")
+    rows = np.take_along_axis(rows, order, axis=1)
+    points = np.zeros(rows.shape[0], dtype=np.int64)
+    for j in range(shape[-1] - 1):
+        merge = (rows[:, j] == rows[:, j + 1]) & (rows[:, j] != 0)
+        if not merge.any():
+            continue
+        merged = rows[merge]
+        merged[:, j] += 1
+        merged[:, j + 1:-1] = merged[:, j + 2:]
+        merged[:, -1] = 0
+        rows[merge] = merged
+        points[merge] += np.left_shift(1, merged[:, j].astype(np.int64))
+    return rows.reshape(shape), points.reshape(shape[:-1])
+
+
+def to_exponents(boards: np.ndarray) -> np.ndarray:
+    """
+    converts tile values (0, 2, 4, ...) into tile exponents (0, 1, 2, ...)
+    :param boards: np array of any shape with tile values
+    :return: np array of the same shape with dtype uint8
+    """
+    return np.log2(np.maximum(boards, 1)).astype(np.uint8)
+
+
+def to_values(exponents: np.ndarray) -> np.ndarray:
+    """
+    converts tile exponents (0, 1, 2, ...) into tile values (0, 2, 4, ...)
+    :param exponents: np array of any shape with tile exponents
+    :return: np array of the same shape with dtype int
+    """
+    return np.where(exponents > 0, np.left_shift(1, exponents.astype(int)), 0)
+
+
+def legal_actions(boards: np.ndarray) -> np.ndarray:
+    """
+    which directions move any tile, found by comparing neighbouring tiles instead of applying the moves. A move is
+    legal if a tile has an empty neighbour in the direction of the move or two neighbours along it are equal.
+    :param boards: np array of tile values or exponents with shape (..., number_tiles, number_tiles)
+    :return: np bool array with shape (..., 4) indexed by the Direction values
+    """
+    boards = np.asarray(boards)
+
+    def legal_along(first: np.ndarray, second: np.ndarray) -> (np.ndarray, np.ndarray):
+        # first holds the neighbours of second towards index 0
+        merge = (first == second) & (first != 0)
+        towards_first = ((first == 0) & (second != 0)) | merge
+        towards_second = ((second == 0) & (first != 0)) | merge
+        return towards_first.any(axis=(-2, -1)), towards_second.any(axis=(-2, -1))
+
+    up, down = legal_along(boards[..., :-1, :], boards[..., 1:, :])
+    left, right = legal_along(boards[..., :, :-1], boards[..., :, 1:])
+    return np.stack([up, down, left, right], axis=-1)
@@ -0,0 +1,257 @@
+import collections
+import cProfile
+import csv
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+PHASES = ("play_turn", "make_move", "encode", "get_feedback")
+# durations are binned on a log scale with BINS_PER_OCTAVE bins per doubling, starting at 1 ns
+BINS_PER_OCTAVE = 8
+NUMBER_BINS = 40 * BINS_PER_OCTAVE
+
+
+class DurationHistogram:
+
+    def __init__(self):
+        """
+        log scaled histogram of durations in nanoseconds, with exact count, sum, min and max
+        """
+        self.counts = np.zeros(NUMBER_BINS, dtype=np.int64)
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def add(self, durations_ns: np.ndarray):
+        durations_ns = np.asarray(durations_ns, dtype=np.int64)
+        if durations_ns.size == 0:
+            return
+        bins = np.floor(np.log2(np.maximum(durations_ns, 1)) * BINS_PER_OCTAVE).astype(np.int64)
+        self.counts += np.bincount(np.minimum(bins, NUMBER_BINS - 1), minlength=NUMBER_BINS)
+        self.count += durations_ns.size
+        self.total_ns += int(durations_ns.sum())
+        low, high = int(durations_ns.min()), int(durations_ns.max())
+        self.min_ns = low if self.min_ns is None else min(self.min_ns, low)
+        self.max_ns = high if self.max_ns is None else max(self.max_ns, high)
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: percentile between 0 and 100
+        :return: upper edge of the bin holding the percentile in nanoseconds, accurate to 1 / BINS_PER_OCTAVE octaves
+        """
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q / 100 * self.count))
+        return min(2 ** ((index + 1) / BINS_PER_OCTAVE), self.max_ns)
+
+    def summary(self) -> dict:
+        return {"count": self.count,
+                "total_s": self.total_ns / 1e9,
+                "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+                "min_us": (self.min_ns or 0) / 1e3,
+                "p50_us": self.percentile(50) / 1e3,
+                "p90_us": self.percentile(90) / 1e3,
+                "p99_us": self.percentile(99) / 1e3,
+                "max_us": (self.max_ns or 0) / 1e3}
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval: float = 0.001):
+        """
+        statistical profiler: a background thread records the stack of the profiled thread every interval seconds.
+        Unlike cProfile it does not slow down every function call.
+        :param interval: seconds between samples
+        """
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.number_samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_name} ({frame.f_code.co_filename}:{frame.f_code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.number_samples += 1
+
+    def top_functions(self, number: int = 20) -> list:
+        """
+        :return: list of (function, share of the samples in which it was on top of the stack)
+        """
+        counts = collections.Counter()
+        for stack, count in self.stacks.items():
+            counts[stack.rsplit(";", 1)[-1]] += count
+        return [(function, count / self.number_samples) for function, count in counts.most_common(number)]
+
+    def write_collapsed(self, path: str):
+        """
+        writes the stacks in the collapsed format of flamegraph.pl and speedscope
+        """
+        with open(path, "w") as file:
+            for stack, count in self.stacks.items():
+                file.write(f"{stack} {count}\n")
+
+
+class Instrumentation:
+
+    def __init__(self, track_allocations: bool = False, profile_window: tuple = None, profiler: str = "cprofile",
+                 sampling_interval: float = 0.001):
+        """
+        collects timings of Env.run once it is given to Env.assign_instrumentation. Every step is split into the
+        phases play_turn (including the legal action mask), make_move, encode and get_feedback.
+        :param track_allocations: trace the memory allocations of every game with tracemalloc, which slows the games
+            down considerably
+        :param profile_window: (first game, number of games) which are profiled, game numbers count from 0
+        :param profiler: "cprofile" or "sampling"
+        :param sampling_interval: seconds between the samples of the sampling profiler
+        """
+        if profiler not in ("cprofile", "sampling"):
+            raise ValueError("profiler must be cprofile or sampling")
+        self.track_allocations = track_allocations
+        self.profile_window = profile_window
+        self.profiler = profiler
+        self.sampling_interval = sampling_interval
+        self.histograms = {phase: DurationHistogram() for phase in PHASES}
+        self.episode_lengths = []
+        self.game_times = []
+        self.allocated_blocks = []
+        self.peak_memory = []
+        self.profile = None
+        self.number_games = 0
+        self._durations = {phase: [] for phase in PHASES}
+        self._profiling = False
+        self._game_start = None
+        self._memory_before = None
+        self._blocks_before = None
+
+    def _in_profile_window(self) -> bool:
+        if self.profile_window is None:
+            return False
+        first, number_games = self.profile_window
+        return first <= self.number_games < first + number_games
+
+    def start_game(self):
+        if self._in_profile_window() and not self._profiling:
+            if self.profile is None:
+                self.profile = cProfile.Profile() if self.profiler == "cprofile" \
+                    else SamplingProfiler(self.sampling_interval)
+            if self.profiler == "cprofile":
+                self.profile.enable()
+            else:
+                self.profile.start()
+            self._profiling = True
+        if self.track_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._memory_before = tracemalloc.get_traced_memory()[0]
+            self._blocks_before = sys.getallocatedblocks()
+        self._game_start = time.perf_counter_ns()
+
+    def record_step(self, play_turn_ns: int, make_move_ns: int, encode_ns: int, get_feedback_ns: int):
+        durations = self._durations
+        durations["play_turn"].append(play_turn_ns)
+        durations["make_move"].append(make_move_ns)
+        durations["encode"].append(encode_ns)
+        durations["get_feedback"].append(get_feedback_ns)
+
+    def end_game(self, number_steps: int):
+        self.game_times.append((time.perf_counter_ns() - self._game_start) / 1e9)
+        if self.track_allocations:
+            self.allocated_blocks.append(sys.getallocatedblocks() - self._blocks_before)
+            self.peak_memory.append(tracemalloc.get_traced_memory()[1] - self._memory_before)
+        for phase in PHASES:
+            self.histograms[phase].add(self._durations[phase])
+            self._durations[phase] = []
+        self.episode_lengths.append(number_steps)
+        self.number_games += 1
+        if self._profiling and not self._in_profile_window():
+            self.stop_profiling()
+
+    def stop_profiling(self):
+        if not self._profiling:
+            return
+        if self.profiler == "cprofile":
+            self.profile.disable()
+        else:
+            self.profile.stop()
+        self._profiling = False
+
+    def close(self):
+        """
+        stops the profiler and the allocation tracing
+        """
+        self.stop_profiling()
+        if self.track_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def profile_stats(self, sort_by: str = "cumulative") -> pstats.Stats:
+        """
+        :return: pstats.Stats of the cProfile window
+        """
+        if self.profiler != "cprofile" or self.profile is None:
+            raise ValueError("no cProfile window was recorded")
+        return pstats.Stats(self.profile).sort_stats(sort_by)
+
+    def summary(self) -> dict:
+        number_steps = int(np.sum(self.episode_lengths)) if self.episode_lengths else 0
+        total_time = float(np.sum(self.game_times)) if self.game_times else 0.0
+        lengths = np.array(self.episode_lengths)
+        summary = {"games": self.number_games,
+                   "steps": number_steps,
+                   "time_s": total_time,
+                   "steps_per_sec": number_steps / total_time if total_time else 0.0,
+                   "phases": {phase: histogram.summary() for phase, histogram in self.histograms.items()},
+                   "episode_length": {}}
+        if lengths.size:
+            summary["episode_length"] = {
+                "mean": float(lengths.mean()), "std": float(lengths.std()), "min": int(lengths.min()),
+                "p10": float(np.percentile(lengths, 10)), "p50": float(np.percentile(lengths, 50)),
+                "p90": float(np.percentile(lengths, 90)), "max": int(lengths.max())}
+        if self.track_allocations and self.allocated_blocks:
+            summary["allocations"] = {"mean_allocated_blocks_per_game": float(np.mean(self.allocated_blocks)),
+                                      "mean_peak_bytes_per_game": float(np.mean(self.peak_memory)),
+                                      "max_peak_bytes_per_game": int(np.max(self.peak_memory))}
+        return summary
+
+    def to_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=2)
+
+    def to_csv(self, path: str):
+        """
+        writes the summary as rows of (metric, value), nested keys are joined with dots
+        """
+        def flatten(prefix: str, values: dict):
+            for key, value in values.items():
+                name = f"{prefix}.{key}" if prefix else key
+                if isinstance(value, dict):
+                    yield from flatten(name, value)
+                else:
+                    yield name, value
+
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["metric", "value"])
+            writer.writerows(flatten("", self.summary()))
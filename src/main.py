@@ -1,23 +1,39 @@
+import logging
+import multiprocessing
+import sys
+from functools import partial
+
 from src.agents.naive_agent import UpLeftAgent
 from src.agents.random import RandomAgent
+from src.evaluation import compare_agents, write_report
 from src.game import Env
+from src.reporting import histogram_of_binned_points
 
 
-def main():
+def main(report_path: str = None):
+    """
+    compares RandomAgent and UpLeftAgent with paired games until the sequential test decides and shows the histograms
+    of the points of both agents
+    :param report_path: file to write the JSON report of the evaluation to, None does not write it
+    :return:
+    """
+    logging.basicConfig(level=logging.INFO)
     env = Env()
     action_space = env.get_action_space()
     state_space = env.get_state_space()
-    agent = RandomAgent(state_shape=state_space, action_shape=action_space, name="RandomAgent")
-    env.assign_agent(agent)
-    env.run_multiple_games(1000)
-    env.create_histogram_of_point_history()
-
+    agent_factory = partial(RandomAgent, state_shape=state_space, action_shape=action_space, name="RandomAgent")
+    up_left_agent_factory = partial(UpLeftAgent, state_shape=state_space, action_shape=action_space,
+                                    name="UpLeftAgent")
+    agent_factories = {"RandomAgent": agent_factory, "UpLeftAgent": up_left_agent_factory}
+    # plays paired games until the sequential test decides instead of a fixed number of games
+    report = compare_agents(agent_factories, processes=multiprocessing.cpu_count())
+    if report_path is not None:
+        write_report(report, report_path)
+    logging.info(f"{report['decision']} after {report['games_per_agent']} games per agent")
+    for name, stats in report["agents"].items():
+        logging.info(f"{name}: mean points {stats['points']['mean']:.0f}, win rate {stats['win_rate']:.1%}")
+        histogram_of_binned_points(stats["points_histogram"], title=name)
 
-    env = Env()
-    up_left_agent = UpLeftAgent(state_shape=state_space, action_shape=action_space, name="UpLeftAgent")
-    env.assign_agent(up_left_agent)
-    env.run_multiple_games(1000)
-    env.create_histogram_of_point_history()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,70 @@
+import logging
+import multiprocessing
+import random
+
+import numpy as np
+
+
+def run_games(env_kwargs: dict, agent_factory, number_games: int, seed: int) -> list:
+    """
+    plays number_games games with its own Env and agent, the unit of work of the worker processes of
+    run_games_parallel and src.evaluation. The games only depend on the arguments.
+    :param env_kwargs: keyword arguments of the Env
+    :param agent_factory: picklable callable without arguments returning an Agent
+    :param number_games:
+    :param seed: seeds the Env, the agent and, while the games run, the global random states. The global states of
+        the calling process are restored afterwards.
+    :return: list of (points, number_steps, max_tile) per game
+    """
+    # imported here because src.game imports this module
+    from src.game import Env
+
+    # agents which still use the global random state are seeded as well, without touching the state of the caller
+    numpy_state, random_state = np.random.get_state(), random.getstate()
+    np.random.seed(seed)
+    random.seed(seed)
+    try:
+        env_seed, agent_seed = np.random.SeedSequence(seed).spawn(2)
+        env = Env(**env_kwargs, rng=env_seed)
+        agent = agent_factory()
+        agent.rng = np.random.default_rng(agent_seed)
+        env.assign_agent(agent)
+        env.run_multiple_games(number_games)
+    finally:
+        np.random.set_state(numpy_state)
+        random.setstate(random_state)
+    return list(zip(env.point_history, env.steps_history, env.max_tile_history))
+
+
+def _run_task(task: tuple) -> list:
+    return run_games(*task)
+
+
+def run_games_parallel(env_kwargs: dict, agent_factory, number_games: int, processes: int = None, seed: int = 0,
+                       games_per_task: int = None):
+    """
+    shards number_games into tasks which are played in a process pool. Every task gets its own seed derived from seed,
+    so the results only depend on seed and games_per_task, not on the number of processes.
+    :param env_kwargs: keyword arguments to build the Env in every worker
+    :param agent_factory: picklable callable without arguments returning an Agent
+    :param number_games:
+    :param processes: number of worker processes, defaults to the number of cpus
+    :param seed:
+    :param games_per_task:
+    :return: generator of (points, number_steps, max_tile) per game in task order
+    """
+    processes = processes or multiprocessing.cpu_count()
+    if games_per_task is None:
+        games_per_task = max(1, number_games // (processes * 8))
+    task_sizes = [games_per_task] * (number_games // games_per_task)
+    if number_games % games_per_task:
+        task_sizes.append(number_games % games_per_task)
+    seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(len(task_sizes))]
+    tasks = [(env_kwargs, agent_factory, size, task_seed) for size, task_seed in zip(task_sizes, seeds)]
+
+    finished_games = 0
+    with multiprocessing.Pool(processes) as pool:
+        for results in pool.imap(_run_task, tasks):
+            finished_games += len(results)
+            logging.info(f"Finished {finished_games}/{number_games} games")
+            yield from results
@@ -0,0 +1,391 @@
+import logging
+import multiprocessing
+import queue
+import time
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.batch_env import BatchEnv
+from src.replay_buffer import ArrayReplayBuffer
+
+FIELDS = ("obses_t", "actions", "rewards", "obses_tp1", "dones")
+# per actor counters of Pipeline, blocked_ns is the time an actor waited for a free slot of the queue
+ACTOR_COUNTERS = ("steps", "games", "points", "blocked_ns", "parameter_version")
+
+
+def _chunk_specs(number_slots: int, chunk_size: int, number_tiles: int) -> dict:
+    boards = (number_slots, chunk_size, number_tiles, number_tiles)
+    return {"obses_t": (boards, np.dtype(np.uint8).str),
+            "actions": ((number_slots, chunk_size), np.dtype(np.int8).str),
+            "rewards": ((number_slots, chunk_size), np.dtype(np.float32).str),
+            "obses_tp1": (boards, np.dtype(np.uint8).str),
+            "dones": ((number_slots, chunk_size), np.dtype(bool).str),
+            "lengths": ((number_slots, ), np.dtype(np.int64).str)}
+
+
+def _shared_arrays(memories: list, specs: dict) -> dict:
+    return {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+            for memory, (key, (shape, dtype)) in zip(memories, specs.items())}
+
+
+class TransitionQueue:
+
+    def __init__(self, number_slots: int = 8, chunk_size: int = 256, number_tiles: int = 4):
+        """
+        bounded queue of transition chunks between processes. The chunks live in number_slots slots of shared memory,
+        so put and get only copy arrays and nothing is pickled. put blocks while every slot is full, which slows the
+        producers down to the speed of the consumer. Any number of processes may put, only one process may get.
+        Boards are stored as tile exponents. The process which creates the queue has to close it.
+        :param number_slots: maximal number of chunks in the queue
+        :param chunk_size: maximal number of transitions per chunk
+        :param number_tiles:
+        """
+        self.number_slots = number_slots
+        self.chunk_size = chunk_size
+        self._specs = _chunk_specs(number_slots, chunk_size, number_tiles)
+        self._memories = [SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+                          for shape, dtype in self._specs.values()]
+        self._names = [memory.name for memory in self._memories]
+        self._arrays = _shared_arrays(self._memories, self._specs)
+        self._owner = True
+        self._free = multiprocessing.Semaphore(number_slots)
+        self._filled = multiprocessing.Semaphore(0)
+        self._lock = multiprocessing.Lock()
+        # number of chunks put and taken, their difference is the depth of the queue
+        self._counters = multiprocessing.Array("q", 2)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_memories"], state["_arrays"]
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memories = [SharedMemory(name=name) for name in self._names]
+        self._arrays = _shared_arrays(self._memories, self._specs)
+
+    def __len__(self):
+        return self._counters[0] - self._counters[1]
+
+    def put(self, obses_t: np.ndarray, actions: np.ndarray, rewards: np.ndarray, obses_tp1: np.ndarray,
+            dones: np.ndarray, stop_event=None, timeout: float = 0.1) -> bool:
+        """
+        copies a chunk of at most chunk_size transitions into a free slot, blocks while the queue is full
+        :param obses_t: np array with shape (length, number_tiles, number_tiles) of tile exponents
+        :param actions:
+        :param rewards:
+        :param obses_tp1: np array like obses_t
+        :param dones:
+        :param stop_event: multiprocessing.Event, a blocked put gives up once it is set
+        :param timeout: seconds between the checks of stop_event
+        :return: whether the chunk was put
+        """
+        length = len(actions)
+        if length > self.chunk_size:
+            raise ValueError(f"chunks hold at most {self.chunk_size} transitions")
+        while not self._free.acquire(timeout=timeout):
+            if stop_event is not None and stop_event.is_set():
+                return False
+        # the slots are written in the order of the counter, so the consumer never reads a slot which is not complete
+        with self._lock:
+            slot = self._counters[0] % self.number_slots
+            for key, values in zip(FIELDS, (obses_t, actions, rewards, obses_tp1, dones)):
+                self._arrays[key][slot, :length] = values
+            self._arrays["lengths"][slot] = length
+            self._counters[0] += 1
+        self._filled.release()
+        return True
+
+    def get(self, timeout: float = None) -> tuple:
+        """
+        takes the oldest chunk out of the queue
+        :param timeout: seconds to wait for a chunk, None waits forever and 0 does not wait
+        :return: tuple of copies of obses_t, actions, rewards, obses_tp1 and dones or None if the queue stayed empty
+        """
+        if not self._filled.acquire(timeout=timeout):
+            return None
+        slot = self._counters[1] % self.number_slots
+        length = self._arrays["lengths"][slot]
+        chunk = tuple(self._arrays[key][slot, :length].copy() for key in FIELDS)
+        self._counters[1] += 1
+        self._free.release()
+        return chunk
+
+    def close(self):
+        self._arrays = None
+        for memory in self._memories:
+            memory.close()
+            if self._owner:
+                memory.unlink()
+        self._memories = []
+
+
+class SharedParameters:
+
+    def __init__(self, parameters: np.ndarray):
+        """
+        flat parameter array in shared memory with a version which grows with every publish
+        :param parameters: initial parameters, shape and dtype are fixed by them
+        """
+        parameters = np.asarray(parameters)
+        self._specs = {"parameters": (parameters.shape, parameters.dtype.str)}
+        self._memories = [SharedMemory(create=True, size=max(1, parameters.nbytes))]
+        self._name = self._memories[0].name
+        self._array = _shared_arrays(self._memories, self._specs)["parameters"]
+        self._array[:] = parameters
+        self._owner = True
+        self._lock = multiprocessing.Lock()
+        self._version = multiprocessing.Value("q", 0, lock=False)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_memories"], state["_array"]
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memories = [SharedMemory(name=self._name)]
+        self._array = _shared_arrays(self._memories, self._specs)["parameters"]
+
+    @property
+    def version(self) -> int:
+        return self._version.value
+
+    def publish(self, parameters: np.ndarray):
+        with self._lock:
+            self._array[:] = parameters
+            self._version.value += 1
+
+    def load_into(self, agent) -> int:
+        """
+        :param agent: gets the parameters through set_parameters
+        :return: version of the loaded parameters
+        """
+        with self._lock:
+            agent.set_parameters(self._array)
+            return self._version.value
+
+    def close(self):
+        self._array = None
+        for memory in self._memories:
+            memory.close()
+            if self._owner:
+                memory.unlink()
+        self._memories = []
+
+
+def _actor(index: int, agent_factory, transition_queue: TransitionQueue, parameters: SharedParameters, counters: dict,
+           errors, stop_event, number_boards: int, number_tiles: int, seed: int):
+    """
+    worker function of Pipeline, plays number_boards games at once and puts their transitions into the queue until
+    stop_event is set. Transitions which do not fill a whole chunk at the end are dropped.
+    """
+    try:
+        agent = agent_factory()
+        agent.rng = np.random.default_rng(seed)
+        env = BatchEnv(number_boards, number_tiles=number_tiles, seed=seed)
+        pending = []
+        number_pending = 0
+        version = 0
+        chunk_size = transition_queue.chunk_size
+        while not stop_event.is_set():
+            if parameters is not None and parameters.version > version:
+                version = parameters.load_into(agent)
+                counters["parameter_version"][index] = version
+            obses_t = env.exponents.copy()
+            actions = agent.decide_batch(env.boards, legal_actions=env.legal_actions())
+            # the step resets the points of finished boards
+            points = env.points.copy()
+            rewards, actions, _, dones = env.step(actions)
+            obses_tp1 = env.exponents.copy()
+            obses_tp1[dones] = env.final_exponents
+            pending.append((obses_t, actions, rewards, obses_tp1, dones))
+            number_pending += number_boards
+            counters["steps"][index] += number_boards
+            if dones.any():
+                counters["games"][index] += int(dones.sum())
+                counters["points"][index] += int((points + rewards)[dones].sum())
+                # the actor runs until it is stopped, the final points are only needed in the counters
+                env.point_history.clear()
+            if number_pending < chunk_size:
+                continue
+            transitions = [np.concatenate(field) for field in zip(*pending)]
+            start = 0
+            while number_pending - start >= chunk_size:
+                blocked_start = time.perf_counter_ns()
+                if not transition_queue.put(*(field[start:start + chunk_size] for field in transitions),
+                                            stop_event=stop_event):
+                    return
+                counters["blocked_ns"][index] += time.perf_counter_ns() - blocked_start
+                start += chunk_size
+            pending = [tuple(field[start:] for field in transitions)]
+            number_pending -= start
+    except Exception:
+        errors.put(traceback.format_exc())
+
+
+class Pipeline:
+
+    def __init__(self, agent_factory, learner=None, number_actors: int = 2, boards_per_actor: int = 16,
+                 number_tiles: int = 4, buffer=None, chunk_size: int = 256, queue_slots: int = 8,
+                 batch_size: int = 256, min_buffer_size: int = 1024, broadcast_interval: int = 50, seed: int = 0):
+        """
+        actor learner training: number_actors processes play boards_per_actor games at once, each with its own agent
+        from agent_factory, and put their transitions in chunks of chunk_size into a TransitionQueue. run moves the
+        chunks into the replay buffer and lets the learner learn from sampled batches while the actors keep playing.
+        Every broadcast_interval updates the parameters of the learner are sent to the actors. When the learner is
+        slower than the actors the queue fills up and the actors wait, no transition is dropped.
+        Use close() or a with block to stop the actors and free the shared memory.
+        :param agent_factory: picklable callable without arguments returning the agent of an actor
+        :param learner: agent with learn_batch and get_parameters, for example SARSA. None only samples batches, which
+            measures the pipeline without learning.
+        :param number_actors:
+        :param boards_per_actor:
+        :param number_tiles:
+        :param buffer: replay buffer with add_batch, defaults to an ArrayReplayBuffer of 10 ** 5 transitions
+        :param chunk_size:
+        :param queue_slots: number of chunks the queue holds before the actors wait
+        :param batch_size:
+        :param min_buffer_size: number of transitions in the buffer before the learner starts
+        :param broadcast_interval: number of learner updates between two broadcasts of the parameters
+        :param seed: the seeds of the actors are derived from it
+        """
+        self.learner = learner
+        self.number_actors = number_actors
+        self.buffer = buffer if buffer is not None else ArrayReplayBuffer(10 ** 5, (number_tiles, number_tiles))
+        self.batch_size = batch_size
+        self.min_buffer_size = min_buffer_size
+        self.broadcast_interval = broadcast_interval
+        self.number_updates = 0
+        self.number_samples = 0
+        self.number_received = 0
+        self.learner_time = 0.0
+        self._depth_sum = 0
+        self._depth_count = 0
+        self.queue = TransitionQueue(queue_slots, chunk_size, number_tiles)
+        parameters = learner.get_parameters() if learner is not None else None
+        self.parameters = SharedParameters(parameters) if parameters is not None else None
+        self._counters = {name: multiprocessing.Array("q", number_actors, lock=False) for name in ACTOR_COUNTERS}
+        self._errors = multiprocessing.Queue()
+        self._stop_event = multiprocessing.Event()
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(number_actors)]
+        self._processes = [
+            multiprocessing.Process(target=_actor, args=(index, agent_factory, self.queue, self.parameters,
+                                                         self._counters, self._errors, self._stop_event,
+                                                         boards_per_actor, number_tiles, seeds[index]), daemon=True)
+            for index in range(number_actors)]
+        for process in self._processes:
+            process.start()
+        self._start = time.perf_counter()
+        self.closed = False
+
+    def _check_actors(self):
+        try:
+            error = self._errors.get_nowait()
+        except queue.Empty:
+            error = None
+        if error is not None:
+            raise RuntimeError(f"Actor failed:\n{error}")
+        for process in self._processes:
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(f"Actor {process.name} died with exit code {process.exitcode}")
+
+    def _receive(self, timeout: float = 0) -> int:
+        # moves at most one queue full of chunks into the buffer, so the learner is not starved by fast actors
+        number_chunks = 0
+        for _ in range(self.queue.number_slots):
+            chunk = self.queue.get(timeout=timeout if number_chunks == 0 else 0)
+            if chunk is None:
+                break
+            self.buffer.add_batch(*chunk, exponents=True)
+            self.number_received += len(chunk[1])
+            number_chunks += 1
+        return number_chunks
+
+    def run(self, number_updates: int = None, seconds: float = None) -> dict:
+        """
+        learns until number_updates further updates are done or seconds have passed
+        :return: stats
+        """
+        if number_updates is None and seconds is None:
+            raise ValueError("number_updates or seconds must be given")
+        if self.closed:
+            raise RuntimeError("Pipeline is closed")
+        start = time.perf_counter()
+        target_updates = None if number_updates is None else self.number_updates + number_updates
+        while True:
+            self._check_actors()
+            self._depth_sum += len(self.queue)
+            self._depth_count += 1
+            if len(self.buffer) < self.min_buffer_size:
+                self._receive(timeout=0.1)
+            else:
+                self._receive()
+                learn_start = time.perf_counter()
+                batch = self.buffer.sample(self.batch_size)
+                if self.learner is not None:
+                    self.learner.learn_batch(*batch[:5])
+                self.number_updates += 1
+                self.number_samples += self.batch_size
+                if self.parameters is not None and self.number_updates % self.broadcast_interval == 0:
+                    self.parameters.publish(self.learner.get_parameters())
+                self.learner_time += time.perf_counter() - learn_start
+            if target_updates is not None and self.number_updates >= target_updates:
+                break
+            if seconds is not None and time.perf_counter() - start >= seconds:
+                break
+        return self.stats()
+
+    def stats(self) -> dict:
+        """
+        throughput of every stage since the actors were started
+        :return: dict with the steps of the actors, the time they waited for the queue, the current and mean depth of
+            the queue, the transitions moved into the buffer and the updates and samples of the learner
+        """
+        elapsed = time.perf_counter() - self._start
+        counters = {name: np.frombuffer(array, dtype=np.int64).copy() for name, array in self._counters.items()}
+        games = int(counters["games"].sum())
+        return {"actor_steps": int(counters["steps"].sum()),
+                "actor_steps_per_sec": float(counters["steps"].sum()) / elapsed,
+                "actor_blocked_share": float(counters["blocked_ns"].sum()) / 1e9 / (elapsed * self.number_actors),
+                "games": games,
+                "mean_points": float(counters["points"].sum()) / games if games else 0.0,
+                "queue_depth": len(self.queue) if not self.closed else 0,
+                "mean_queue_depth": self._depth_sum / self._depth_count if self._depth_count else 0.0,
+                "queue_slots": self.queue.number_slots,
+                "transitions_received": self.number_received,
+                "buffer_size": len(self.buffer),
+                "learner_updates": self.number_updates,
+                "learner_samples": self.number_samples,
+                "learner_samples_per_sec": self.number_samples / self.learner_time if self.learner_time else 0.0,
+                "parameter_version": self.parameters.version if self.parameters is not None else 0,
+                "actor_parameter_versions": counters["parameter_version"].tolist()}
+
+    def close(self, timeout: float = 5.0):
+        """
+        stops the actors, waits up to timeout seconds for them and frees the shared memory
+        """
+        if self.closed:
+            return
+        self._stop_event.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logging.warning(f"Actor {process.name} did not stop, terminating it")
+                process.terminate()
+                process.join()
+        self.queue.close()
+        if self.parameters is not None:
+            self.parameters.close()
+        self._errors.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,220 @@
+import collections
+import glob
+import gzip
+import os
+import struct
+
+import numpy as np
+
+from src.helpers import Direction, to_exponents
+
+# every chunk file starts with the magic, the format version and the board size
+FILE_HEADER = struct.Struct("<4sBB")
+MAGIC = b"2048"
+VERSION = 1
+# every game starts with the seed of its spawns (uint64, NO_SEED if unknown), number of steps, points and the exponent
+# of the max tile, followed by the initial board as exponents (number_tiles ** 2 bytes) and per step the action
+# (uint8), the flat position (uint8, NO_SPAWN if no tile spawned) and exponent (uint8) of the spawned tile and the
+# reward (uint32)
+GAME_HEADER = struct.Struct("<QIqB")
+# same bytes as the -1 of files which stored the seed signed
+NO_SEED = 2 ** 64 - 1
+NO_SPAWN = 255
+# layout of a step while the game is running
+_STEP = struct.Struct("<BBBI")
+
+GameRecord = collections.namedtuple("GameRecord", ["seed", "number_tiles", "initial_board", "actions",
+                                                   "spawn_positions", "spawn_exponents", "rewards", "points",
+                                                   "max_tile"])
+
+
+class EpisodeRecorder:
+
+    def __init__(self, directory: str, games_per_chunk: int = 10000, compress: bool = False):
+        """
+        streams every game played by Env.run to chunk files in directory as compact binary records with the move
+        list and the spawns, so games can be replayed exactly without keeping them in memory. A new chunk file is
+        started every games_per_chunk games. Assign it with Env.assign_recorder and close it when done.
+        :param directory: created if it does not exist, existing chunks are kept and numbering continues after them
+        :param games_per_chunk:
+        :param compress: gzip the chunk files
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.games_per_chunk = games_per_chunk
+        self.compress = compress
+        self.number_games = 0
+        self._chunk_index = len(chunk_files(directory))
+        self._file = None
+        self._number_tiles = None
+        self._chunk_number_tiles = None
+        self._games_in_chunk = 0
+        self._initial_board = None
+        self._seed = None
+        self._steps = None
+
+    def _open_chunk(self):
+        extension = ".bin.gz" if self.compress else ".bin"
+        path = os.path.join(self.directory, f"chunk_{self._chunk_index:06d}{extension}")
+        self._file = gzip.open(path, "wb") if self.compress else open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, self._number_tiles))
+        self._chunk_index += 1
+        self._chunk_number_tiles = self._number_tiles
+        self._games_in_chunk = 0
+
+    def start_game(self, game):
+        """
+        remembers the initial board of a game
+        :param game: Game or BitboardGame before its first move
+        """
+        self._initial_board = to_exponents(game.board).ravel().tobytes()
+        self._seed = getattr(game, "seed", None)
+        self._steps = bytearray()
+        self._number_tiles = game.number_tiles
+
+    def record_step(self, action: int, reward: int, spawn: tuple):
+        """
+        :param action: Direction value
+        :param reward: points of the move
+        :param spawn: last_spawn of the game after the move
+        """
+        if spawn is None:
+            self._steps += _STEP.pack(action, NO_SPAWN, 0, reward)
+        else:
+            self._steps += _STEP.pack(action, spawn[0], int(spawn[1]).bit_length() - 1, reward)
+
+    def end_game(self, game):
+        if self._file is not None and (self._games_in_chunk >= self.games_per_chunk or
+                                       self._chunk_number_tiles != self._number_tiles):
+            self.close()
+        if self._file is None:
+            self._open_chunk()
+        number_steps = len(self._steps) // _STEP.size
+        # the steps were written interleaved, the record stores every field as one array
+        steps = np.frombuffer(bytes(self._steps), dtype=np.dtype([("action", "u1"), ("position", "u1"),
+                                                                  ("exponent", "u1"), ("reward", "<u4")]))
+        # seeds which do not fit are stored as unknown, the recorded spawns still replay the game
+        seed = self._seed if self._seed is not None and 0 <= self._seed < NO_SEED else NO_SEED
+        max_exponent = int(game.board.max()).bit_length() - 1
+        self._file.write(GAME_HEADER.pack(seed, number_steps, int(game.points), max_exponent))
+        self._file.write(self._initial_board)
+        for field in ("action", "position", "exponent", "reward"):
+            self._file.write(np.ascontiguousarray(steps[field]).tobytes())
+        self._games_in_chunk += 1
+        self.number_games += 1
+        self._steps = None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def chunk_files(path: str) -> list:
+    """
+    :param path: directory of an EpisodeRecorder or a single chunk file
+    :return: sorted list of chunk files
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(glob.glob(os.path.join(path, "chunk_*.bin")) + glob.glob(os.path.join(path, "chunk_*.bin.gz")))
+
+
+def _read_exactly(file, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise EOFError("truncated game record")
+    return data
+
+
+def read_games(path: str):
+    """
+    iterates lazily over all games in the chunk files of path, only one game is held in memory at a time
+    :param path: directory of an EpisodeRecorder or a single chunk file
+    :return: generator of GameRecord
+    """
+    for file_path in chunk_files(path):
+        with (gzip.open(file_path, "rb") if file_path.endswith(".gz") else open(file_path, "rb")) as file:
+            magic, version, number_tiles = FILE_HEADER.unpack(_read_exactly(file, FILE_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{file_path} is not a game record file of version {VERSION}")
+            while True:
+                header = file.read(GAME_HEADER.size)
+                if not header:
+                    break
+                if len(header) != GAME_HEADER.size:
+                    raise EOFError("truncated game record")
+                seed, number_steps, points, max_exponent = GAME_HEADER.unpack(header)
+                initial_board = np.frombuffer(_read_exactly(file, number_tiles ** 2), dtype=np.uint8)
+                actions, positions, exponents = (np.frombuffer(_read_exactly(file, number_steps), dtype=np.uint8)
+                                                 for _ in range(3))
+                rewards = np.frombuffer(_read_exactly(file, 4 * number_steps), dtype="<u4")
+                yield GameRecord(None if seed == NO_SEED else seed, number_tiles,
+                                 initial_board.reshape((number_tiles, number_tiles)), actions, positions, exponents,
+                                 rewards, points, 2 ** max_exponent)
+
+
+def replay(record: GameRecord):
+    """
+    plays a recorded game again with Game and checks that every move gives the recorded reward. Games with a seed are
+    played with that seed and the spawns have to match the recorded ones, otherwise the recorded spawns are placed.
+    :param record:
+    :return: generator of (board before the move, action, reward, board after the move and the spawn)
+    """
+    # imported here because src.game imports this module
+    from src.game import Game
+
+    initial_board = np.where(record.initial_board > 0, 2 ** record.initial_board.astype(np.int64), 0)
+    game = Game(record.number_tiles, rng=record.seed if record.seed is not None else 0)
+    if record.seed is None:
+        game.board = initial_board
+        game.points = 0
+    elif not (game.board == initial_board).all():
+        raise ValueError("replay does not match the recorded initial board")
+    for action, position, exponent, reward in zip(record.actions, record.spawn_positions, record.spawn_exponents,
+                                                  record.rewards):
+        board = game.board.copy()
+        points_before = game.points
+        game.make_move(Direction(int(action)), spawn_new=record.seed is not None)
+        if game.points - points_before != reward:
+            raise ValueError("replay does not match the recorded reward")
+        if record.seed is None and position != NO_SPAWN:
+            game.board[position // record.number_tiles, position % record.number_tiles] = 2 ** int(exponent)
+        elif record.seed is not None and game.last_spawn != (None if position == NO_SPAWN else
+                                                              (int(position), 2 ** int(exponent))):
+            raise ValueError("replay does not match the recorded spawn")
+        yield board, int(action), int(reward), game.board.copy()
+    if game.points != record.points:
+        raise ValueError("replay does not match the recorded points")
+
+
+def game_stats(path: str, quantiles: tuple = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)) -> dict:
+    """
+    aggregates over all recorded games by streaming over the files, only the points of the games are kept
+    :param path: directory of an EpisodeRecorder or a single chunk file
+    :param quantiles: quantiles of the points
+    :return: dict with number of games and steps, mean points and steps, point quantiles and the share of games per
+        max tile
+    """
+    points = []
+    max_tiles = collections.Counter()
+    number_steps = 0
+    for record in read_games(path):
+        points.append(record.points)
+        max_tiles[record.max_tile] += 1
+        number_steps += len(record.actions)
+    points = np.array(points, dtype=np.int64)
+    if points.size == 0:
+        return {"games": 0, "steps": 0}
+    return {"games": int(points.size),
+            "steps": number_steps,
+            "mean_steps": number_steps / points.size,
+            "mean_points": float(points.mean()),
+            "point_quantiles": {q: float(np.quantile(points, q)) for q in quantiles},
+            "max_tile_distribution": {tile: count / points.size for tile, count in sorted(max_tiles.items())}}
@@ -1,6 +1,11 @@
+import os
+
 import numpy as np
 import random
 
+from src.helpers import to_exponents, to_values
+from src.segment_tree import SumSegmentTree, MinSegmentTree
+
 
 class ReplayBuffer:
 
@@ -28,15 +33,35 @@ class ReplayBuffer:
             self._storage[self._next_idx] = data
         self._next_idx = (self._next_idx + 1) % self._maxsize
 
+    def _batch_indices(self, number_transitions: int) -> np.ndarray:
+        # indices the last min(number_transitions, size) of the next number_transitions transitions are written to,
+        # the others would be overwritten within the same batch
+        number_kept = min(number_transitions, self._maxsize)
+        return (self._next_idx + number_transitions - number_kept + np.arange(number_kept)) % self._maxsize
+
+    def add_batch(self, obses_t, actions, rewards, obses_tp1, dones, exponents: bool = False):
+        """Add many transitions at once, like calling add for each of them in order.
+        Parameters
+        ----------
+        obses_t, actions, rewards, obses_tp1, dones: np.array
+            one entry per transition
+        exponents: bool
+            the observations hold tile exponents instead of tile values
+        """
+        if exponents:
+            obses_t, obses_tp1 = to_values(obses_t), to_values(obses_tp1)
+        for transition in zip(obses_t, actions, rewards, obses_tp1, dones):
+            self.add(*transition)
+
     def _encode_sample(self, idxes):
         obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
         for i in idxes:
             data = self._storage[i]
             obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
+            obses_t.append(np.asarray(obs_t))
+            actions.append(np.asarray(action))
             rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
+            obses_tp1.append(np.asarray(obs_tp1))
             dones.append(done)
         return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
 
@@ -80,74 +105,381 @@ class ReplayBufferSarsa(ReplayBuffer):
         for i in idxes:
             data = self._storage[i]
             obs_t, action, reward, obs_tp1, done, next_states = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
+            obses_t.append(np.asarray(obs_t))
+            actions.append(np.asarray(action))
             rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
+            obses_tp1.append(np.asarray(obs_tp1))
             dones.append(done)
             next_actions.append(next_states)
         return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones), \
                np.array(next_actions)
 
 
+class ArrayReplayBuffer(ReplayBuffer):
+
+    def __init__(self, size: int = 10000, obs_shape: tuple = (4, 4)):
+        """Create Replay buffer with preallocated storage.
+        Boards are stored as uint8 tile exponents, actions as int8, rewards as float32 and dones as bool, so a
+        transition of a 4x4 board takes 38 bytes. Observations must be boards of tile values (0, 2, 4, ...),
+        they are converted back to tile values when sampled.
+        Parameters
+        ----------
+        size: int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        obs_shape: tuple
+            Shape of a single observation.
+        """
+        super().__init__(size)
+        self._size = 0
+        self._obs_shape = obs_shape
+        self._obses_t = self._allocate("obs_t", (size, ) + obs_shape, np.uint8)
+        self._actions = self._allocate("actions", (size, ), np.int8)
+        self._rewards = self._allocate("rewards", (size, ), np.float32)
+        self._obses_tp1 = self._allocate("obs_tp1", (size, ) + obs_shape, np.uint8)
+        self._dones = self._allocate("dones", (size, ), bool)
+
+    def _allocate(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        return np.zeros(shape, dtype=dtype)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, obs_t, action, reward, obs_tp1, done):
+        idx = self._next_idx
+        self._obses_t[idx] = to_exponents(obs_t)
+        self._actions[idx] = action
+        self._rewards[idx] = reward
+        self._obses_tp1[idx] = to_exponents(obs_tp1)
+        self._dones[idx] = done
+        self._size = min(self._size + 1, self._maxsize)
+        self._next_idx = (self._next_idx + 1) % self._maxsize
+
+    def add_batch(self, obses_t, actions, rewards, obses_tp1, dones, exponents: bool = False):
+        """See ReplayBuffer.add_batch, the transitions are written with one array operation per field"""
+        number_transitions = len(actions)
+        idxes = self._batch_indices(number_transitions)
+        # only the newest transitions survive if there are more than fit into the buffer
+        first = number_transitions - len(idxes)
+        self._obses_t[idxes] = obses_t[first:] if exponents else to_exponents(obses_t[first:])
+        self._actions[idxes] = actions[first:]
+        self._rewards[idxes] = rewards[first:]
+        self._obses_tp1[idxes] = obses_tp1[first:] if exponents else to_exponents(obses_tp1[first:])
+        self._dones[idxes] = dones[first:]
+        self._size = min(self._size + number_transitions, self._maxsize)
+        self._next_idx = (self._next_idx + number_transitions) % self._maxsize
+
+    def _encode_sample(self, idxes):
+        return to_values(self._obses_t[idxes]), self._actions[idxes], self._rewards[idxes], \
+               to_values(self._obses_tp1[idxes]), self._dones[idxes]
+
+    def sample(self, batch_size):
+        """Sample a batch of experiences, see ReplayBuffer.sample"""
+        idxes = np.random.randint(0, self._size, size=batch_size)
+        return self._encode_sample(idxes)
+
+
+class ArrayReplayBufferSarsa(ArrayReplayBuffer):
+
+    def __init__(self, size: int = 10000, obs_shape: tuple = (4, 4)):
+        """Create Replay buffer with preallocated storage, see ArrayReplayBuffer.
+        Next actions are stored as int8, a missing next action is stored as -1.
+        """
+        super().__init__(size, obs_shape)
+        self._next_actions = self._allocate("next_actions", (size, ), np.int8)
+
+    def add(self, obs_t, action, reward, obs_tp1, done, next_actions=None):
+        self._next_actions[self._next_idx] = -1 if next_actions is None else next_actions
+        super().add(obs_t, action, reward, obs_tp1, done)
+
+    def add_batch(self, obses_t, actions, rewards, obses_tp1, dones, exponents: bool = False):
+        """See ReplayBuffer.add_batch, the transitions are stored without next actions"""
+        self._next_actions[self._batch_indices(len(actions))] = -1
+        super().add_batch(obses_t, actions, rewards, obses_tp1, dones, exponents=exponents)
+
+    def _encode_sample(self, idxes):
+        return super()._encode_sample(idxes) + (self._next_actions[idxes], )
+
+
+class MemmapReplayBuffer(ArrayReplayBuffer):
+
+    def __init__(self, path: str, size: int = 10 ** 7, obs_shape: tuple = (4, 4), readonly: bool = False):
+        """Create a persistent Replay buffer whose storage lives in numpy memmap files.
+        Every array of ArrayReplayBuffer is a .npy file in the directory path, the number of stored transitions and
+        the next index are kept in a small header file which is updated on every add. Opening an existing
+        directory resumes the buffer, size and obs_shape are then taken from the files. Any number of readonly
+        buffers in other processes can sample from the files while one writer adds to them, they pick up new
+        transitions on every sample. Sampling only copies the sampled rows out of the page cache.
+        Parameters
+        ----------
+        path: str
+            directory holding the files, created if it does not exist
+        size: int
+            Max number of transitions to store in the buffer when it is created.
+        obs_shape: tuple
+            Shape of a single observation when the buffer is created.
+        readonly: bool
+            open an existing buffer for sampling only
+        """
+        self._path = path
+        self._readonly = readonly
+        header_file = os.path.join(path, "header.npy")
+        self._exists = os.path.exists(header_file)
+        if self._exists:
+            obs_t = np.load(os.path.join(path, "obs_t.npy"), mmap_mode="r")
+            size, obs_shape = obs_t.shape[0], obs_t.shape[1:]
+        elif readonly:
+            raise FileNotFoundError(f"No replay buffer found in {path}")
+        else:
+            os.makedirs(path, exist_ok=True)
+        self._header = self._allocate("header", (2, ), np.int64)
+        super().__init__(size, obs_shape)
+        self._load_header()
+
+    def _allocate(self, name: str, shape: tuple, dtype) -> np.ndarray:
+        file_name = os.path.join(self._path, f"{name}.npy")
+        if self._exists:
+            return np.lib.format.open_memmap(file_name, mode="r" if self._readonly else "r+")
+        return np.lib.format.open_memmap(file_name, mode="w+", dtype=dtype, shape=shape)
+
+    def _load_header(self):
+        self._size, self._next_idx = (int(value) for value in self._header)
+
+    def add(self, *args, **kwargs):
+        if self._readonly:
+            raise PermissionError("Replay buffer was opened readonly")
+        super().add(*args, **kwargs)
+        # the header is written after the transition, so readers never see a transition before it is complete
+        self._header[:] = (self._size, self._next_idx)
+
+    def add_batch(self, *args, **kwargs):
+        if self._readonly:
+            raise PermissionError("Replay buffer was opened readonly")
+        super().add_batch(*args, **kwargs)
+        self._header[:] = (self._size, self._next_idx)
+
+    def sample(self, batch_size):
+        """Sample a batch of experiences, see ReplayBuffer.sample"""
+        if self._readonly:
+            self._load_header()
+        return super().sample(batch_size)
+
+    def flush(self):
+        """Writes all changes to disk, the data survives process restarts without it but not a crash of the os"""
+        for array in (self._obses_t, self._actions, self._rewards, self._obses_tp1, self._dones, self._header):
+            array.flush()
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+
+    def __init__(self, size: int = 10000, alpha: float = 0.6, **kwargs):
+        """Create Prioritized Replay buffer.
+        Parameters
+        ----------
+        size: int
+            Max number of transitions to store in the buffer. When the buffer
+            overflows the old memories are dropped.
+        alpha: float
+            how much prioritization is used
+            (0 - no prioritization, 1 - full prioritization)
+        kwargs:
+            passed on to the storage class, e.g. obs_shape for PrioritizedArrayReplayBuffer
+        See Also
+        --------
+        ReplayBuffer.__init__
+        """
+        super().__init__(size, **kwargs)
+        assert alpha >= 0
+        self._alpha = alpha
+
+        it_capacity = 1
+        while it_capacity < size:
+            it_capacity *= 2
+
+        self._it_sum = SumSegmentTree(it_capacity)
+        self._it_min = MinSegmentTree(it_capacity)
+        self._max_priority = 1.0
+
+    def add(self, *args, **kwargs):
+        """See ReplayBuffer.add, new and overwritten transitions get the highest priority seen so far"""
+        idx = self._next_idx
+        super().add(*args, **kwargs)
+        self._it_sum[idx] = self._max_priority ** self._alpha
+        self._it_min[idx] = self._max_priority ** self._alpha
+
+    def add_batch(self, obses_t, actions, rewards, obses_tp1, dones, exponents: bool = False):
+        """See ReplayBuffer.add_batch, all transitions get the highest priority seen so far"""
+        idxes = self._batch_indices(len(actions))
+        super().add_batch(obses_t, actions, rewards, obses_tp1, dones, exponents=exponents)
+        if len(idxes) == 0:
+            return
+        self._it_sum[idxes] = self._max_priority ** self._alpha
+        self._it_min[idxes] = self._max_priority ** self._alpha
+
+    def _sample_proportional(self, batch_size):
+        # one sample from every of batch_size equally sized segments of the total priority mass
+        every_range_len = self._it_sum.sum() / batch_size
+        mass = (np.random.random(batch_size) + np.arange(batch_size)) * every_range_len
+        return np.minimum(self._it_sum.find_prefixsum_idx(mass), len(self) - 1)
+
+    def sample(self, batch_size, beta: float = 0.4):
+        """Sample a batch of experiences.
+        compared to ReplayBuffer.sample
+        it also returns importance weights and idxes
+        of sampled experiences.
+        Parameters
+        ----------
+        batch_size: int
+            How many transitions to sample.
+        beta: float
+            To what degree to use importance weights
+            (0 - no corrections, 1 - full correction)
+        Returns
+        -------
+        the batch of ReplayBuffer.sample followed by
+        weights: np.array
+            Array of shape (batch_size,) and dtype np.float32
+            denoting importance weight of each sampled transition
+        idxes: np.array
+            Array of shape (batch_size,) and dtype np.int64
+            idexes in buffer of sampled experiences
+        """
+        assert beta > 0
+
+        idxes = self._sample_proportional(batch_size)
+
+        p_min = self._it_min.min() / self._it_sum.sum()
+        max_weight = (p_min * len(self)) ** (-beta)
+        p_sample = self._it_sum[idxes] / self._it_sum.sum()
+        weights = ((p_sample * len(self)) ** (-beta) / max_weight).astype(np.float32)
+        encoded_sample = self._encode_sample(idxes)
+        return tuple(encoded_sample) + (weights, idxes)
+
+    def update_priorities(self, idxes, priorities):
+        """Update priorities of sampled transitions.
+        sets priority of transition at index idxes[i] in buffer
+        to priorities[i].
+        Parameters
+        ----------
+        idxes: [int]
+            List of idxes of sampled transitions
+        priorities: [float]
+            List of updated priorities corresponding to
+            transitions at the sampled idxes denoted by
+            variable `idxes`.
+        """
+        idxes = np.asarray(idxes)
+        priorities = np.asarray(priorities, dtype=np.float64)
+        assert len(idxes) == len(priorities)
+        assert (priorities > 0).all()
+        assert ((0 <= idxes) & (idxes < len(self))).all()
+        self._it_sum[idxes] = priorities ** self._alpha
+        self._it_min[idxes] = priorities ** self._alpha
+        self._max_priority = max(self._max_priority, priorities.max())
+
+
+class PrioritizedArrayReplayBuffer(PrioritizedReplayBuffer, ArrayReplayBuffer):
+    """Prioritized Replay buffer on top of the preallocated storage of ArrayReplayBuffer"""
+    pass
+
+
 class EpisodeBuffer:
 
     """
     This Buffer implementation stores and samples whole episodes instead of random samples from multiple episodes
-    which comes in handy when you use recurrent neural networks which rely on detecting time dependend connections
+    which comes in handy when you use recurrent neural networks which rely on detecting time dependend connections.
+    All transitions live in preallocated ring arrays, every episode is a segment of them described by its start
+    offset and length, so sampling gathers the requested transitions in one go instead of copying whole episodes.
     """
-    def __init__(self, size: int = 1000):
+    def __init__(self, size: int = 1000, max_transitions: int = 100000):
         """
         ATTENTION! Size is now related to the amount of episodes that should be stored - not (state, action)-tuples
-        :param size:
+        :param size: max number of finished episodes
+        :param max_transitions: max number of transitions over all episodes including the unfinished one. When the
+            storage overflows the oldest episodes are dropped.
         """
         self._episode_number = 0
-        self._episode_length = {}
-        self._buffer_storage = []
-        self._storage = []
         self._maxsize = size
+        self._max_transitions = max_transitions
+        self._episode_starts = np.zeros(size, dtype=np.int64)
+        self._episode_lengths = np.zeros(size, dtype=np.int64)
+        self._oldest_episode = 0
+        self._number_episodes = 0
         self._next_idx = 0
+        self._current_start = 0
+        self._current_length = 0
+        self._obses_t = None
 
     def __len__(self):
-        return len(self._storage)
+        return self._number_episodes
+
+    def _allocate(self, obs_t):
+        obs_t = np.asarray(obs_t)
+        self._obses_t = np.zeros((self._max_transitions, ) + obs_t.shape, dtype=obs_t.dtype)
+        self._actions = np.zeros(self._max_transitions, dtype=np.int64)
+        self._rewards = np.zeros(self._max_transitions, dtype=np.float32)
+        self._obses_tp1 = np.zeros((self._max_transitions, ) + obs_t.shape, dtype=obs_t.dtype)
+        self._dones = np.zeros(self._max_transitions, dtype=bool)
+        self._next_actions = np.zeros(self._max_transitions, dtype=np.int64)
+
+    def _drop_oldest_episode(self):
+        self._oldest_episode = (self._oldest_episode + 1) % self._maxsize
+        self._number_episodes -= 1
 
     def add(self, obs_t, action, reward, obs_tp1, done, next_actions=None):
-        data = (obs_t, action, reward, obs_tp1, done, next_actions)
-        self._buffer_storage.append(data)
+        if self._obses_t is None:
+            self._allocate(obs_t)
+        if self._current_length == self._max_transitions:
+            raise ValueError("Episode is longer than max_transitions")
+        idx = self._next_idx
+        # the oldest episode is dropped as soon as its first transition gets overwritten
+        if self._number_episodes > 0 and self._episode_starts[self._oldest_episode] == idx:
+            self._drop_oldest_episode()
+        self._obses_t[idx] = obs_t
+        self._actions[idx] = action
+        self._rewards[idx] = reward
+        self._obses_tp1[idx] = obs_tp1
+        self._dones[idx] = done
+        self._next_actions[idx] = -1 if next_actions is None else next_actions
+        self._next_idx = (self._next_idx + 1) % self._max_transitions
+        self._current_length += 1
         if done:
-            if self._next_idx >= len(self._storage):
-                self._storage.append(self._buffer_storage)
-            else:
-                self._storage[self._next_idx] = self._buffer_storage
-            self._next_idx = (self._next_idx + 1) % self._maxsize
+            if self._number_episodes == self._maxsize:
+                self._drop_oldest_episode()
+            episode = (self._oldest_episode + self._number_episodes) % self._maxsize
+            self._episode_starts[episode] = self._current_start
+            self._episode_lengths[episode] = self._current_length
+            self._number_episodes += 1
             self._episode_number += 1
-            self._buffer_storage = []
+            self._current_start = self._next_idx
+            self._current_length = 0
 
-    def _encode_sample(self, batch_size):
-        obses_t, actions, rewards, obses_tp1, dones, next_actions = [], [], [], [], [], []
-        enough = False
-        while not enough:
-            i = random.randint(0, len(self._storage) - 1)
-            data = self._storage[i]
-            for tmp in data:
-                obs_t, action, reward, obs_tp1, done, next_states = tmp
-                obses_t.append(np.array(obs_t, copy=False))
-                actions.append(np.array(action, copy=False))
-                rewards.append(reward)
-                obses_tp1.append(np.array(obs_tp1, copy=False))
-                dones.append(done)
-                next_actions.append(next_states)
-            enough = True if len(dones) >= batch_size else False
-
-        obses_t = obses_t[0:batch_size]
-        actions = actions[0:batch_size]
-        rewards = rewards[0:batch_size]
-        obses_tp1 = obses_tp1[0:batch_size]
-        dones = dones[0:batch_size]
-        next_actions = next_actions[0:batch_size]
+    def _sample_episodes(self, number_episodes: int):
+        episodes = (self._oldest_episode + np.random.randint(0, self._number_episodes, size=number_episodes)) \
+            % self._maxsize
+        return self._episode_starts[episodes], self._episode_lengths[episodes]
 
-        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones), \
-               np.array(next_actions)
+    def _gather(self, idxes, mask=None):
+        data = (self._obses_t[idxes], self._actions[idxes], self._rewards[idxes], self._obses_tp1[idxes],
+                self._dones[idxes], self._next_actions[idxes])
+        if mask is not None:
+            for values in data:
+                values[~mask] = 0
+        return data
+
+    def _encode_sample(self, batch_size):
+        # draw whole episodes until they hold at least batch_size transitions, only their offsets are concatenated
+        starts, lengths = [], []
+        number_transitions = 0
+        while number_transitions < batch_size:
+            start, length = self._sample_episodes(1)
+            starts.append(start[0])
+            lengths.append(length[0])
+            number_transitions += length[0]
+        starts, lengths = np.array(starts), np.array(lengths)
+        first_idxes = np.cumsum(lengths) - lengths
+        idxes = np.arange(number_transitions) - np.repeat(first_idxes - starts, lengths)
+        return self._gather(idxes[:batch_size] % self._max_transitions)
 
     def sample(self, batch_size):
         """Sample a batch of experiences.
@@ -168,5 +500,33 @@ class EpisodeBuffer:
         done_mask: np.array
             done_mask[i] = 1 if executing act_batch[i] resulted in
             the end of an episode and 0 otherwise.
+        next_act_batch: np.array
+            next actions, -1 if none were stored
+        """
+        return self._encode_sample(batch_size)
+
+    def sample_sequences(self, batch_size: int, sequence_length: int = None):
+        """Sample a batch of subsequences for recurrent training.
+        Parameters
+        ----------
+        batch_size: int
+            How many sequences to sample.
+        sequence_length: int
+            Length of the sequences, every sequence starts at a random step of a random episode. Episodes which are
+            shorter are padded. If None whole episodes are sampled and padded to the longest one of the batch.
+        Returns
+        -------
+        the batch of sample with shape (batch_size, sequence_length, ...) for every array followed by
+        mask: np.array
+            bool array of shape (batch_size, sequence_length), False for padded steps whose values are zero
         """
-        return self._encode_sample(batch_size)
\ No newline at end of file
+        starts, lengths = self._sample_episodes(batch_size)
+        if sequence_length is None:
+            sequence_length = lengths.max()
+            offsets = np.zeros(batch_size, dtype=np.int64)
+        else:
+            offsets = (np.random.random(batch_size) * np.maximum(lengths - sequence_length + 1, 1)).astype(np.int64)
+        steps = np.arange(sequence_length)
+        idxes = (starts[:, None] + offsets[:, None] + steps) % self._max_transitions
+        mask = steps < (lengths - offsets)[:, None]
+        return self._gather(idxes, mask) + (mask, )
@@ -0,0 +1,46 @@
+def histogram_of_points(point_history: list, title: str = None, path: str = None, show: bool = True):
+    """
+    histogram of the points of played games. plotly is imported on the first call, so the game and environment
+    modules can be used without it.
+    :param point_history: e.g. Env.point_history
+    :param title:
+    :param path: optional html file the figure is written to
+    :param show: open the figure in the browser
+    :return: the plotly figure
+    """
+    try:
+        import plotly.express as px
+    except ImportError as error:
+        raise ImportError("plotting needs plotly, pip install plotly") from error
+    fig = px.histogram(x=list(point_history), title=title, labels={"x": "points"})
+    if path is not None:
+        fig.write_html(path)
+    if show:
+        fig.show()
+    return fig
+
+
+def histogram_of_binned_points(histogram: dict, title: str = None, path: str = None, show: bool = True):
+    """
+    histogram of points which were already binned, e.g. the points_histogram of an agent in a report of
+    src.evaluation, so the games do not have to be kept or played again
+    :param histogram: dict with the bin_width and the counts per lower bin edge
+    :param title:
+    :param path: optional html file the figure is written to
+    :param show: open the figure in the browser
+    :return: the plotly figure
+    """
+    try:
+        import plotly.express as px
+    except ImportError as error:
+        raise ImportError("plotting needs plotly, pip install plotly") from error
+    edges = sorted(histogram["counts"], key=float)
+    # the bars are centered on their bins
+    fig = px.bar(x=[float(edge) + histogram["bin_width"] / 2 for edge in edges],
+                 y=[histogram["counts"][edge] for edge in edges], title=title, labels={"x": "points", "y": "count"})
+    fig.update_traces(width=histogram["bin_width"])
+    if path is not None:
+        fig.write_html(path)
+    if show:
+        fig.show()
+    return fig
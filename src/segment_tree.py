@@ -0,0 +1,98 @@
+import operator
+
+import numpy as np
+
+
+class SegmentTree:
+
+    def __init__(self, capacity: int, operation, neutral_element: float, scalar_operation=None):
+        """Build a Segment Tree data structure stored in a flat array.
+        Leaves sit at [capacity, 2 * capacity), node i holds operation(node 2i, node 2i + 1), so node 1 reduces the
+        whole array. Indices can be set one at a time or as whole batches, for batches the python loop only runs over
+        the log2(capacity) levels of the tree.
+        Parameters
+        ----------
+        capacity: int
+            Total size of the array - must be a power of two.
+        operation: np.ufunc
+            associative binary operation like np.add or np.minimum
+        neutral_element: float
+            neutral element for the operation above. eg. 0 for sum and float('inf') for min.
+        scalar_operation: callable
+            the same operation for two scalars, e.g. operator.add or min, used when a single index is set
+        """
+        assert capacity > 0 and capacity & (capacity - 1) == 0, "capacity must be positive and a power of 2."
+        self._capacity = capacity
+        self._operation = operation
+        self._scalar_operation = scalar_operation or operation
+        self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
+
+    def __setitem__(self, idxes, values):
+        if isinstance(idxes, (int, np.integer)):
+            self._set_single_item(int(idxes), values)
+            return
+        idxes = np.asarray(idxes, dtype=np.int64) + self._capacity
+        self._value[idxes] = values
+        # parents are recomputed from their children, so duplicate indices in the batch are handled correctly
+        idxes = np.unique(idxes // 2)
+        while idxes[0] >= 1:
+            self._value[idxes] = self._operation(self._value[2 * idxes], self._value[2 * idxes + 1])
+            idxes = np.unique(idxes // 2)
+
+    def _set_single_item(self, idx, value):
+        # plain python loop, much cheaper than the batch path for a single index
+        value_array = self._value
+        idx += self._capacity
+        value_array[idx] = value
+        idx //= 2
+        while idx >= 1:
+            value_array[idx] = self._scalar_operation(value_array[2 * idx], value_array[2 * idx + 1])
+            idx //= 2
+
+    def __getitem__(self, idxes):
+        return self._value[np.asarray(idxes, dtype=np.int64) + self._capacity]
+
+    def reduce(self):
+        """Returns result of applying `self.operation` to all elements of the array."""
+        return self._value[1]
+
+
+class SumSegmentTree(SegmentTree):
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity=capacity, operation=np.add, neutral_element=0.0, scalar_operation=operator.add)
+
+    def sum(self):
+        return self.reduce()
+
+    def find_prefixsum_idx(self, prefixsums: np.ndarray) -> np.ndarray:
+        """Find the highest indices i in the array such that
+            sum(arr[0] + arr[1] + ... + arr[i - 1]) <= prefixsum
+        for every prefixsum of the batch.
+        Parameters
+        ----------
+        prefixsums: np.ndarray
+            upper bounds on the sums of array prefixes
+        Returns
+        -------
+        idxes: np.ndarray
+            highest indices satisfying the prefixsum constraint
+        """
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        idxes = np.ones(len(prefixsums), dtype=np.int64)
+        while idxes[0] < self._capacity:
+            left = self._value[2 * idxes]
+            go_right = left <= prefixsums
+            prefixsums -= np.where(go_right, left, 0.0)
+            idxes = 2 * idxes + go_right
+        return idxes - self._capacity
+
+
+class MinSegmentTree(SegmentTree):
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity=capacity, operation=np.minimum, neutral_element=float("inf"),
+                         scalar_operation=min)
+
+    def min(self):
+        return self.reduce()
@@ -0,0 +1,111 @@
+import numpy as np
+
+from src.bitboard import transpose
+from src.helpers import Direction, to_exponents
+
+_DIRECTION_VECTORS = {Direction.UP: (-1, 0), Direction.DOWN: (1, 0), Direction.LEFT: (0, -1), Direction.RIGHT: (0, 1)}
+_NIBBLE_SHIFTS = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def symmetry_permutations(number_tiles: int = 4) -> np.ndarray:
+    """
+    the 8 rotations and reflections of the board as permutations of the flattened cells,
+    board.ravel()[permutation] is the flattened symmetric board. The first one is the identity.
+    :param number_tiles:
+    :return: np array with shape (8, number_tiles ** 2)
+    """
+    cells = np.arange(number_tiles * number_tiles).reshape((number_tiles, number_tiles))
+    permutations = []
+    for board in (cells, cells.T):
+        for number_rotations in range(4):
+            permutations.append(np.rot90(board, number_rotations).ravel())
+    return np.array(permutations)
+
+
+def _action_permutations(permutations: np.ndarray, number_tiles: int) -> np.ndarray:
+    # follow a step from an inner cell through every symmetry to see where the direction points afterwards
+    inverse = np.argsort(permutations, axis=1)
+    vectors = {vector: direction.value for direction, vector in _DIRECTION_VECTORS.items()}
+    actions = np.zeros((len(permutations), 4), dtype=np.int64)
+    origin = (1, 1)
+    for symmetry, inverse_permutation in enumerate(inverse):
+        new_origin = divmod(inverse_permutation[origin[0] * number_tiles + origin[1]], number_tiles)
+        for direction, (di, dj) in _DIRECTION_VECTORS.items():
+            new_target = divmod(inverse_permutation[(origin[0] + di) * number_tiles + origin[1] + dj], number_tiles)
+            vector = (int(new_target[0] - new_origin[0]), int(new_target[1] - new_origin[1]))
+            actions[symmetry, direction.value] = vectors[vector]
+    return actions
+
+
+SYMMETRY_PERMUTATIONS = symmetry_permutations()
+# ACTION_PERMUTATIONS[s, a] is the action on symmetric board s which does the same as action a on the board
+ACTION_PERMUTATIONS = _action_permutations(SYMMETRY_PERMUTATIONS, 4)
+
+
+def canonical_hash(board: np.ndarray) -> int:
+    """
+    64 bit key of a 4x4 board which is the same for all of its 8 symmetries: the smallest packed board (4 bits of
+    tile exponent per cell, cell i in bits 4i to 4i + 3, like pack_board) over all symmetries
+    :param board: np array with the tile values
+    :return: int
+    """
+    return int(canonical_hash_batch(np.asarray(board)[None])[0])
+
+
+def canonical_hash_batch(boards: np.ndarray, exponents: bool = False) -> np.ndarray:
+    """
+    canonical_hash for many boards at once
+    :param boards: np array with shape (number_boards, 4, 4)
+    :param exponents: the boards hold tile exponents instead of tile values
+    :return: np array with shape (number_boards, ) and dtype uint64
+    """
+    if not exponents:
+        boards = to_exponents(boards)
+    symmetric = boards.reshape((len(boards), 16))[:, SYMMETRY_PERMUTATIONS].astype(np.uint64)
+    # the nibbles do not overlap, so the sum is the packed board
+    return (symmetric << _NIBBLE_SHIFTS).sum(axis=2, dtype=np.uint64).min(axis=1)
+
+
+def _mirror(bits: int) -> int:
+    # reverses the order of the tiles in every row
+    return ((bits & 0xF000F000F000F000) >> 12) | ((bits & 0x0F000F000F000F00) >> 4) | \
+        ((bits & 0x00F000F000F000F0) << 4) | ((bits & 0x000F000F000F000F) << 12)
+
+
+def _flip(bits: int) -> int:
+    # reverses the order of the rows
+    return ((bits & 0xFFFF) << 48) | (((bits >> 16) & 0xFFFF) << 32) | (((bits >> 32) & 0xFFFF) << 16) | (bits >> 48)
+
+
+def canonical_bitboard(bits: int) -> int:
+    """
+    canonical_hash of a packed board, computed with bit operations only
+    :param bits: packed board of the bitboard module
+    :return: int
+    """
+    mirrored = _mirror(bits)
+    flipped = _flip(bits)
+    rotated = _flip(mirrored)
+    return min(bits, mirrored, flipped, rotated,
+               transpose(bits), transpose(mirrored), transpose(flipped), transpose(rotated))
+
+
+def augment_batch(obses_t: np.ndarray, actions: np.ndarray, rewards: np.ndarray, obses_tp1: np.ndarray,
+                  dones: np.ndarray) -> tuple:
+    """
+    adds all 8 symmetries of every transition of a replay batch, the 8 variants of a transition follow each other
+    :param obses_t: np array with shape (batch_size, 4, 4, ...) of boards, any encoding per cell works
+    :param actions: np array with shape (batch_size, )
+    :param rewards: np array with shape (batch_size, )
+    :param obses_tp1: np array like obses_t
+    :param dones: np array with shape (batch_size, )
+    :return: tuple of the same arrays with 8 * batch_size entries
+    """
+    batch_size = len(obses_t)
+
+    def augment_boards(boards):
+        flat = boards.reshape((batch_size, 16) + boards.shape[3:])
+        return flat[:, SYMMETRY_PERMUTATIONS].reshape((batch_size * 8, ) + boards.shape[1:])
+
+    return augment_boards(np.asarray(obses_t)), ACTION_PERMUTATIONS[:, np.asarray(actions)].T.ravel(), \
+        np.repeat(rewards, 8), augment_boards(np.asarray(obses_tp1)), np.repeat(dones, 8)
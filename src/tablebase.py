@@ -0,0 +1,326 @@
+import logging
+import multiprocessing
+import struct
+import time
+
+import numpy as np
+
+from src.batch_env import move_boards
+from src.helpers import to_exponents
+from src.symmetry import ACTION_PERMUTATIONS, symmetry_permutations
+
+# a tablebase file starts with the magic, the format version, the board size, the exponent of the tile which ends
+# the solved game (0 if the game is played until no move is left), the capacity of the hash table and the number of
+# states, followed by the keys (uint64), the values (float32) and the actions (uint8) of all slots
+FILE_HEADER = struct.Struct("<4sBBBxQQ")
+MAGIC = b"2TB\x00"
+VERSION = 1
+# key of the empty slots, the empty board is never a state of a game
+EMPTY = 0
+# action of the states in which the game is over
+NO_ACTION = 255
+SPAWNS = ((1, 0.9), (2, 0.1))
+# multiplier of the fibonacci hashing of the keys
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def pack_boards(exponents: np.ndarray) -> np.ndarray:
+    """
+    packs boards of tile exponents into 64 bit keys, 4 bits per cell with cell i in bits 4i to 4i + 3
+    :param exponents: np array with shape (number_boards, number_tiles, number_tiles), number_tiles <= 4
+    :return: np array with shape (number_boards, ) and dtype uint64
+    """
+    flat = exponents.reshape(len(exponents), exponents.shape[-1] ** 2).astype(np.uint64)
+    return (flat << (np.arange(flat.shape[1], dtype=np.uint64) * np.uint64(4))).sum(axis=1, dtype=np.uint64)
+
+
+def unpack_boards(keys: np.ndarray, number_tiles: int) -> np.ndarray:
+    """
+    inverse of pack_boards
+    :return: np array with shape (number_boards, number_tiles, number_tiles) and dtype uint8
+    """
+    shifts = np.arange(number_tiles ** 2, dtype=np.uint64) * np.uint64(4)
+    flat = (np.asarray(keys, dtype=np.uint64)[:, None] >> shifts) & np.uint64(0xF)
+    return flat.astype(np.uint8).reshape((len(keys), number_tiles, number_tiles))
+
+
+def canonical_keys(exponents: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    smallest key of the 8 rotations and reflections of every board, like canonical_hash_batch for any board size
+    :param exponents: np array with shape (number_boards, number_tiles, number_tiles)
+    :return: tuple of the keys and the index of the symmetry which gives the key
+    """
+    number_boards, number_tiles = len(exponents), exponents.shape[-1]
+    symmetric = exponents.reshape(number_boards, number_tiles ** 2)[:, symmetry_permutations(number_tiles)]
+    keys = pack_boards(symmetric.reshape(number_boards * 8, number_tiles, number_tiles)).reshape(number_boards, 8)
+    symmetries = keys.argmin(axis=1)
+    return keys[np.arange(number_boards), symmetries], symmetries
+
+
+def _tile_sums(exponents: np.ndarray) -> np.ndarray:
+    return np.where(exponents > 0, np.left_shift(1, exponents.astype(np.int64)), 0).sum(axis=(1, 2))
+
+
+def _initial_layers(number_tiles: int) -> dict:
+    # every board with two tiles of 2 or 4, grouped by tile sum
+    number_cells = number_tiles ** 2
+    boards = []
+    for first in range(number_cells):
+        for second in range(first + 1, number_cells):
+            for first_exponent, _ in SPAWNS:
+                for second_exponent, _ in SPAWNS:
+                    board = np.zeros(number_cells, dtype=np.uint8)
+                    board[first], board[second] = first_exponent, second_exponent
+                    boards.append(board)
+    exponents = np.array(boards).reshape((-1, number_tiles, number_tiles))
+    keys = canonical_keys(exponents)[0]
+    sums = _tile_sums(exponents)
+    return {int(tile_sum): [np.unique(keys[sums == tile_sum])] for tile_sum in np.unique(sums)}
+
+
+def _afterstates(exponents: np.ndarray, direction: int) -> (np.ndarray, np.ndarray, np.ndarray):
+    moved, points = move_boards(exponents, np.full(len(exponents), direction))
+    return moved, points, (moved != exponents).any(axis=(1, 2))
+
+
+def _spawned(afterstates: np.ndarray, cell: int, exponent: int) -> np.ndarray:
+    flat = afterstates.reshape(len(afterstates), afterstates.shape[-1] ** 2).copy()
+    flat[:, cell] = exponent
+    return flat.reshape(afterstates.shape)
+
+
+def _expand_chunk(task: tuple) -> dict:
+    """
+    worker function of the forward pass
+    :return: dict of tile sum increase to the unique canonical keys of all successors of the chunk
+    """
+    keys, number_tiles, max_exponent = task
+    exponents = unpack_boards(keys, number_tiles)
+    if max_exponent:
+        exponents = exponents[exponents.max(axis=(1, 2)) < max_exponent]
+    successors = {2 * exponent: [] for exponent, _ in SPAWNS}
+    for direction in range(4):
+        moved, _, changed = _afterstates(exponents, direction)
+        moved = moved[changed]
+        flat = moved.reshape(len(moved), number_tiles ** 2)
+        for cell in range(flat.shape[1]):
+            empty = moved[flat[:, cell] == 0]
+            for exponent, _ in SPAWNS:
+                successors[2 * exponent].append(canonical_keys(_spawned(empty, cell, exponent))[0])
+    return {increase: np.unique(np.concatenate(keys)) for increase, keys in successors.items()}
+
+
+def _solve_chunk(task: tuple) -> (np.ndarray, np.ndarray):
+    """
+    worker function of the backward pass
+    :return: tuple of the values and the actions of the chunk
+    """
+    keys, number_tiles, max_exponent, next_layers = task
+    values = np.zeros(len(keys))
+    actions = np.full(len(keys), NO_ACTION, dtype=np.uint8)
+    exponents = unpack_boards(keys, number_tiles)
+    # boards with the final tile are over, their successors were not enumerated
+    playing = exponents.max(axis=(1, 2)) < max_exponent if max_exponent else np.ones(len(keys), dtype=bool)
+    exponents = exponents[playing]
+    q_values = np.full((len(exponents), 4), -np.inf)
+    for direction in range(4):
+        moved, points, changed = _afterstates(exponents, direction)
+        flat = moved.reshape(len(moved), number_tiles ** 2)
+        number_empty = (flat == 0).sum(axis=1)
+        expected = np.zeros(len(exponents))
+        for cell in range(flat.shape[1]):
+            empty = changed & (flat[:, cell] == 0)
+            for exponent, probability in SPAWNS:
+                layer_keys, layer_values = next_layers[2 * exponent]
+                children = canonical_keys(_spawned(moved[empty], cell, exponent))[0]
+                expected[empty] += probability * layer_values[np.searchsorted(layer_keys, children)]
+        q_values[changed, direction] = points[changed] + expected[changed] / number_empty[changed]
+    best = q_values.argmax(axis=1)
+    best_values = q_values[np.arange(len(exponents)), best]
+    # boards without a legal move keep the value 0
+    movable = np.isfinite(best_values)
+    values[np.flatnonzero(playing)[movable]] = best_values[movable]
+    actions[np.flatnonzero(playing)[movable]] = best[movable]
+    return values, actions
+
+
+def _chunks(keys: np.ndarray, chunk_size: int) -> list:
+    return [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+
+
+def solve(number_tiles: int, max_tile: int = None, processes: int = None, chunk_size: int = 2 ** 16) -> dict:
+    """
+    solves the game on a small board exactly. All states reachable from the initial boards are enumerated and
+    grouped by their tile sum, which grows by 2 or 4 with every move, so the layers can be solved backwards from the
+    largest tile sum. The value of a state is the expected number of points of optimal play until the game is over.
+    States are identified by their canonical key, every rotation and reflection shares one entry.
+    :param number_tiles: 2 or 3, larger boards have too many states
+    :param max_tile: the game ends when a tile of this value appears, None to play until no move is left. 3x3 boards
+        have hundreds of millions of states without a limit.
+    :param processes: number of worker processes over the chunks of a layer, defaults to the number of cpus
+    :param chunk_size: number of states per task
+    :return: dict with the sorted keys, the values and actions of the canonical boards and the statistics
+    """
+    max_exponent = int(max_tile).bit_length() - 1 if max_tile else 0
+    processes = processes or multiprocessing.cpu_count()
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    map_function = pool.imap if pool is not None else map
+    start = time.perf_counter()
+    try:
+        pending = _initial_layers(number_tiles)
+        layers = {}
+        while pending:
+            tile_sum = min(pending)
+            keys = np.unique(np.concatenate(pending.pop(tile_sum)))
+            layers[tile_sum] = keys
+            tasks = [(chunk, number_tiles, max_exponent) for chunk in _chunks(keys, chunk_size)]
+            for successors in map_function(_expand_chunk, tasks):
+                for increase, successor_keys in successors.items():
+                    if successor_keys.size:
+                        pending.setdefault(tile_sum + increase, []).append(successor_keys)
+        number_states = sum(len(keys) for keys in layers.values())
+        logging.info(f"enumerated {number_states} states in {time.perf_counter() - start:.1f}s")
+
+        empty_layer = (np.zeros(0, dtype=np.uint64), np.zeros(0), np.zeros(0, dtype=np.uint8))
+        solved = {}
+        for tile_sum in sorted(layers, reverse=True):
+            next_layers = {increase: solved.get(tile_sum + increase, empty_layer)[:2] for increase in (2, 4)}
+            tasks = [(chunk, number_tiles, max_exponent, next_layers)
+                     for chunk in _chunks(layers[tile_sum], chunk_size)]
+            results = list(map_function(_solve_chunk, tasks))
+            solved[tile_sum] = (layers[tile_sum], np.concatenate([values for values, _ in results]),
+                                np.concatenate([actions for _, actions in results]))
+            # layers more than 4 below the largest solved one are not needed by the following layers
+            solved.pop(tile_sum + 6, None)
+            layers[tile_sum] = solved[tile_sum]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    keys = np.concatenate([layers[tile_sum][0] for tile_sum in sorted(layers)])
+    order = np.argsort(keys)
+    result = {"number_tiles": number_tiles, "max_tile": max_tile, "keys": keys[order],
+              "values": np.concatenate([layers[tile_sum][1] for tile_sum in sorted(layers)])[order],
+              "actions": np.concatenate([layers[tile_sum][2] for tile_sum in sorted(layers)])[order],
+              "states": number_states, "seconds": elapsed, "states_per_sec": number_states / elapsed}
+    logging.info(f"solved {number_states} states in {elapsed:.1f}s ({result['states_per_sec']:,.0f} states/sec)")
+    return result
+
+
+def _slots(keys: np.ndarray, bits: int) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return ((keys * np.uint64(_HASH_MULTIPLIER)) >> np.uint64(64 - bits)).astype(np.int64)
+
+
+def hash_table(keys: np.ndarray, values: np.ndarray, actions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """
+    open addressing hash table with linear probing, at most half of the slots are used
+    :return: tuple of the keys (EMPTY in unused slots), values and actions per slot
+    """
+    capacity = max(16, 1 << int(2 * len(keys) - 1).bit_length())
+    table_keys = np.full(capacity, EMPTY, dtype=np.uint64)
+    table_values = np.zeros(capacity, dtype=np.float32)
+    table_actions = np.full(capacity, NO_ACTION, dtype=np.uint8)
+    remaining = np.arange(len(keys))
+    slots = _slots(keys, capacity.bit_length() - 1)
+    while remaining.size:
+        # the first of the keys which want the same free slot gets it, the others probe the next slot
+        free = table_keys[slots] == EMPTY
+        candidates, first = np.unique(slots[free], return_index=True)
+        placed = remaining[free][first]
+        table_keys[candidates] = keys[placed]
+        table_values[candidates] = values[placed]
+        table_actions[candidates] = actions[placed]
+        unplaced = np.ones(len(remaining), dtype=bool)
+        unplaced[np.flatnonzero(free)[first]] = False
+        remaining = remaining[unplaced]
+        slots = (slots[unplaced] + 1) & (capacity - 1)
+    return table_keys, table_values, table_actions
+
+
+def build_tablebase(path: str, number_tiles: int, max_tile: int = None, processes: int = None,
+                    chunk_size: int = 2 ** 16) -> dict:
+    """
+    solves the game with solve and writes the hash table of the result to path
+    :return: dict with the statistics of the solver and the size of the file in bytes
+    """
+    result = solve(number_tiles, max_tile=max_tile, processes=processes, chunk_size=chunk_size)
+    table_keys, table_values, table_actions = hash_table(result["keys"], result["values"], result["actions"])
+    max_exponent = int(max_tile).bit_length() - 1 if max_tile else 0
+    with open(path, "wb") as file:
+        file.write(FILE_HEADER.pack(MAGIC, VERSION, number_tiles, max_exponent, len(table_keys), result["states"]))
+        for array in (table_keys, table_values, table_actions):
+            file.write(array.tobytes())
+    size = FILE_HEADER.size + table_keys.nbytes + table_values.nbytes + table_actions.nbytes
+    logging.info(f"wrote {result['states']} states to {path} ({size / 2 ** 20:.1f} MiB)")
+    return {"states": result["states"], "seconds": result["seconds"], "states_per_sec": result["states_per_sec"],
+            "bytes": size}
+
+
+class Tablebase:
+
+    def __init__(self, path: str):
+        """
+        memory mapped tablebase written by build_tablebase, lookups take O(1) on average
+        :param path:
+        """
+        with open(path, "rb") as file:
+            header = file.read(FILE_HEADER.size)
+        magic, version, self.number_tiles, max_exponent, capacity, self.number_states = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a tablebase file of version {VERSION}")
+        self.max_tile = 2 ** max_exponent if max_exponent else None
+        self._bits = capacity.bit_length() - 1
+        offset = FILE_HEADER.size
+        self.keys = np.memmap(path, dtype=np.uint64, mode="r", offset=offset, shape=(capacity, ))
+        offset += self.keys.nbytes
+        self.values = np.memmap(path, dtype=np.float32, mode="r", offset=offset, shape=(capacity, ))
+        offset += self.values.nbytes
+        self.actions = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(capacity, ))
+        # ACTION_PERMUTATIONS does not depend on the board size, the symmetries are built in the same order
+        self._inverse_actions = np.argsort(ACTION_PERMUTATIONS, axis=1)
+
+    def _find(self, keys: np.ndarray) -> np.ndarray:
+        # slot of every key, -1 if the key is not in the table
+        slots = _slots(keys, self._bits)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        searching = np.arange(len(keys))
+        while searching.size:
+            table_keys = self.keys[slots]
+            found = table_keys == keys[searching]
+            result[searching[found]] = slots[found]
+            searching_further = ~found & (table_keys != EMPTY)
+            searching = searching[searching_further]
+            slots = (slots[searching_further] + 1) & (len(self.keys) - 1)
+        return result
+
+    def lookup_batch(self, boards: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        :param boards: np array with shape (number_boards, number_tiles, number_tiles) holding tile values
+        :return: tuple of the values (nan for unknown boards) and the optimal actions (NO_ACTION if the game is over or
+            the board is unknown) of the boards
+        """
+        exponents = to_exponents(np.asarray(boards))
+        keys, symmetries = canonical_keys(exponents)
+        slots = self._find(keys)
+        found = slots >= 0
+        values = np.full(len(keys), np.nan)
+        values[found] = self.values[slots[found]]
+        actions = np.full(len(keys), NO_ACTION, dtype=np.uint8)
+        canonical_actions = self.actions[slots[found]]
+        playable = canonical_actions != NO_ACTION
+        # the stored action belongs to the canonical board, it is turned back into the action on the given board
+        actions[np.flatnonzero(found)[playable]] = self._inverse_actions[symmetries[found][playable],
+                                                                         canonical_actions[playable]]
+        return values, actions
+
+    def lookup(self, board: np.ndarray) -> (float, int):
+        """
+        :param board: np array with shape (number_tiles, number_tiles) holding tile values
+        :return: tuple of the value and the optimal action of the board
+        """
+        values, actions = self.lookup_batch(np.asarray(board)[None])
+        if np.isnan(values[0]):
+            raise KeyError("board is not in the tablebase")
+        return float(values[0]), int(actions[0])
@@ -0,0 +1,326 @@
+import multiprocessing
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from src.batch_env import BatchEnv
+from src.game import Env
+from src.helpers import Direction
+
+
+def _spaces(env: Env, number_envs: int = None) -> tuple:
+    """
+    gymnasium spaces of an Env, the observation is the flattened one hot state of get_state_space and the action one
+    of the get_action_space directions. gymnasium is only needed for the spaces, not for reset and step.
+    :param env:
+    :param number_envs: number of environments of a vector env, None for a single env
+    :return: tuple of observation space and action space
+    """
+    try:
+        from gymnasium import spaces
+    except ImportError as error:
+        raise ImportError("observation_space and action_space need gymnasium, pip install gymnasium") from error
+    state_shape = env.get_state_space()
+    number_actions = env.get_action_space()[0]
+    if number_envs is None:
+        return spaces.Box(0.0, 1.0, shape=state_shape, dtype=np.float32), spaces.Discrete(number_actions)
+    return spaces.Box(0.0, 1.0, shape=(number_envs, ) + state_shape, dtype=np.float32), \
+        spaces.MultiDiscrete(np.full(number_envs, number_actions))
+
+
+class GymEnv:
+
+    def __init__(self, number_tiles: int = 4, max_steps_per_game: int = 500, max_value: int = 8192,
+                 bitboard: bool = False):
+        """
+        reset/step interface of gymnasium around a single Env. Episodes terminate with "Game Over" and are truncated
+        after max_steps_per_game steps.
+        """
+        self.env = Env(number_tiles=number_tiles, max_steps_per_game=max_steps_per_game, max_value=max_value,
+                       bitboard=bitboard)
+        self.number_steps = 0
+
+    @property
+    def observation_space(self):
+        return _spaces(self.env)[0]
+
+    @property
+    def action_space(self):
+        return _spaces(self.env)[1]
+
+    def reset(self, seed: int = None, options: dict = None) -> (np.ndarray, dict):
+        """
+        :param seed: seeds the tile spawns of the game
+        :param options: unused, part of the gymnasium interface
+        :return: observation and info dict
+        """
+        if seed is not None:
+            self.env.rng = np.random.default_rng(seed)
+        self.env._init_game()
+        self.number_steps = 0
+        return self.env.encoder.encode(self.env.game.board), {"points": self.env.game.points}
+
+    def step(self, action: int) -> (np.ndarray, float, bool, bool, dict):
+        """
+        :param action: Direction value
+        :return: observation, reward, terminated, truncated, info dict
+        """
+        reward, action, state, terminated = self.env.do_action(int(action))
+        self.number_steps += 1
+        truncated = not terminated and self.number_steps >= self.env.max_steps_per_game
+        return self.env.encoder.encode(state), float(reward), terminated, truncated, {"points": self.env.game.points}
+
+    def close(self):
+        pass
+
+
+class SyncVectorEnv:
+
+    def __init__(self, number_envs: int, number_tiles: int = 4, max_steps_per_game: int = 500,
+                 max_value: int = 8192, seed: int = None, copy: bool = True, observations: np.ndarray = None):
+        """
+        number_envs games stepped together in this process by a BatchEnv. Finished and truncated games are reset
+        within the same step, the returned observation is already the first one of the new game and the points of the
+        finished game are in info["final_points"].
+        :param number_envs:
+        :param number_tiles:
+        :param max_steps_per_game: games are truncated after this many steps
+        :param max_value: highest tile value of the one hot observation
+        :param seed: seed of the BatchEnv
+        :param copy: return a copy of the observation buffer, otherwise the buffer is overwritten by the next step
+        :param observations: optional buffer with shape (number_envs, ) + get_state_space() the observations are
+            written to
+        """
+        self.number_envs = number_envs
+        self.max_steps_per_game = max_steps_per_game
+        self.copy = copy
+        self.template = Env(number_tiles=number_tiles, max_steps_per_game=max_steps_per_game, max_value=max_value)
+        self.encoder = self.template.encoder
+        self.env = BatchEnv(number_envs, number_tiles=number_tiles, seed=seed)
+        if observations is None:
+            observations = np.empty(self.encoder.get_shape(number_envs), dtype=self.encoder.dtype)
+        self.observations = observations
+        self.number_steps = np.zeros(number_envs, dtype=np.int64)
+
+    @property
+    def observation_space(self):
+        return _spaces(self.template, self.number_envs)[0]
+
+    @property
+    def action_space(self):
+        return _spaces(self.template, self.number_envs)[1]
+
+    @property
+    def single_observation_space(self):
+        return _spaces(self.template)[0]
+
+    @property
+    def single_action_space(self):
+        return _spaces(self.template)[1]
+
+    def _observe(self) -> np.ndarray:
+        self.encoder.encode_batch(self.env.boards, out=self.observations)
+        return self.observations.copy() if self.copy else self.observations
+
+    def reset(self, seed: int = None, options: dict = None) -> (np.ndarray, dict):
+        if seed is not None:
+            self.env.rng = np.random.default_rng(seed)
+        self.env.reset()
+        self.number_steps[:] = 0
+        return self._observe(), {}
+
+    def step(self, actions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict):
+        """
+        :param actions: np array with shape (number_envs, ) of Direction values
+        :return: observations, rewards, terminated, truncated, info dict with final_points
+        """
+        points_before = self.env.points.copy()
+        rewards, actions, boards, terminated = self.env.step(np.asarray(actions))
+        final_points = np.where(terminated, points_before + rewards, 0)
+        self.number_steps += 1
+        self.number_steps[terminated] = 0
+        truncated = self.number_steps >= self.max_steps_per_game
+        if truncated.any():
+            final_points[truncated] = self.env.points[truncated]
+            self.env.point_history.extend(self.env.points[truncated].tolist())
+            self.env._reset_boards(truncated)
+            self.number_steps[truncated] = 0
+        return self._observe(), rewards.astype(np.float64), terminated, truncated, {"final_points": final_points}
+
+    def close(self):
+        pass
+
+
+def _shared_array_specs(number_envs: int, state_shape: tuple, dtype) -> dict:
+    return {"observations": ((number_envs, ) + state_shape, np.dtype(dtype).str),
+            "actions": ((number_envs, ), np.dtype(np.int64).str),
+            "rewards": ((number_envs, ), np.dtype(np.float64).str),
+            "terminated": ((number_envs, ), np.dtype(bool).str),
+            "truncated": ((number_envs, ), np.dtype(bool).str),
+            "final_points": ((number_envs, ), np.dtype(np.int64).str)}
+
+
+def _attach(names: dict, specs: dict) -> (list, dict):
+    memories = [SharedMemory(name=names[key]) for key in specs]
+    arrays = {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+              for memory, (key, (shape, dtype)) in zip(memories, specs.items())}
+    return memories, arrays
+
+
+def _worker(connection, names: dict, specs: dict, start: int, stop: int, env_kwargs: dict, seed: int):
+    """
+    steps the envs start to stop of an AsyncVectorEnv, actions and results are exchanged through the shared arrays
+    and the connection only carries the commands
+    """
+    memories, arrays = _attach(names, specs)
+    env = SyncVectorEnv(stop - start, seed=seed, copy=False, observations=arrays["observations"][start:stop],
+                        **env_kwargs)
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == "step":
+                observations, rewards, terminated, truncated, info = env.step(arrays["actions"][start:stop])
+                arrays["rewards"][start:stop] = rewards
+                arrays["terminated"][start:stop] = terminated
+                arrays["truncated"][start:stop] = truncated
+                arrays["final_points"][start:stop] = info["final_points"]
+            elif command == "reset":
+                env.reset(seed=argument)
+                arrays["final_points"][start:stop] = 0
+            elif command == "close":
+                break
+            connection.send(None)
+    except Exception:
+        connection.send(traceback.format_exc())
+    finally:
+        del env, arrays
+        for memory in memories:
+            memory.close()
+        connection.close()
+
+
+class AsyncVectorEnv:
+
+    def __init__(self, number_envs: int, number_workers: int = None, number_tiles: int = 4,
+                 max_steps_per_game: int = 500, max_value: int = 8192, seed: int = 0, copy: bool = True):
+        """
+        the envs of a SyncVectorEnv split over number_workers subprocesses. Observations, actions, rewards and flags
+        live in shared memory, so a step only sends a short command to every worker and nothing is pickled.
+        step_async returns immediately, which lets the caller compute while the workers step.
+        Use close() or a with block to stop the workers and free the shared memory.
+        :param number_envs:
+        :param number_workers: defaults to the number of cpus, at most number_envs
+        :param seed: the independent seeds of the workers are derived from it
+        :param copy: return copies of the shared arrays, otherwise they are overwritten by the next step
+        """
+        self.number_envs = number_envs
+        self.number_workers = min(number_workers or multiprocessing.cpu_count(), number_envs)
+        self.copy = copy
+        env_kwargs = {"number_tiles": number_tiles, "max_steps_per_game": max_steps_per_game, "max_value": max_value}
+        self.template = Env(**env_kwargs)
+        specs = _shared_array_specs(number_envs, self.template.get_state_space(), self.template.encoder.dtype)
+        self._memories = [SharedMemory(create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+                          for shape, dtype in specs.values()]
+        self._arrays = {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf)
+                        for memory, (key, (shape, dtype)) in zip(self._memories, specs.items())}
+        names = {key: memory.name for key, memory in zip(specs, self._memories)}
+
+        bounds = np.linspace(0, number_envs, self.number_workers + 1).astype(int)
+        self._seeds = self._worker_seeds(seed)
+        self._connections = []
+        self._processes = []
+        for worker in range(self.number_workers):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child_connection, names, specs, bounds[worker], bounds[worker + 1], env_kwargs,
+                                      self._seeds[worker]), daemon=True)
+            process.start()
+            child_connection.close()
+            self._connections.append(parent_connection)
+            self._processes.append(process)
+        self._waiting = False
+        self.closed = False
+
+    def _worker_seeds(self, seed: int) -> list:
+        return [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(seed).spawn(self.number_workers)]
+
+    @property
+    def observation_space(self):
+        return _spaces(self.template, self.number_envs)[0]
+
+    @property
+    def action_space(self):
+        return _spaces(self.template, self.number_envs)[1]
+
+    @property
+    def single_observation_space(self):
+        return _spaces(self.template)[0]
+
+    @property
+    def single_action_space(self):
+        return _spaces(self.template)[1]
+
+    def _wait(self):
+        errors = [error for error in (connection.recv() for connection in self._connections) if error is not None]
+        if errors:
+            raise RuntimeError(f"Worker failed:\n{errors[0]}")
+
+    def _array(self, key: str) -> np.ndarray:
+        return self._arrays[key].copy() if self.copy else self._arrays[key]
+
+    def reset(self, seed: int = None, options: dict = None) -> (np.ndarray, dict):
+        seeds = [None] * self.number_workers if seed is None else self._worker_seeds(seed)
+        for connection, worker_seed in zip(self._connections, seeds):
+            connection.send(("reset", worker_seed))
+        self._wait()
+        return self._array("observations"), {}
+
+    def step_async(self, actions: np.ndarray):
+        if self._waiting:
+            raise RuntimeError("step_wait must be called before the next step_async")
+        actions = np.asarray(actions)
+        if not np.isin(actions, [direction.value for direction in Direction]).all():
+            raise ValueError("Invalid direction")
+        self._arrays["actions"][:] = actions
+        for connection in self._connections:
+            connection.send(("step", None))
+        self._waiting = True
+
+    def step_wait(self) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict):
+        """
+        :return: observations, rewards, terminated, truncated, info dict with final_points
+        """
+        self._wait()
+        self._waiting = False
+        return self._array("observations"), self._array("rewards"), self._array("terminated"), \
+            self._array("truncated"), {"final_points": self._array("final_points")}
+
+    def step(self, actions: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self._waiting:
+            self._wait()
+        for connection in self._connections:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for process, connection in zip(self._processes, self._connections):
+            process.join()
+            connection.close()
+        self._arrays = None
+        for memory in self._memories:
+            memory.close()
+            memory.unlink()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,256 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from src.agents.expectimax import ExpectimaxAgent, LRUCache
+from src.agents.monte_carlo import MonteCarloAgent
+from src.agents.naive_agent import UpLeftAgent
+from src.agents.ntuple import NTupleNetwork
+from src.agents.random import RandomAgent
+from src.agents.sarsa import SARSA
+from src.batch_env import BatchEnv
+from src.game import Env
+from src.helpers import Direction
+
+
+class ExpectimaxAgentTester(unittest.TestCase):
+
+    def _agent(self, **kwargs):
+        env = Env()
+        return ExpectimaxAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                               name="ExpectimaxAgent", **kwargs)
+
+    def test_only_legal_move(self):
+        agent = self._agent(depth=2)
+        board = np.array([
+            [2, 4, 2, 4],
+            [4, 2, 4, 2],
+            [2, 4, 2, 4],
+            [0, 2, 4, 2]
+        ])
+        # only down and left move a tile
+        self.assertIn(agent.decision(board), (1, 2))
+        self.assertGreater(agent.number_nodes, 0)
+        self.assertGreater(agent.nodes_per_second, 0)
+
+    def test_transposition_table_is_used(self):
+        agent = self._agent(depth=2, cache_size=1000)
+        board = np.array([
+            [2, 4, 0, 0],
+            [0, 2, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 8]
+        ])
+        first = agent.decision(board)
+        number_nodes = agent.number_nodes
+        self.assertEqual(agent.decision(board), first)
+        self.assertGreater(agent.cache_hit_rate, 0)
+        self.assertLess(agent.number_nodes - number_nodes, number_nodes)
+        self.assertLessEqual(len(agent.transposition_table), 1000)
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        cache.get(1)
+        cache.put(3, "c")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(1), "a")
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+    def test_lru_cache_shallow_entry_is_miss(self):
+        cache = LRUCache(2)
+        cache.put(1, (1, 0.5))
+        self.assertIsNone(cache.get(1, min_depth=2))
+        self.assertEqual(cache.get(1, min_depth=1), (1, 0.5))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_beats_random_play(self):
+        np.random.seed(0)
+        env = Env(bitboard=True)
+        env.assign_agent(self._agent(depth=1))
+        env.run_multiple_games(3)
+        self.assertGreater(np.mean(env.point_history), 1500)
+
+
+class MonteCarloAgentTester(unittest.TestCase):
+
+    def _agent(self, **kwargs):
+        env = Env()
+        return MonteCarloAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                               name="MonteCarloAgent", rng=0, **kwargs)
+
+    def test_only_legal_move(self):
+        agent = self._agent(number_rollouts=10, max_depth=5)
+        board = np.array([
+            [2, 4, 2, 4],
+            [4, 2, 4, 2],
+            [2, 4, 2, 4],
+            [0, 2, 4, 2]
+        ])
+        self.assertIn(agent.decision(board), (1, 2))
+        self.assertEqual(agent.total_rollouts, 40)
+        self.assertGreater(agent.rollouts_per_second, 0)
+
+    def test_time_budget(self):
+        agent = self._agent(number_rollouts=5, time_budget=0.05, max_depth=3)
+        agent.decision(np.array([
+            [2, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 2, 0],
+            [0, 0, 0, 0]
+        ]))
+        self.assertGreater(agent.total_rollouts, 20)
+        self.assertEqual(agent.total_rollouts % 20, 0)
+
+    def test_beats_random_play(self):
+        np.random.seed(0)
+        env = Env(bitboard=True)
+        env.assign_agent(self._agent(number_rollouts=8, max_depth=4))
+        env.run_multiple_games(1)
+        self.assertGreater(env.point_history[0], 1500)
+
+
+class SARSATester(unittest.TestCase):
+
+    def _agent(self):
+        env = Env()
+        return SARSA(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="SARSA")
+
+    def test_network_is_symmetric(self):
+        network = NTupleNetwork()
+        network.weights[:] = np.random.RandomState(0).rand(len(network.weights))
+        board = np.random.RandomState(1).randint(0, 12, size=(4, 4))
+        symmetric_boards = [np.rot90(b, k).ravel() for b in (board, board.T) for k in range(4)]
+        values = network.value(np.array(symmetric_boards))
+        self.assertTrue(np.allclose(values, values[0]))
+
+    def test_update_moves_value_towards_target(self):
+        network = NTupleNetwork()
+        board = np.random.RandomState(1).randint(0, 12, size=(1, 16))
+        network.update(board, [0.1])
+        # every table is sampled in 8 symmetries, each of them gets the delta, samples hitting the same weight count twice
+        self.assertGreaterEqual(network.value(board)[0], 0.1 * 8 * len(network.tuples) - 1e-4)
+        self.assertEqual(network.value(np.zeros((1, 16), dtype=int))[0], 0)
+
+    def test_learn_batch_matches_decisions(self):
+        agent = self._agent()
+        agent.network.weights[:] = np.random.RandomState(0).rand(len(agent.network.weights))
+        boards = np.array([[[2, 2, 0, 0], [0, 4, 0, 0], [0, 0, 8, 0], [0, 0, 0, 0]],
+                           [[2, 4, 8, 16], [4, 8, 16, 32], [8, 16, 32, 64], [16, 32, 64, 128]]])
+        self.assertEqual(agent.decide_batch(boards[:1]).tolist(), [agent.decision(boards[0])])
+        afterstate = np.array([[2, 1, 0, 0], [2, 0, 0, 0], [3, 0, 0, 0], [0, 0, 0, 0]]).reshape((1, 16))
+        before = agent.network.value(afterstate)[0]
+        agent.learn_batch(boards[:1], np.array([Direction.LEFT.value]), np.zeros(1), boards[1:], np.array([True]))
+        # the next board has no move, so the value of the afterstate moves towards 0
+        self.assertLess(agent.network.value(afterstate)[0], before)
+        self.assertEqual(agent.number_updates, 1)
+        copy = self._agent()
+        copy.set_parameters(agent.get_parameters())
+        self.assertTrue((copy.network.weights == agent.network.weights).all())
+
+    def test_save_and_load(self):
+        agent = self._agent()
+        agent.network.weights[:] = np.random.RandomState(0).rand(len(agent.network.weights))
+        with tempfile.TemporaryDirectory() as path:
+            file_name = os.path.join(path, "weights.npz")
+            agent.save(file_name)
+            loaded = self._agent()
+            loaded.load(file_name)
+        self.assertEqual(loaded.network.tuples, agent.network.tuples)
+        self.assertTrue((loaded.network.weights == agent.network.weights).all())
+
+    def test_save_and_load_without_suffix(self):
+        agent = self._agent()
+        agent.network.weights[:] = np.random.RandomState(0).rand(len(agent.network.weights))
+        with tempfile.TemporaryDirectory() as path:
+            file_name = os.path.join(path, "weights")
+            agent.save(file_name)
+            self.assertTrue(os.path.exists(file_name + ".npz"))
+            loaded = self._agent()
+            loaded.load(file_name)
+        self.assertTrue((loaded.network.weights == agent.network.weights).all())
+
+    def test_learns_under_batch_env(self):
+        agent = self._agent()
+        env = BatchEnv(32, seed=0)
+        env.assign_agent(agent)
+        env.run(200)
+        self.assertEqual(agent.number_updates, 32 * 200)
+        self.assertTrue(agent.network.weights.any())
+
+    def test_learns_while_playing(self):
+        np.random.seed(0)
+        env = Env(bitboard=True)
+        agent = self._agent()
+        env.assign_agent(agent)
+        env.run_multiple_games(2)
+        self.assertEqual(agent.number_updates, sum(env.steps_history))
+        self.assertGreater(np.abs(agent.network.weights).sum(), 0)
+        self.assertGreater(agent.updates_per_second, 0)
+        self.assertEqual(len(agent.reward_history), 2)
+
+
+class BatchDecisionTester(unittest.TestCase):
+
+    def _legal_actions(self, number_boards: int) -> np.ndarray:
+        legal = np.random.RandomState(0).rand(number_boards, 4) < 0.5
+        legal[0] = False
+        legal[1] = [False, False, False, True]
+        return legal
+
+    def test_random_agent_plays_legal_moves(self):
+        agent = RandomAgent(state_shape=(4, 4), action_shape=(4, ), name="RandomAgent", rng=0)
+        legal = self._legal_actions(1000)
+        decisions = agent.decide_batch(np.zeros((1000, 4, 4)), legal_actions=legal)
+        self.assertEqual(decisions.shape, (1000, ))
+        has_legal = legal.any(axis=1)
+        self.assertTrue(legal[has_legal, decisions[has_legal]].all())
+        self.assertEqual(decisions[1], Direction.RIGHT.value)
+        self.assertEqual(agent.number_decisions, 1000)
+        self.assertEqual(agent.number_batches, 1)
+        # all directions are chosen about equally often without a mask
+        counts = np.bincount(agent.decide_batch(np.zeros((4000, 4, 4))), minlength=4)
+        self.assertTrue((np.abs(counts - 1000) < 150).all())
+
+    def test_up_left_agent_alternates_per_batch(self):
+        agent = UpLeftAgent(state_shape=(4, 4), action_shape=(4, ), name="UpLeftAgent")
+        legal = np.ones((3, 4), dtype=bool)
+        legal[1, Direction.UP.value] = False
+        legal[2, [Direction.UP.value, Direction.LEFT.value]] = False
+        self.assertEqual(agent.decide_batch(np.zeros((3, 4, 4)), legal_actions=legal).tolist(),
+                         [Direction.UP.value, Direction.LEFT.value, Direction.RIGHT.value])
+        self.assertEqual(agent.decide_batch(np.zeros((3, 4, 4)), legal_actions=legal).tolist(),
+                         [Direction.LEFT.value, Direction.LEFT.value, Direction.RIGHT.value])
+
+    def test_default_batch_matches_decision(self):
+        env = Env()
+        agent = ExpectimaxAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                name="ExpectimaxAgent", depth=1)
+        boards = []
+        for _ in range(5):
+            env.game.make_move(Direction.UP)
+            env.game.make_move(Direction.LEFT)
+            boards.append(env.game.board.copy())
+        decisions = agent.decide_batch(np.array(boards))
+        self.assertEqual(decisions.tolist(), [agent.decision(board) for board in boards])
+        self.assertEqual(agent.number_decisions, 5)
+
+    def test_feedback_batch_sums_rewards_per_board(self):
+        agent = RandomAgent(state_shape=(4, 4), action_shape=(4, ), name="RandomAgent")
+        states = np.zeros((2, 4, 4))
+        agent.get_feedback_batch(states, np.array([0, 1]), np.array([4, 8]), np.array([False, False]))
+        agent.get_feedback_batch(states, np.array([0, 1]), np.array([2, 0]), np.array([True, False]))
+        agent.get_feedback_batch(states, np.array([0, 1]), np.array([0, 16]), np.array([True, True]))
+        self.assertEqual(agent.reward_history, [6.0, 0.0, 24.0])
+
+    def test_batch_env_run(self):
+        env = BatchEnv(64, seed=0)
+        agent = RandomAgent(state_shape=(4, 4), action_shape=(4, ), name="RandomAgent", rng=0)
+        env.assign_agent(agent)
+        number_games = env.run(300)
+        self.assertGreater(number_games, 0)
+        self.assertEqual(len(agent.reward_history), number_games)
+        self.assertEqual(agent.reward_history, [float(points) for points in env.point_history])
+        self.assertEqual(agent.number_decisions, 64 * 300)
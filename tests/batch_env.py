@@ -0,0 +1,90 @@
+import unittest
+import numpy as np
+
+from src.batch_env import BatchEnv, move_boards, spawn_tiles
+from src.game import Game
+from src.helpers import Direction, to_exponents, to_values
+
+
+class BatchEnvTester(unittest.TestCase):
+
+    def _random_boards(self, number_boards: int, random_state: np.random.RandomState):
+        exponents = random_state.randint(0, 12, size=(number_boards, 4, 4))
+        exponents[random_state.rand(number_boards, 4, 4) < 0.4] = 0
+        return np.where(exponents > 0, 2 ** exponents, 0)
+
+    def test_moves_match_game(self):
+        random_state = np.random.RandomState(7)
+        boards = self._random_boards(400, random_state)
+        directions = random_state.randint(0, 4, size=400)
+        moved, points = move_boards(to_exponents(boards), directions)
+        for board, direction, moved_board, moved_points in zip(boards, directions, to_values(moved), points):
+            game = Game(4)
+            game.board = board.copy()
+            game.make_move(Direction(int(direction)), spawn_new=False)
+            self.assertTrue((game.board == moved_board).all())
+            self.assertEqual(game.points, moved_points)
+
+    def test_spawn_tiles(self):
+        exponents = np.zeros((1000, 4, 4), dtype=np.uint8)
+        exponents[:, 0, :] = 3
+        mask = np.ones(1000, dtype=bool)
+        mask[0] = False
+        spawn_tiles(exponents, mask, np.random.default_rng(0))
+        number_spawned = (exponents[:, 1:, :] > 0).sum(axis=(1, 2))
+        self.assertEqual(number_spawned[0], 0)
+        self.assertTrue((number_spawned[1:] == 1).all())
+        self.assertTrue(set(np.unique(exponents[:, 1:, :])) <= {0, 1, 2})
+
+    def test_step_is_deterministic_for_seed(self):
+        first, second = BatchEnv(64, seed=3), BatchEnv(64, seed=3)
+        actions_random_state = np.random.RandomState(0)
+        for _ in range(200):
+            actions = actions_random_state.randint(0, 4, size=64)
+            first_result = first.step(actions)
+            second_result = second.step(actions)
+            for a, b in zip(first_result, second_result):
+                self.assertTrue((a == b).all())
+        self.assertEqual(first.point_history, second.point_history)
+
+    def test_single_board_matches_game_for_seed(self):
+        for seed in range(5):
+            env, game = BatchEnv(1, seed=seed), Game(4, rng=seed)
+            self.assertTrue((env.boards[0] == game.board).all())
+            actions_random_state = np.random.RandomState(seed)
+            finished = False
+            while not finished:
+                action = actions_random_state.randint(0, 4)
+                result = game.make_move(Direction(action))
+                rewards, actions, states, dones = env.step(np.array([action]))
+                finished = result == "Game Over"
+                self.assertEqual(bool(dones[0]), finished)
+                if not finished:
+                    self.assertTrue((states[0] == game.board).all())
+            self.assertEqual(env.point_history, [game.points])
+            self.assertTrue((to_values(env.final_exponents[0]) == game.board).all())
+
+    def test_finished_boards_are_reset(self):
+        env = BatchEnv(2, seed=0)
+        env._exponents[0] = np.array([
+            [1, 2, 1, 2],
+            [2, 1, 2, 1],
+            [1, 2, 1, 2],
+            [2, 1, 2, 3]
+        ])
+        env.points[0] = 100
+        rewards, actions, states, dones = env.step(np.array([Direction.LEFT.value, Direction.LEFT.value]))
+        self.assertTrue(dones[0])
+        self.assertEqual(env.point_history, [100])
+        self.assertEqual((states[0] > 0).sum(), 2)
+        self.assertEqual(env.points[0], 0)
+
+    def test_invalid_moves_do_not_spawn(self):
+        env = BatchEnv(2, seed=0)
+        env._exponents[:] = 0
+        env._exponents[:, 0, 0] = 1
+        rewards, actions, states, dones = env.step(np.array([Direction.LEFT.value, Direction.RIGHT.value]))
+        self.assertEqual((states[0] > 0).sum(), 1)
+        self.assertEqual((states[1] > 0).sum(), 2)
+        self.assertFalse(dones.any())
+        self.assertTrue((env.legal_actions()[0] == [False, True, False, True]).all())
@@ -0,0 +1,75 @@
+import unittest
+import numpy as np
+
+from src.bitboard import BitboardGame, legal_moves, pack_board, unpack_board, transpose
+from src.game import Env, Game
+from src.helpers import Direction
+
+
+class BitboardTester(unittest.TestCase):
+
+    def _random_board(self, random_state: np.random.RandomState):
+        exponents = random_state.randint(0, 12, size=(4, 4))
+        exponents[random_state.rand(4, 4) < 0.4] = 0
+        return np.where(exponents > 0, 2 ** exponents, 0)
+
+    def test_pack_and_unpack(self):
+        board = np.array([
+            [0, 2, 0, 2],
+            [0, 0, 0, 0],
+            [2, 0, 2, 2],
+            [4, 0, 2, 32768]
+        ])
+        self.assertTrue((unpack_board(pack_board(board)) == board).all())
+
+    def test_transpose(self):
+        board = np.arange(16).reshape((4, 4))
+        board = np.where(board > 0, 2 ** board, 0)
+        bits = pack_board(board)
+        self.assertTrue((unpack_board(transpose(bits)) == board.T).all())
+        self.assertEqual(transpose(transpose(bits)), bits)
+
+    def test_same_results_as_game(self):
+        random_state = np.random.RandomState(42)
+        for _ in range(250):
+            start = self._random_board(random_state)
+            for direction in Direction:
+                game = Game(4)
+                game.board = start.copy()
+                bitboard_game = BitboardGame(4)
+                bitboard_game.board = start.copy()
+                status = game.make_move(direction, spawn_new=False)
+                bitboard_status = bitboard_game.make_move(direction, spawn_new=False)
+                self.assertEqual(status, bitboard_status)
+                self.assertTrue((game.board == bitboard_game.board).all())
+                self.assertEqual(game.points, bitboard_game.points)
+                self.assertEqual(game._empty_tiles, bitboard_game._empty_tiles)
+
+    def test_legal_moves_match_game(self):
+        random_state = np.random.RandomState(5)
+        for _ in range(250):
+            board = self._random_board(random_state)
+            board[random_state.rand(4, 4) < 0.5] = 2
+            game = Game(4)
+            game.board = board.copy()
+            self.assertEqual(legal_moves(pack_board(board)), game.legal_actions().tolist())
+
+    def test_spawn_new_tile(self):
+        game = BitboardGame(4)
+        game.board = np.array([
+            [2, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0]
+        ])
+        game.make_move(Direction.RIGHT)
+        self.assertEqual(len(game._empty_tiles), 14)
+        self.assertEqual(game.board[0, 3], 2)
+
+    def test_env_option(self):
+        env = Env(bitboard=True)
+        self.assertIsInstance(env.game, BitboardGame)
+        reward, action, state, finished = env.do_action(Direction.LEFT.value)
+        self.assertEqual(state.shape, (4, 4))
+        with self.assertRaises(ValueError):
+            Env(number_tiles=3, bitboard=True)
@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+
+from src.encoding import StateEncoder
+from src.game import Env
+
+
+class StateEncoderTester(unittest.TestCase):
+
+    def setUp(self):
+        self.board = np.array([
+            [0, 2, 0, 2],
+            [0, 0, 0, 16384],
+            [2, 0, 2, 2],
+            [4, 0, 8192, 1024]
+        ])
+
+    def _reference_dummies(self, board: np.ndarray, possible_numbers: list):
+        data = np.zeros((board.size, len(possible_numbers)))
+        for i, val in enumerate(possible_numbers):
+            data[:, i] = board.ravel() == val
+        return data
+
+    def test_onehot_matches_comparisons(self):
+        env = Env()
+        expected = self._reference_dummies(self.board, env.possible_numbers)
+        self.assertTrue((env._get_dummies(self.board.ravel()) == expected).all())
+        self.assertTrue((env.encoder.encode(self.board) == expected.ravel()).all())
+        self.assertEqual(env.encoder.get_shape(), env.get_state_space())
+
+    def test_formats(self):
+        exponents = StateEncoder(encoding="exponent", flatten=False).encode(self.board)
+        self.assertEqual(exponents.dtype, np.uint8)
+        self.assertTrue((exponents == np.log2(np.maximum(self.board, 1))).all())
+        spatial = StateEncoder(dtype=bool, flatten=False).encode(self.board)
+        self.assertEqual(spatial.shape, (4, 4, 14))
+        self.assertEqual(spatial.dtype, bool)
+        self.assertTrue(spatial[3, 2, 13])
+        self.assertFalse(spatial[1, 3].any())
+
+    def test_batch_and_buffers(self):
+        encoder = StateEncoder(reuse_buffer=True)
+        boards = np.stack([self.board, self.board * 2])
+        batch = encoder.encode_batch(boards)
+        self.assertEqual(batch.shape, (2, 224))
+        first = encoder.encode(boards[0])
+        self.assertTrue((batch[0] == first).all())
+        self.assertIs(encoder.encode(boards[1]), first)
+        self.assertTrue((batch[1] == first).all())
+        out = np.empty((2, 224), dtype=np.float32)
+        self.assertIs(encoder.encode_batch(boards, out=out), out)
+        self.assertTrue((out == batch).all())
+
+    def test_tables_are_shared(self):
+        first, second = StateEncoder(), StateEncoder(encoding="exponent")
+        self.assertIs(first._exponent_table, second._exponent_table)
+        self.assertIs(first._onehot_index_table, StateEncoder(dtype=bool)._onehot_index_table)
+        self.assertFalse(first._exponent_table.flags.writeable)
+
+    def test_non_contiguous_out_raises(self):
+        encoder = StateEncoder(encoding="exponent")
+        out = np.empty((16, 2), dtype=np.uint8)[:, 0]
+        with self.assertRaises(ValueError):
+            encoder.encode(self.board, out=out)
+
+    def test_env_flattened_state(self):
+        np.random.seed(0)
+        env = Env(flattened_state=True)
+        states = []
+
+        class StateRecorder:
+            def play_turn(self, state_space, legal_actions=None):
+                return np.random.randint(4)
+
+            def get_feedback(self, state, action, reward, finished):
+                states.append(state)
+
+        env.assign_agent(StateRecorder())
+        env.run()
+        self.assertEqual(states[0].shape, env.get_state_space())
+        self.assertTrue(all(state.sum() == 16 for state in states))
@@ -0,0 +1,114 @@
+import functools
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from src.agents.naive_agent import UpLeftAgent
+from src.agents.random import RandomAgent
+from src.evaluation import AgentStats, Evaluation, StreamingStats, compare_agents, sprt_bounds, sprt_llr, \
+    write_report
+from src.reporting import histogram_of_binned_points
+
+
+def _factory(agent_class):
+    return functools.partial(agent_class, state_shape=(16, 16), action_shape=(4, ), name=agent_class.__name__)
+
+
+class StreamingStatsTester(unittest.TestCase):
+
+    def test_batches_match_numpy(self):
+        values = np.random.RandomState(0).normal(100, 20, size=1000)
+        stats = StreamingStats()
+        for batch in np.array_split(values, [1, 10, 11, 500]):
+            stats.add(batch)
+        self.assertEqual(stats.count, 1000)
+        self.assertAlmostEqual(stats.mean, values.mean())
+        self.assertAlmostEqual(stats.variance, values.var(ddof=1))
+        self.assertEqual((stats.min, stats.max), (values.min(), values.max()))
+        low, high = stats.confidence_interval(0.95)
+        self.assertAlmostEqual((high - low) / 2, 1.96 * values.std(ddof=1) / np.sqrt(1000), places=2)
+
+    def test_sprt_llr(self):
+        lower, upper = sprt_bounds(0.05, 0.05)
+        self.assertAlmostEqual(lower, -upper)
+        stats = StreamingStats()
+        stats.add(np.random.RandomState(0).normal(50, 100, size=100))
+        self.assertGreater(sprt_llr(stats, 50), upper)
+        negative = StreamingStats()
+        negative.add(-np.random.RandomState(0).normal(50, 100, size=100))
+        self.assertLess(sprt_llr(negative, 50), lower)
+        self.assertGreater(sprt_llr(negative, -50), upper)
+        equal = StreamingStats()
+        equal.add(np.random.RandomState(0).normal(0, 100, size=200))
+        self.assertLess(sprt_llr(equal, 50), lower)
+        self.assertLess(sprt_llr(equal, -50), lower)
+
+
+    def test_points_histogram(self):
+        stats = AgentStats(points_bin_width=100)
+        stats.add(np.array([0, 99, 100, 250, 250]), np.ones(5), np.array([2, 4, 8, 16, 32]))
+        stats.add(np.array([99]), np.ones(1), np.array([2]))
+        histogram = stats.to_dict()["points_histogram"]
+        self.assertEqual(histogram, {"bin_width": 100, "counts": {"0": 3, "100": 1, "200": 2}})
+
+    @unittest.skipUnless(importlib.util.find_spec("plotly"), "needs plotly")
+    def test_plot_points_histogram(self):
+        figure = histogram_of_binned_points({"bin_width": 100, "counts": {"200": 2, "0": 3}}, show=False)
+        self.assertEqual(list(figure.data[0].x), [50.0, 250.0])
+        self.assertEqual(list(figure.data[0].y), [3, 2])
+
+
+class EvaluationTester(unittest.TestCase):
+
+    def test_stronger_agent_is_found_early(self):
+        report = compare_agents({"RandomAgent": _factory(RandomAgent), "UpLeftAgent": _factory(UpLeftAgent)},
+                                min_games=20, max_games=1000)
+        self.assertEqual(report["decision"], "UpLeftAgent")
+        self.assertTrue(report["stopped_early"])
+        self.assertGreater(report["comparison"]["llr"]["UpLeftAgent"], report["comparison"]["llr_bounds"][1])
+        agents = report["agents"]
+        self.assertEqual(agents["RandomAgent"]["games"], report["games_per_agent"])
+        self.assertAlmostEqual(sum(agents["UpLeftAgent"]["max_tile_distribution"].values()), 1.0)
+        histogram = agents["UpLeftAgent"]["points_histogram"]
+        self.assertEqual(sum(histogram["counts"].values()), report["games_per_agent"])
+        self.assertTrue(all(int(edge) % histogram["bin_width"] == 0 for edge in histogram["counts"]))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            write_report(report, path)
+            with open(path) as file:
+                self.assertEqual(json.load(file)["decision"], "UpLeftAgent")
+
+    def test_games_are_paired(self):
+        # both copies of the agent get the same seeds, so they play the same games
+        report = compare_agents({"first": _factory(RandomAgent), "second": _factory(RandomAgent)}, test="ci",
+                                precision=10, batch_size=10, min_games=10)
+        self.assertEqual(report["decision"], "tie")
+        self.assertEqual(report["comparison"]["pair_results"]["draws"], 10)
+        self.assertEqual(report["comparison"]["difference"]["std"], 0.0)
+
+    def test_identical_games_are_a_tie(self):
+        # the paired differences are all 0, so their variance is 0 and the likelihood ratios stay 0
+        report = compare_agents({"first": _factory(UpLeftAgent), "second": _factory(UpLeftAgent)}, batch_size=10,
+                                min_games=10)
+        self.assertEqual(report["decision"], "tie")
+        self.assertEqual(report["games_per_agent"], 10)
+
+    def test_parallel_batches_match_serial(self):
+        reports = [Evaluation({"RandomAgent": _factory(RandomAgent)}, batch_size=10, min_games=20, max_games=20,
+                              precision=0.0, processes=processes).run() for processes in (1, 2)]
+        serial, parallel = (report["agents"]["RandomAgent"] for report in reports)
+        # the batches are merged in other rounds, which only changes the rounding
+        self.assertAlmostEqual(serial["points"]["mean"], parallel["points"]["mean"])
+        self.assertAlmostEqual(serial["points"]["std"], parallel["points"]["std"])
+        self.assertEqual(serial["max_tile_distribution"], parallel["max_tile_distribution"])
+        self.assertEqual(reports[0]["games_per_agent"], 20)
+        self.assertIsNone(reports[0]["decision"])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Evaluation({"RandomAgent": _factory(RandomAgent)})
+        with self.assertRaises(ValueError):
+            Evaluation({"RandomAgent": _factory(RandomAgent), "UpLeftAgent": _factory(UpLeftAgent)}, test="ci")
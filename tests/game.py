@@ -1,8 +1,15 @@
+import os
+import subprocess
+import sys
 import unittest
 import numpy as np
 
-from src.game import Game
-from src.helpers import Direction
+from src.agents.agent import Agent
+from src.agents.naive_agent import UpLeftAgent
+from src.agents.random import RandomAgent
+from src.game import Env, Game
+from src.bitboard import BitboardGame
+from src.helpers import Direction, UniformBlocks, legal_actions
 
 
 class BoardTester(unittest.TestCase):
@@ -125,3 +132,188 @@ class BoardTester(unittest.TestCase):
             [0, 0, 4, 2]
         ])
         self.assertTrue((expected_result == actual_result).all())
+
+    def test_spawn_distribution(self):
+        np.random.seed(0)
+        start = np.array([
+            [2, 0, 4, 0],
+            [4, 2, 4, 2],
+            [0, 2, 4, 2],
+            [2, 4, 0, 8]
+        ])
+        number_spawns = 20000
+        counts = np.zeros((4, 4))
+        number_fours = 0
+        board = Game(4)
+        for _ in range(number_spawns):
+            board = self._setup_deterministic_board(board, start.copy())
+            board._get_empty_tiles()
+            board._generate_tile_and_assign_to_board()
+            position = tuple(np.argwhere(board.board != start)[0])
+            counts[position] += 1
+            number_fours += board.board[position] == 4
+        self.assertEqual(board._number_empty, 3)
+        # chi-square test for a uniform position over the 4 empty tiles, 16.27 is the 0.999 quantile for 3 dof
+        expected = number_spawns / 4
+        chi_square = ((counts[start == 0] - expected) ** 2 / expected).sum()
+        self.assertLess(chi_square, 16.27)
+        self.assertEqual(counts[start != 0].sum(), 0)
+        # share of fours within 4 standard deviations of 0.1
+        self.assertAlmostEqual(number_fours / number_spawns, 0.1, delta=4 * np.sqrt(0.09 / number_spawns))
+
+    def test_legal_actions_match_moves(self):
+        random_state = np.random.RandomState(3)
+        boards = []
+        for _ in range(300):
+            exponents = random_state.randint(1, 4, size=(4, 4))
+            exponents[random_state.rand(4, 4) < 0.15] = 0
+            boards.append(np.where(exponents > 0, 2 ** exponents, 0))
+        batch = legal_actions(np.array(boards))
+        for board, batch_legal in zip(boards, batch):
+            game = self._setup_deterministic_board(Game(4), board.copy())
+            legal = game.legal_actions()
+            self.assertTrue((legal == batch_legal).all())
+            for direction in Direction:
+                game = self._setup_deterministic_board(Game(4), board.copy())
+                game.make_move(direction, spawn_new=False)
+                self.assertEqual(legal[direction.value], not (game.board == board).all())
+
+    def test_legal_actions_agree_with_helpers(self):
+        random_state = np.random.RandomState(4)
+        for number_tiles in (2, 3, 4, 5):
+            for empty_share in (0.0, 0.1, 0.5):
+                for _ in range(100):
+                    exponents = random_state.randint(1, 5, size=(number_tiles, number_tiles))
+                    exponents[random_state.rand(number_tiles, number_tiles) < empty_share] = 0
+                    board = np.where(exponents > 0, 2 ** exponents, 0)
+                    game = self._setup_deterministic_board(Game(number_tiles), board)
+                    self.assertEqual(game.legal_actions().tolist(), legal_actions(board).tolist())
+
+    def test_invalid_move_does_not_spawn(self):
+        board = self._setup_deterministic_board(Game(4), np.array([
+            [2, 4, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0]
+        ]))
+        self.assertEqual(board.make_move(Direction.LEFT), "Invalid Move")
+        self.assertEqual((board.board > 0).sum(), 2)
+        self.assertEqual(board.make_move(Direction.RIGHT), "Success")
+        self.assertEqual((board.board > 0).sum(), 3)
+
+    def test_game_over(self):
+        board = self._setup_deterministic_board(Game(4), np.array([
+            [2, 4, 2, 4],
+            [4, 2, 4, 2],
+            [2, 4, 2, 4],
+            [4, 2, 8, 8]
+        ]))
+        # the board is full, but the last row can still merge
+        self.assertEqual(board.make_move(Direction.UP), "Invalid Move")
+        self.assertEqual(board.make_move(Direction.RIGHT, spawn_new=False), "Success")
+        self.assertEqual(board.board[3, 3], 16)
+        board.board[3] = [8, 16, 8, 16]
+        self.assertFalse(board.legal_actions().any())
+        self.assertEqual(board.make_move(Direction.LEFT), "Game Over")
+
+    def test_agents_only_play_legal_moves(self):
+        np.random.seed(1)
+        for agent_class in (RandomAgent, UpLeftAgent):
+            env = Env()
+            agent = agent_class(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="agent")
+            env.assign_agent(agent)
+            legal = []
+            original_do_action = env.do_action
+
+            def do_action(action: int):
+                legal.append(env.legal_actions()[action])
+                return original_do_action(action)
+
+            env.do_action = do_action
+            env.run_multiple_games(3)
+            self.assertTrue(all(legal))
+            self.assertEqual(sum(env.steps_history), len(legal))
+
+    def test_agents_with_old_signatures(self):
+
+        class OldDecisionAgent(Agent):
+            def decision(self, state_space):
+                return Direction.UP.value if self.number_decisions % 2 else Direction.LEFT.value
+
+        class OldPlayTurnAgent(OldDecisionAgent):
+            def play_turn(self, state_space):
+                # without the mask it may pick illegal moves, which do not change the board
+                return int(self.rng.integers(4))
+
+        np.random.seed(0)
+        for agent_class in (OldDecisionAgent, OldPlayTurnAgent):
+            env = Env()
+            env.assign_agent(agent_class(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                         name="agent"))
+            env.run()
+            self.assertEqual(len(env.steps_history), 1)
+        # illegal decisions of the old signature are still replaced by the first legal direction
+        agent = OldDecisionAgent(state_shape=(4, 4), action_shape=(4, ), name="agent")
+        legal = np.array([[False, True, False, True], [True, True, True, True]])
+        self.assertEqual(agent.decide_batch(np.zeros((2, 4, 4)), legal_actions=legal).tolist(),
+                         [Direction.DOWN.value, Direction.LEFT.value])
+
+    def test_old_play_turn_with_illegal_moves_finishes(self):
+
+        class UpOnlyAgent(Agent):
+            def decision(self, state_space, legal_actions=None):
+                return 0
+
+            def play_turn(self, state_space):
+                return 0
+
+        env = Env(rng=0)
+        env.assign_agent(UpOnlyAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                     name="agent"))
+        env.run()
+        self.assertEqual(len(env.steps_history), 1)
+        self.assertFalse(env.legal_actions().any())
+
+    def _play(self, game, actions: np.ndarray) -> list:
+        boards = [game.board.copy()]
+        for action in actions:
+            game.make_move(Direction(int(action)))
+            boards.append(game.board.copy())
+        return boards
+
+    def test_seed_reproduces_game(self):
+        actions = np.random.RandomState(0).randint(0, 4, size=200)
+        first = self._play(Game(4, rng=123), actions)
+        np.random.seed(99)
+        second = self._play(Game(4, rng=123), actions)
+        bitboard = self._play(BitboardGame(4, rng=123), actions)
+        other = self._play(Game(4, rng=124), actions)
+        self.assertTrue(all((a == b).all() for a, b in zip(first, second)))
+        self.assertTrue(all((a == b).all() for a, b in zip(first, bitboard)))
+        self.assertFalse(all((a == b).all() for a, b in zip(first, other)))
+        self.assertEqual(Game(4, rng=123).seed, 123)
+        self.assertIsNone(Game(4, rng=np.random.default_rng(1)).seed)
+
+    def test_uniform_blocks_match_single_draws(self):
+        blocks = UniformBlocks(np.random.default_rng(7), block_size=4)
+        rng = np.random.default_rng(7)
+        for _ in range(5):
+            self.assertEqual(blocks.pair(), (rng.random(), rng.random()))
+
+    def test_env_rng_is_independent_of_global_state(self):
+        histories = []
+        for global_seed in (0, 1):
+            np.random.seed(global_seed)
+            env = Env(rng=5)
+            env.assign_agent(RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                         name="RandomAgent", rng=3))
+            env.run_multiple_games(3)
+            histories.append(env.point_history)
+        self.assertEqual(histories[0], histories[1])
+
+    def test_import_does_not_load_plotting_libraries(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", "import sys, src.game; "
+                                 "print(sorted({name.split('.')[0] for name in sys.modules} & {'pandas', 'plotly'}))"],
+                                capture_output=True, text=True, cwd=root, check=True).stdout
+        self.assertEqual(output.strip(), "[]")
@@ -0,0 +1,80 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.game import Env
+from src.instrumentation import PHASES, DurationHistogram, Instrumentation
+
+
+class InstrumentationTester(unittest.TestCase):
+
+    def _env(self, instrumentation: Instrumentation, flattened_state: bool = False):
+        np.random.seed(0)
+        env = Env(flattened_state=flattened_state)
+        env.assign_agent(RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                     name="RandomAgent"))
+        env.assign_instrumentation(instrumentation)
+        return env
+
+    def test_histogram(self):
+        histogram = DurationHistogram()
+        histogram.add(np.array([1000] * 90 + [100000] * 10))
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.percentile(50), 1000, delta=1000 * 0.1)
+        self.assertAlmostEqual(histogram.percentile(99), 100000, delta=100000 * 0.1)
+        self.assertEqual(histogram.summary()["max_us"], 100)
+
+    def test_phases_and_episodes(self):
+        instrumentation = Instrumentation()
+        env = self._env(instrumentation, flattened_state=True)
+        env.run_multiple_games(3)
+        summary = instrumentation.summary()
+        self.assertEqual(summary["games"], 3)
+        self.assertEqual(summary["steps"], sum(env.steps_history))
+        self.assertEqual(instrumentation.episode_lengths, env.steps_history)
+        for phase in PHASES:
+            self.assertEqual(summary["phases"][phase]["count"], summary["steps"])
+            self.assertGreater(summary["phases"][phase]["total_s"], 0)
+        self.assertGreater(summary["steps_per_sec"], 0)
+        self.assertEqual(summary["episode_length"]["max"], max(env.steps_history))
+
+    def test_same_games_as_without_instrumentation(self):
+        env = self._env(Instrumentation())
+        env.run_multiple_games(2)
+        plain = self._env(None)
+        plain.run_multiple_games(2)
+        self.assertEqual(env.point_history, plain.point_history)
+
+    def test_cprofile_window(self):
+        instrumentation = Instrumentation(profile_window=(1, 2))
+        env = self._env(instrumentation)
+        env.run_multiple_games(4)
+        self.assertFalse(instrumentation._profiling)
+        functions = {function for (filename, line, function) in instrumentation.profile_stats().stats}
+        self.assertIn("make_move", functions)
+
+    def test_sampling_profiler(self):
+        instrumentation = Instrumentation(profile_window=(0, 3), profiler="sampling", sampling_interval=0.0005)
+        self._env(instrumentation).run_multiple_games(3)
+        self.assertGreater(instrumentation.profile.number_samples, 0)
+        self.assertAlmostEqual(sum(share for function, share in instrumentation.profile.top_functions(1000)), 1.0)
+
+    def test_allocations_and_export(self):
+        instrumentation = Instrumentation(track_allocations=True)
+        self._env(instrumentation).run_multiple_games(2)
+        instrumentation.close()
+        self.assertEqual(len(instrumentation.peak_memory), 2)
+        with tempfile.TemporaryDirectory() as directory:
+            instrumentation.to_json(os.path.join(directory, "summary.json"))
+            instrumentation.to_csv(os.path.join(directory, "summary.csv"))
+            with open(os.path.join(directory, "summary.json")) as file:
+                summary = json.load(file)
+            with open(os.path.join(directory, "summary.csv")) as file:
+                rows = dict(csv.reader(file))
+        self.assertIn("allocations", summary)
+        self.assertEqual(int(rows["steps"]), summary["steps"])
+        self.assertIn("phases.make_move.p90_us", rows)
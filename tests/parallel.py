@@ -0,0 +1,43 @@
+import random
+import unittest
+from functools import partial
+
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.game import Env
+from src.parallel import run_games
+
+
+class ParallelRunnerTester(unittest.TestCase):
+
+    def _run(self, processes: int, seed: int):
+        env = Env()
+        agent_factory = partial(RandomAgent, state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                name="RandomAgent")
+        env.run_multiple_games_parallel(20, agent_factory, processes=processes, seed=seed, games_per_task=3)
+        return env
+
+    def test_results_are_collected(self):
+        env = self._run(processes=2, seed=0)
+        self.assertEqual(len(env.point_history), 20)
+        self.assertEqual(len(env.steps_history), 20)
+        self.assertEqual(len(env.max_tile_history), 20)
+        self.assertTrue(all(steps > 0 for steps in env.steps_history))
+        self.assertTrue(all(max_tile >= 2 for max_tile in env.max_tile_history))
+
+    def test_results_do_not_depend_on_number_processes(self):
+        self.assertEqual(self._run(processes=1, seed=5).point_history, self._run(processes=3, seed=5).point_history)
+
+    def test_run_games_keeps_global_random_state(self):
+        env = Env()
+        agent_factory = partial(RandomAgent, state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                name="RandomAgent")
+        np.random.seed(1)
+        random.seed(1)
+        expected = np.random.rand(), random.random()
+        np.random.seed(1)
+        random.seed(1)
+        results = run_games({}, agent_factory, 2, seed=7)
+        self.assertEqual((np.random.rand(), random.random()), expected)
+        self.assertEqual(run_games({}, agent_factory, 2, seed=7), results)
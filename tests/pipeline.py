@@ -0,0 +1,90 @@
+import functools
+import multiprocessing
+import time
+import unittest
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.agents.sarsa import SARSA
+from src.pipeline import Pipeline, TransitionQueue
+
+
+def _chunk(first: int, length: int) -> tuple:
+    return np.full((length, 4, 4), first % 16, dtype=np.uint8), np.arange(first, first + length) % 4, \
+        np.arange(first, first + length, dtype=np.float32), np.zeros((length, 4, 4), dtype=np.uint8), \
+        np.zeros(length, dtype=bool)
+
+
+def _put_chunks(transition_queue: TransitionQueue, number_chunks: int):
+    for i in range(number_chunks):
+        transition_queue.put(*_chunk(10 * i, 10))
+
+
+def _failing_agent():
+    raise ValueError("no agent")
+
+
+class TransitionQueueTester(unittest.TestCase):
+
+    def test_chunks_keep_their_order(self):
+        transition_queue = TransitionQueue(number_slots=2, chunk_size=16)
+        try:
+            process = multiprocessing.Process(target=_put_chunks, args=(transition_queue, 5))
+            process.start()
+            rewards = [transition_queue.get(timeout=5)[2] for _ in range(5)]
+            process.join()
+            self.assertEqual(np.concatenate(rewards).tolist(), list(range(50)))
+            self.assertIsNone(transition_queue.get(timeout=0))
+        finally:
+            transition_queue.close()
+
+    def test_full_queue_blocks_put(self):
+        transition_queue = TransitionQueue(number_slots=2, chunk_size=16)
+        try:
+            stop_event = multiprocessing.Event()
+            self.assertTrue(transition_queue.put(*_chunk(0, 16), stop_event=stop_event))
+            self.assertTrue(transition_queue.put(*_chunk(16, 3), stop_event=stop_event))
+            self.assertEqual(len(transition_queue), 2)
+            stop_event.set()
+            self.assertFalse(transition_queue.put(*_chunk(19, 1), stop_event=stop_event))
+            self.assertEqual(len(transition_queue.get(timeout=0)[1]), 16)
+            self.assertEqual(transition_queue.get(timeout=0)[2].tolist(), [16, 17, 18])
+            with self.assertRaises(ValueError):
+                transition_queue.put(*_chunk(0, 17))
+        finally:
+            transition_queue.close()
+
+
+class PipelineTester(unittest.TestCase):
+
+    def test_random_agents_fill_buffer(self):
+        agent_factory = functools.partial(RandomAgent, state_shape=(4, 4), action_shape=(4, ), name="RandomAgent")
+        with Pipeline(agent_factory, number_actors=2, boards_per_actor=8, chunk_size=64, min_buffer_size=256,
+                      batch_size=32) as pipeline:
+            stats = pipeline.run(number_updates=50)
+            processes = pipeline._processes
+        self.assertEqual(stats["learner_updates"], 50)
+        self.assertEqual(stats["learner_samples"], 50 * 32)
+        self.assertGreaterEqual(stats["actor_steps"], stats["transitions_received"])
+        self.assertEqual(stats["transitions_received"] % 64, 0)
+        self.assertGreater(stats["actor_steps_per_sec"], 0)
+        self.assertFalse(any(process.is_alive() for process in processes))
+
+    def test_parameters_reach_actors(self):
+        agent_factory = functools.partial(SARSA, state_shape=(4, 4), action_shape=(4, ), name="SARSA")
+        learner = agent_factory()
+        with Pipeline(agent_factory, learner=learner, number_actors=1, boards_per_actor=8, chunk_size=64,
+                      min_buffer_size=256, batch_size=32, broadcast_interval=5) as pipeline:
+            stats = pipeline.run(number_updates=20)
+            self.assertEqual(stats["parameter_version"], 4)
+            deadline = time.perf_counter() + 10
+            while pipeline.stats()["actor_parameter_versions"][0] < 4 and time.perf_counter() < deadline:
+                pipeline.run(seconds=0.05)
+            # the learner keeps learning and broadcasting while the test waits
+            self.assertGreaterEqual(pipeline.stats()["actor_parameter_versions"][0], 4)
+        self.assertGreater(np.abs(learner.network.weights).sum(), 0)
+
+    def test_actor_errors_are_raised(self):
+        with Pipeline(_failing_agent, number_actors=1) as pipeline:
+            with self.assertRaises(RuntimeError):
+                pipeline.run(seconds=10)
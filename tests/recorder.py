@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.bitboard import BitboardGame
+from src.game import Env, Game
+from src.helpers import Direction
+from src.recorder import EpisodeRecorder, chunk_files, game_stats, read_games, replay
+
+
+class EpisodeRecorderTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _record(self, number_games: int, bitboard: bool = False, **kwargs):
+        np.random.seed(0)
+        env = Env(bitboard=bitboard)
+        env.assign_agent(RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                     name="RandomAgent"))
+        with EpisodeRecorder(self.directory.name, **kwargs) as recorder:
+            env.assign_recorder(recorder)
+            env.run_multiple_games(number_games)
+        return env
+
+    def test_games_are_recorded(self):
+        env = self._record(5, games_per_chunk=2)
+        self.assertEqual(len(chunk_files(self.directory.name)), 3)
+        records = list(read_games(self.directory.name))
+        self.assertEqual([record.points for record in records], env.point_history)
+        self.assertEqual([len(record.actions) for record in records], env.steps_history)
+        self.assertEqual([record.max_tile for record in records], env.max_tile_history)
+        self.assertEqual([int(record.rewards.sum()) for record in records], env.point_history)
+
+    def test_replay(self):
+        for compress, bitboard in ((False, False), (True, True)):
+            self._record(2, bitboard=bitboard, compress=compress)
+        records = list(read_games(self.directory.name))
+        self.assertEqual(len(records), 4)
+        self.assertTrue(chunk_files(self.directory.name)[-1].endswith(".gz"))
+        for record in records:
+            steps = list(replay(record))
+            self.assertEqual(len(steps), len(record.actions))
+            # every board is the one the next move starts from and the last one is lost
+            for (board, action, reward, after), (next_board, *_) in zip(steps, steps[1:]):
+                self.assertTrue((after == next_board).all())
+            game = BitboardGame(4)
+            game.board = steps[-1][3]
+            self.assertFalse(game.legal_actions().any())
+
+    def test_replay_without_seed(self):
+        self._record(2)
+        for record in read_games(self.directory.name):
+            self.assertIsNotNone(record.seed)
+            with_seed = list(replay(record))
+            without_seed = list(replay(record._replace(seed=None)))
+            self.assertTrue(all((a[3] == b[3]).all() for a, b in zip(with_seed, without_seed)))
+
+    def test_large_seeds(self):
+        with EpisodeRecorder(self.directory.name) as recorder:
+            for seed in (2 ** 63 + 1, 2 ** 64 - 2, 2 ** 70):
+                game = Game(4, rng=seed)
+                recorder.start_game(game)
+                for action in np.random.RandomState(0).randint(0, 4, size=50):
+                    points = game.points
+                    game.make_move(Direction(int(action)))
+                    recorder.record_step(int(action), game.points - points, game.last_spawn)
+                recorder.end_game(game)
+        records = list(read_games(self.directory.name))
+        self.assertEqual([record.seed for record in records], [2 ** 63 + 1, 2 ** 64 - 2, None])
+        for record in records:
+            self.assertEqual(len(list(replay(record))), 50)
+
+    def test_replay_detects_wrong_record(self):
+        self._record(1)
+        record = next(read_games(self.directory.name))
+        rewards = record.rewards.copy()
+        rewards[np.argmax(rewards > 0)] += 2
+        with self.assertRaises(ValueError):
+            list(replay(record._replace(rewards=rewards)))
+
+    def test_stats(self):
+        env = self._record(6, games_per_chunk=4, compress=True)
+        stats = game_stats(self.directory.name, quantiles=(0.5, ))
+        self.assertEqual(stats["games"], 6)
+        self.assertEqual(stats["steps"], sum(env.steps_history))
+        self.assertAlmostEqual(stats["point_quantiles"][0.5], np.median(env.point_history))
+        self.assertAlmostEqual(sum(stats["max_tile_distribution"].values()), 1.0)
+
+    def test_record_is_compact(self):
+        env = self._record(3)
+        size = sum(os.path.getsize(path) for path in chunk_files(self.directory.name))
+        self.assertLess(size, 7 * sum(env.steps_history) + 40 * 3 + 10)
@@ -0,0 +1,205 @@
+import multiprocessing
+import tempfile
+import unittest
+import numpy as np
+
+from src.replay_buffer import ReplayBuffer, ReplayBufferSarsa, ArrayReplayBuffer, ArrayReplayBufferSarsa, \
+    PrioritizedReplayBuffer, PrioritizedArrayReplayBuffer, EpisodeBuffer, MemmapReplayBuffer
+from src.segment_tree import SumSegmentTree, MinSegmentTree
+
+
+class ArrayReplayBufferTester(unittest.TestCase):
+
+    def _board(self, random_state: np.random.RandomState):
+        exponents = random_state.randint(0, 12, size=(4, 4))
+        return np.where(exponents > 0, 2 ** exponents, 0)
+
+    def _fill(self, buffers: list, number_transitions: int):
+        random_state = np.random.RandomState(0)
+        for i in range(number_transitions):
+            transition = (self._board(random_state), i % 4, float(i), self._board(random_state), i % 5 == 0)
+            for buffer in buffers:
+                buffer.add(*transition)
+
+    def test_same_shapes_as_replay_buffer(self):
+        buffer, array_buffer = ReplayBuffer(100), ArrayReplayBuffer(100)
+        self._fill([buffer, array_buffer], 50)
+        for expected, actual in zip(buffer.sample(32), array_buffer.sample(32)):
+            self.assertEqual(expected.shape, actual.shape)
+
+    def test_same_content_as_replay_buffer(self):
+        buffer, array_buffer = ReplayBufferSarsa(100), ArrayReplayBufferSarsa(100)
+        self._fill([buffer, array_buffer], 250)
+        self.assertEqual(len(buffer), len(array_buffer))
+        idxes = np.arange(100)
+        for expected, actual in zip(buffer._encode_sample(idxes), array_buffer._encode_sample(idxes)):
+            if expected.dtype == object:
+                expected = np.full(expected.shape, -1)
+            self.assertTrue((expected == actual).all())
+
+    def test_ring_buffer_overwrites_oldest(self):
+        buffer = ArrayReplayBuffer(10)
+        self._fill([buffer], 25)
+        self.assertEqual(len(buffer), 10)
+        self.assertEqual(sorted(buffer._rewards.tolist()), list(range(15, 25)))
+
+    def test_add_batch_matches_add(self):
+        random_state = np.random.RandomState(1)
+        obses_t = np.array([self._board(random_state) for _ in range(25)])
+        obses_tp1 = np.array([self._board(random_state) for _ in range(25)])
+        actions, rewards, dones = np.arange(25) % 4, np.arange(25, dtype=float), np.arange(25) % 5 == 0
+        for buffer_class in (ArrayReplayBuffer, ArrayReplayBufferSarsa, PrioritizedArrayReplayBuffer):
+            buffer, batch_buffer = buffer_class(10), buffer_class(10)
+            for transition in zip(obses_t, actions, rewards, obses_tp1, dones):
+                buffer.add(*transition)
+            batch_buffer.add_batch(obses_t[:3], actions[:3], rewards[:3], obses_tp1[:3], dones[:3])
+            batch_buffer.add_batch(np.log2(np.maximum(obses_t[3:], 1)).astype(np.uint8), actions[3:], rewards[3:],
+                                   np.log2(np.maximum(obses_tp1[3:], 1)).astype(np.uint8), dones[3:], exponents=True)
+            self.assertEqual((len(buffer), buffer._next_idx), (len(batch_buffer), batch_buffer._next_idx))
+            idxes = np.arange(10)
+            for expected, actual in zip(buffer._encode_sample(idxes), batch_buffer._encode_sample(idxes)):
+                self.assertTrue((expected == actual).all())
+
+
+class PrioritizedReplayBufferTester(unittest.TestCase):
+
+    def _fill(self, buffer, number_transitions: int):
+        board = np.zeros((4, 4), dtype=int)
+        for i in range(number_transitions):
+            buffer.add(board, i % 4, float(i), board, False)
+
+    def test_segment_trees(self):
+        sum_tree, min_tree = SumSegmentTree(8), MinSegmentTree(8)
+        sum_tree[[0, 1, 2, 3]] = [1.0, 2.0, 3.0, 4.0]
+        min_tree[[0, 1, 2, 3]] = [1.0, 2.0, 3.0, 4.0]
+        sum_tree[[1, 1]] = [5.0, 0.5]
+        self.assertEqual(sum_tree.sum(), 8.5)
+        self.assertEqual(min_tree.min(), 1.0)
+        self.assertEqual(sum_tree.find_prefixsum_idx(np.array([0.0, 0.99, 1.0, 1.6, 4.49, 8.4])).tolist(),
+                         [0, 0, 1, 2, 2, 3])
+
+    def test_sampling_follows_priorities(self):
+        np.random.seed(0)
+        buffer = PrioritizedArrayReplayBuffer(8, alpha=1.0)
+        self._fill(buffer, 4)
+        buffer.update_priorities([0, 1, 2, 3], [1.0, 1.0, 1.0, 7.0])
+        obs, actions, rewards, obs_tp1, dones, weights, idxes = buffer.sample(10000, beta=1.0)
+        self.assertAlmostEqual((idxes == 3).mean(), 0.7, delta=0.02)
+        self.assertTrue((rewards == idxes).all())
+        self.assertTrue(np.allclose(weights[idxes == 3], 1 / 7))
+        self.assertTrue(np.allclose(weights[idxes != 3], 1.0))
+
+    def test_overwrite_gets_max_priority(self):
+        buffer = PrioritizedReplayBuffer(4, alpha=1.0)
+        self._fill(buffer, 4)
+        buffer.update_priorities([0, 1, 2, 3], [0.1, 0.1, 5.0, 0.1])
+        self._fill(buffer, 1)
+        self.assertEqual(buffer._it_sum[[0]][0], 5.0)
+        self.assertEqual(len(buffer), 4)
+        self.assertAlmostEqual(buffer._it_sum.sum(), 10.2)
+
+
+class EpisodeBufferTester(unittest.TestCase):
+
+    def _add_episode(self, buffer: EpisodeBuffer, episode: int, length: int):
+        for step in range(length):
+            board = np.full((4, 4), episode, dtype=int)
+            buffer.add(board, step % 4, float(episode * 1000 + step), board, step == length - 1)
+
+    def test_sample_returns_consecutive_transitions(self):
+        buffer = EpisodeBuffer(size=10, max_transitions=1000)
+        for episode in range(5):
+            self._add_episode(buffer, episode, 20 + episode)
+        obs, actions, rewards, obs_tp1, dones, next_actions = buffer.sample(50)
+        self.assertEqual(obs.shape, (50, 4, 4))
+        self.assertEqual(rewards.shape, (50, ))
+        steps = rewards.astype(int) % 1000
+        # a new episode starts exactly where the step counter falls back to zero
+        self.assertTrue(((np.diff(steps) == 1) | (steps[1:] == 0)).all())
+        self.assertTrue((next_actions == -1).all())
+
+    def test_memory_is_bounded_by_transitions(self):
+        buffer = EpisodeBuffer(size=100, max_transitions=50)
+        for episode in range(10):
+            self._add_episode(buffer, episode, 12)
+        # 50 transitions hold the last 4 finished episodes, the older ones were overwritten
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer._obses_t.shape[0], 50)
+        obs, actions, rewards, obs_tp1, dones, next_actions = buffer.sample(200)
+        self.assertTrue(set(np.unique(obs)) <= {6, 7, 8, 9})
+
+    def test_number_episodes_is_bounded(self):
+        buffer = EpisodeBuffer(size=3, max_transitions=1000)
+        for episode in range(5):
+            self._add_episode(buffer, episode, 5)
+        self.assertEqual(len(buffer), 3)
+        obs, actions, rewards, obs_tp1, dones, next_actions = buffer.sample(100)
+        self.assertTrue(set(np.unique(obs)) <= {2, 3, 4})
+
+    def test_sample_sequences(self):
+        buffer = EpisodeBuffer(size=10, max_transitions=100)
+        for episode, length in enumerate([3, 30, 30, 30]):
+            self._add_episode(buffer, episode, length)
+        obs, actions, rewards, obs_tp1, dones, next_actions, mask = buffer.sample_sequences(64, 8)
+        self.assertEqual(obs.shape, (64, 8, 4, 4))
+        self.assertEqual(mask.shape, (64, 8))
+        short = obs[:, 0, 0, 0] == 0
+        self.assertTrue((mask[short].sum(axis=1) == 3).all())
+        self.assertTrue(mask[~short].all())
+        self.assertTrue((np.diff(rewards[~short], axis=1) == 1).all())
+
+        obs, actions, rewards, obs_tp1, dones, next_actions, mask = buffer.sample_sequences(16)
+        self.assertEqual(mask.shape[1], rewards.shape[1])
+        self.assertTrue((dones.sum(axis=1) == 1).all())
+
+
+def _sample_in_reader(path: str) -> tuple:
+    buffer = MemmapReplayBuffer(path, readonly=True)
+    obs, actions, rewards, obs_tp1, dones = buffer.sample(64)
+    return len(buffer), obs.shape, set(rewards.tolist())
+
+
+class MemmapReplayBufferTester(unittest.TestCase):
+
+    def _fill(self, buffer, start: int, stop: int):
+        for i in range(start, stop):
+            board = np.full((4, 4), 2 ** (i % 12 + 1), dtype=int)
+            buffer.add(board, i % 4, float(i), board, False)
+
+    def test_resume_after_restart(self):
+        with tempfile.TemporaryDirectory() as path:
+            buffer = MemmapReplayBuffer(path, size=50)
+            self._fill(buffer, 0, 30)
+            buffer.flush()
+            del buffer
+
+            buffer = MemmapReplayBuffer(path)
+            self.assertEqual(len(buffer), 30)
+            self.assertEqual(buffer._maxsize, 50)
+            self._fill(buffer, 30, 60)
+            self.assertEqual(len(buffer), 50)
+            self.assertEqual(sorted(buffer._rewards.tolist()), list(range(10, 60)))
+            obs, actions, rewards, obs_tp1, dones = buffer.sample(32)
+            self.assertTrue((obs[:, 0, 0] == 2 ** (rewards.astype(int) % 12 + 1)).all())
+
+    def test_readers_in_other_processes(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer = MemmapReplayBuffer(path, size=100)
+            self._fill(writer, 0, 10)
+            reader = MemmapReplayBuffer(path, readonly=True)
+            self._fill(writer, 10, 20)
+            obs, actions, rewards, obs_tp1, dones = reader.sample(500)
+            self.assertEqual(set(rewards.tolist()), set(range(20)))
+            with self.assertRaises(PermissionError):
+                self._fill(reader, 0, 1)
+
+            with multiprocessing.Pool(2) as pool:
+                for size, obs_shape, rewards in pool.map(_sample_in_reader, [path, path]):
+                    self.assertEqual(size, 20)
+                    self.assertEqual(obs_shape, (64, 4, 4))
+                    self.assertTrue(rewards <= set(range(20)))
+
+    def test_missing_buffer(self):
+        with tempfile.TemporaryDirectory() as path:
+            with self.assertRaises(FileNotFoundError):
+                MemmapReplayBuffer(path, readonly=True)
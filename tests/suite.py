@@ -0,0 +1,43 @@
+import unittest
+
+from benchmarks.suite import _metric, compare
+
+
+class CompareTester(unittest.TestCase):
+
+    def setUp(self):
+        self.baseline = {"metrics": {"at_threshold": _metric(100.0, "steps/s"),
+                                     "just_below": _metric(100.0, "steps/s"),
+                                     "just_above": _metric(100.0, "steps/s"),
+                                     "improved": _metric(100.0, "steps/s"),
+                                     "latency": _metric(10.0, "us", higher_is_better=False),
+                                     "latency_improved": _metric(10.0, "us", higher_is_better=False),
+                                     "zero_baseline": _metric(0.0, "steps/s"),
+                                     "only_in_baseline": _metric(1.0, "steps/s")}}
+        self.results = {"metrics": {"at_threshold": _metric(90.0, "steps/s"),
+                                    "just_below": _metric(90.01, "steps/s"),
+                                    "just_above": _metric(89.99, "steps/s"),
+                                    "improved": _metric(150.0, "steps/s"),
+                                    "latency": _metric(11.5, "us", higher_is_better=False),
+                                    "latency_improved": _metric(5.0, "us", higher_is_better=False),
+                                    "zero_baseline": _metric(5.0, "steps/s"),
+                                    "only_in_results": _metric(1.0, "steps/s")}}
+
+    def test_flags_losses_beyond_threshold(self):
+        rows = {row[0]: row for row in compare(self.results, self.baseline, threshold=0.1)}
+        self.assertNotIn("only_in_baseline", rows)
+        self.assertNotIn("only_in_results", rows)
+        regressions = {name for name, _, _, _, is_regression in rows.values() if is_regression}
+        # a loss of exactly the threshold is still accepted
+        self.assertEqual(regressions, {"just_above", "latency"})
+        self.assertAlmostEqual(rows["at_threshold"][3], -0.1)
+        self.assertEqual(rows["at_threshold"][1:3], (100.0, 90.0))
+        # lower is better: a longer latency is a negative change, a shorter one a positive change
+        self.assertAlmostEqual(rows["latency"][3], -0.15)
+        self.assertAlmostEqual(rows["latency_improved"][3], 0.5)
+        self.assertAlmostEqual(rows["improved"][3], 0.5)
+        self.assertEqual(rows["zero_baseline"][3], 0.0)
+
+    def test_threshold(self):
+        rows = compare(self.results, self.baseline, threshold=0.2)
+        self.assertFalse(any(is_regression for _, _, _, _, is_regression in rows))
@@ -0,0 +1,70 @@
+import unittest
+import numpy as np
+
+from src.batch_env import move_boards
+from src.bitboard import pack_board
+from src.helpers import to_exponents
+from src.symmetry import ACTION_PERMUTATIONS, SYMMETRY_PERMUTATIONS, augment_batch, canonical_bitboard, \
+    canonical_hash, canonical_hash_batch
+
+
+def _all_symmetries(board: np.ndarray) -> list:
+    return [np.rot90(b, k) for b in (board, board.T) for k in range(4)]
+
+
+class SymmetryTester(unittest.TestCase):
+
+    def setUp(self):
+        self.board = np.array([
+            [0, 2, 0, 2],
+            [0, 0, 0, 16],
+            [2, 0, 2, 2],
+            [4, 0, 8192, 1024]
+        ])
+
+    def test_permutations(self):
+        for permutation, symmetric in zip(SYMMETRY_PERMUTATIONS, _all_symmetries(self.board)):
+            self.assertTrue((self.board.ravel()[permutation] == symmetric.ravel()).all())
+
+    def test_canonical_hash(self):
+        hashes = {canonical_hash(symmetric) for symmetric in _all_symmetries(self.board)}
+        self.assertEqual(len(hashes), 1)
+        self.assertEqual(hashes.pop(), min(pack_board(symmetric) for symmetric in _all_symmetries(self.board)))
+        other = self.board.copy()
+        other[0, 0] = 4
+        self.assertNotEqual(canonical_hash(other), canonical_hash(self.board))
+
+    def test_hash_variants_agree(self):
+        exponents = np.random.default_rng(0).integers(0, 16, size=(100, 4, 4)).astype(np.uint8)
+        boards = np.where(exponents > 0, 2 ** exponents.astype(np.int64), 0)
+        batch = canonical_hash_batch(exponents, exponents=True)
+        self.assertEqual(batch.dtype, np.uint64)
+        self.assertTrue((batch == canonical_hash_batch(boards)).all())
+        for board, key in zip(boards, batch):
+            self.assertEqual(canonical_bitboard(pack_board(board)), int(key))
+
+    def test_action_permutations(self):
+        exponents = np.random.default_rng(1).integers(0, 4, size=(50, 4, 4)).astype(np.uint8)
+        for symmetry, permutation in enumerate(SYMMETRY_PERMUTATIONS):
+            symmetric = exponents.reshape((50, 16))[:, permutation].reshape((50, 4, 4))
+            for action in range(4):
+                moved, points = move_boards(exponents, np.full(50, action))
+                moved_symmetric, points_symmetric = move_boards(
+                    symmetric, np.full(50, ACTION_PERMUTATIONS[symmetry, action]))
+                self.assertTrue((moved.reshape((50, 16))[:, permutation].reshape((50, 4, 4)) ==
+                                 moved_symmetric).all())
+                self.assertTrue((points == points_symmetric).all())
+
+    def test_augment_batch(self):
+        obses = to_exponents(np.stack([self.board, self.board.T]))
+        onehot = np.eye(14, dtype=bool)[obses]
+        obses_t, actions, rewards, obses_tp1, dones = augment_batch(onehot, np.array([0, 3]), np.array([1., 2.]),
+                                                                    onehot, np.array([False, True]))
+        self.assertEqual(obses_t.shape, (16, 4, 4, 14))
+        self.assertTrue((obses_t[8:16].argmax(axis=3) == obses[1].ravel()[SYMMETRY_PERMUTATIONS].reshape(8, 4, 4))
+                        .all())
+        self.assertTrue((actions[:8] == ACTION_PERMUTATIONS[:, 0]).all())
+        self.assertTrue((actions[8:] == ACTION_PERMUTATIONS[:, 3]).all())
+        self.assertTrue((rewards == np.repeat([1., 2.], 8)).all())
+        self.assertTrue((dones == np.repeat([False, True], 8)).all())
+        self.assertEqual(obses_tp1.shape, obses_t.shape)
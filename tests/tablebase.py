@@ -0,0 +1,123 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+
+from src.agents.random import RandomAgent
+from src.agents.tablebase import TablebaseAgent
+from src.game import Env, Game
+from src.helpers import Direction
+from src.tablebase import NO_ACTION, Tablebase, build_tablebase, canonical_keys, hash_table, solve, unpack_boards
+
+
+def _reference_values(board: tuple, memo: dict) -> dict:
+    """
+    expected points of every legal direction under optimal play, computed with Game
+    """
+    if board in memo:
+        return memo[board]
+    game = Game(2)
+    q_values = {}
+    for direction in Direction:
+        game.board = np.array(board).reshape((2, 2))
+        game.points = 0
+        if game.make_move(direction, spawn_new=False) in ("Invalid Move", "Game Over") and \
+                (game.board == np.array(board).reshape((2, 2))).all():
+            continue
+        empty = np.argwhere(game.board == 0)
+        expected = 0.0
+        for i, j in empty:
+            for value, probability in ((2, 0.9), (4, 0.1)):
+                child = game.board.copy()
+                child[i, j] = value
+                child_values = _reference_values(tuple(child.ravel()), memo)
+                expected += probability * max(child_values.values(), default=0.0) / len(empty)
+        q_values[direction.value] = game.points + expected
+    memo[board] = q_values
+    return q_values
+
+
+class TablebaseTester(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, "2x2.tb")
+        cls.stats = build_tablebase(cls.path, 2, processes=1)
+        cls.tablebase = Tablebase(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        del cls.tablebase
+        cls.directory.cleanup()
+
+    def _boards_of_games(self, number_games: int) -> list:
+        np.random.seed(0)
+        env = Env(number_tiles=2, rng=0)
+        boards = []
+        agent = RandomAgent(state_shape=env.get_state_space(), action_shape=env.get_action_space(), name="random",
+                            rng=0)
+        original_play_turn = agent.play_turn
+
+        def play_turn(state_space, legal_actions=None):
+            boards.append(state_space.copy())
+            return original_play_turn(state_space, legal_actions=legal_actions)
+
+        agent.play_turn = play_turn
+        env.assign_agent(agent)
+        env.run_multiple_games(number_games)
+        return boards
+
+    def test_values_and_actions_match_reference(self):
+        memo = {}
+        boards = self._boards_of_games(50)
+        values, actions = self.tablebase.lookup_batch(np.array(boards))
+        for board, value, action in zip(boards, values, actions):
+            q_values = _reference_values(tuple(board.ravel()), memo)
+            self.assertAlmostEqual(value, max(q_values.values(), default=0.0), places=3)
+            if q_values:
+                self.assertAlmostEqual(q_values[int(action)], value, places=3)
+            else:
+                self.assertEqual(action, NO_ACTION)
+
+    def test_symmetric_boards_share_an_entry(self):
+        board = np.array([[2, 4], [0, 8]])
+        keys = canonical_keys(np.log2(np.maximum(np.array([board, board.T, np.rot90(board)]), 1)).astype(np.uint8))[0]
+        self.assertEqual(len(set(keys.tolist())), 1)
+        self.assertEqual(self.tablebase.lookup(board)[0], self.tablebase.lookup(np.rot90(board))[0])
+        self.assertEqual(self.stats["states"], self.tablebase.number_states)
+        self.assertGreater(self.stats["bytes"], 0)
+        with self.assertRaises(KeyError):
+            self.tablebase.lookup(np.array([[2, 2], [2, 2]]) * 1024)
+
+    def test_hash_table_finds_every_key(self):
+        keys = np.unique(np.random.RandomState(0).randint(1, 2 ** 40, size=1000).astype(np.uint64))
+        table_keys, table_values, table_actions = hash_table(keys, keys.astype(np.float32), keys % 4)
+        self.assertEqual(set(table_keys[table_keys != 0].tolist()), set(keys.tolist()))
+        self.assertLessEqual(len(keys) * 2, len(table_keys))
+
+    def test_parallel_solve_matches_serial(self):
+        serial = solve(2, processes=1, chunk_size=16)
+        parallel = solve(2, processes=2, chunk_size=16)
+        self.assertTrue((serial["keys"] == parallel["keys"]).all())
+        self.assertTrue(np.allclose(serial["values"], parallel["values"]))
+
+    def test_max_tile_ends_game(self):
+        result = solve(2, max_tile=16, processes=1)
+        final = unpack_boards(result["keys"], 2).max(axis=(1, 2)) == 4
+        self.assertTrue(final.any())
+        self.assertTrue((result["values"][final] == 0.0).all())
+        self.assertTrue((result["actions"][final] == NO_ACTION).all())
+        self.assertEqual(unpack_boards(result["keys"], 2).max(), 4)
+        self.assertLess(len(result["keys"]), self.stats["states"])
+
+    def test_agent_beats_random_play(self):
+        scores = {}
+        for agent_class in (RandomAgent, TablebaseAgent):
+            env = Env(number_tiles=2, rng=1)
+            kwargs = {"path": self.path} if agent_class is TablebaseAgent else {"rng": 1}
+            env.assign_agent(agent_class(state_shape=env.get_state_space(), action_shape=env.get_action_space(),
+                                         name=agent_class.__name__, **kwargs))
+            env.run_multiple_games(200)
+            scores[agent_class] = np.mean(env.point_history)
+        self.assertGreater(scores[TablebaseAgent], scores[RandomAgent])
@@ -0,0 +1,123 @@
+import importlib.util
+import unittest
+import numpy as np
+
+from src.game import Env
+from src.vector_env import AsyncVectorEnv, GymEnv, SyncVectorEnv
+
+
+class GymEnvTester(unittest.TestCase):
+
+    def test_episode(self):
+        env = GymEnv(max_steps_per_game=10000)
+        observation, info = env.reset(seed=0)
+        self.assertEqual(observation.shape, Env().get_state_space())
+        self.assertEqual(observation.sum(), 16)
+        terminated = truncated = False
+        total_reward = 0.0
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(np.random.randint(4))
+            total_reward += reward
+        self.assertTrue(terminated)
+        self.assertEqual(total_reward, info["points"])
+
+    def test_truncation(self):
+        env = GymEnv(max_steps_per_game=3)
+        env.reset(seed=0)
+        flags = [env.step(2)[3] for _ in range(3)]
+        self.assertEqual(flags, [False, False, True])
+
+
+class SyncVectorEnvTester(unittest.TestCase):
+
+    def test_step(self):
+        env = SyncVectorEnv(8, seed=0)
+        observations, info = env.reset()
+        self.assertEqual(observations.shape, (8, ) + Env().get_state_space())
+        self.assertTrue((observations.sum(axis=1) == 16).all())
+        observations, rewards, terminated, truncated, info = env.step(np.zeros(8, dtype=np.int64))
+        self.assertEqual(rewards.shape, (8, ))
+        self.assertEqual(terminated.dtype, bool)
+        self.assertFalse(truncated.any())
+        self.assertTrue((info["final_points"] == 0).all())
+
+    def test_final_points(self):
+        env = SyncVectorEnv(4, seed=1, max_steps_per_game=50)
+        env.reset()
+        returns = np.zeros(4)
+        finished = []
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            observations, rewards, terminated, truncated, info = env.step(rng.integers(0, 4, size=4))
+            returns += rewards
+            ended = terminated | truncated
+            self.assertTrue((info["final_points"][ended] == returns[ended]).all())
+            finished.extend(returns[ended].tolist())
+            returns[ended] = 0
+        self.assertEqual(finished, env.env.point_history)
+        self.assertTrue((env.number_steps < 50).all())
+
+    def test_seeded_reset(self):
+        env = SyncVectorEnv(4)
+        first = env.reset(seed=3)[0]
+        self.assertTrue((env.reset(seed=3)[0] == first).all())
+
+
+class AsyncVectorEnvTester(unittest.TestCase):
+
+    def test_matches_sync_shards(self):
+        actions = np.random.default_rng(0).integers(0, 4, size=(30, 6))
+        with AsyncVectorEnv(6, number_workers=2, seed=0, max_steps_per_game=20) as env:
+            observations, info = env.reset(seed=4)
+            results = [env.step(step_actions) for step_actions in actions]
+        seeds = env._worker_seeds(4)
+        shards = [SyncVectorEnv(3, seed=seed, max_steps_per_game=20) for seed in seeds]
+        expected = np.concatenate([shard.reset(seed=seed)[0] for shard, seed in zip(shards, seeds)])
+        self.assertTrue((observations == expected).all())
+        for step_actions, (observations, rewards, terminated, truncated, info) in zip(actions, results):
+            expected = [shard.step(step_actions[3 * i:3 * i + 3]) for i, shard in enumerate(shards)]
+            self.assertTrue((observations == np.concatenate([result[0] for result in expected])).all())
+            self.assertTrue((rewards == np.concatenate([result[1] for result in expected])).all())
+            self.assertTrue((truncated == np.concatenate([result[3] for result in expected])).all())
+            self.assertTrue((info["final_points"] == np.concatenate([result[4]["final_points"]
+                                                                     for result in expected])).all())
+        self.assertTrue(env.closed)
+
+    def test_invalid_action(self):
+        with AsyncVectorEnv(2, number_workers=1) as env:
+            env.reset()
+            with self.assertRaises(ValueError):
+                env.step(np.array([0, 7]))
+
+
+class SpacesTester(unittest.TestCase):
+
+    @unittest.skipUnless(importlib.util.find_spec("gymnasium"), "needs gymnasium")
+    def test_spaces(self):
+        state_shape = Env().get_state_space()
+        env = GymEnv()
+        self.assertEqual(env.observation_space.shape, state_shape)
+        self.assertEqual(env.observation_space.dtype, np.float32)
+        self.assertEqual(env.action_space.n, 4)
+        self.assertTrue(env.observation_space.contains(env.reset(seed=0)[0]))
+        vector_envs = [SyncVectorEnv(3, seed=0), AsyncVectorEnv(3, number_workers=1)]
+        try:
+            for vector_env in vector_envs:
+                self.assertEqual(vector_env.observation_space.shape, (3, ) + state_shape)
+                self.assertEqual(vector_env.observation_space.dtype, np.float32)
+                self.assertEqual(vector_env.action_space.nvec.tolist(), [4, 4, 4])
+                self.assertEqual(vector_env.single_observation_space.shape, state_shape)
+                self.assertEqual(vector_env.single_action_space.n, 4)
+                self.assertTrue(vector_env.observation_space.contains(vector_env.reset(seed=0)[0]))
+        finally:
+            vector_envs[1].close()
+
+    @unittest.skipIf(importlib.util.find_spec("gymnasium"), "gymnasium is installed")
+    def test_spaces_without_gymnasium(self):
+        for space in ("observation_space", "action_space"):
+            with self.assertRaisesRegex(ImportError, "pip install gymnasium"):
+                getattr(GymEnv(), space)
+        env = SyncVectorEnv(2)
+        for space in ("single_observation_space", "single_action_space"):
+            with self.assertRaisesRegex(ImportError, "pip install gymnasium"):
+                getattr(env, space)